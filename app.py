@@ -1,15 +1,28 @@
 # app.py
+import json
 import math
+from typing import Optional
 
-from fastapi import FastAPI, HTTPException, status, Depends
+from fastapi import FastAPI, HTTPException, status, Depends, Response
+from fastapi.responses import StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
 from fastapi.middleware.cors import CORSMiddleware
-from geometry_isochrone import calculate_attractions_by_category
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select, distinct
 from contextlib import asynccontextmanager
 
-from schemas_iso import IsoRequest, IsoResponse, IsoPolygon, IsoPointAndScore, IsoScoreRequest, PointsAndScoresResponse
-from services.iso_service import isochrone_service
+from schemas_iso import IsoRequest, IsoResponse, IsoPolygon, IsoPointAndScore, IsoScoreRequest, PointsAndScoresResponse, IsoCacheStatsResponse, IsoExecutorStatsResponse, GraphInfoResponse, RegionsStatsResponse, MatrixRequest, MatrixResponse, IsoBatchRequest, ScoresAtRequest, ScoresAtResponse, ScoreAtPoint, ScoreSurfaceResponse, ScorePipelineStatsResponse
+from services.iso_service import isochrone_service, DEFAULT_POLYGON_METHOD, DEFAULT_SNAP_MODE, GRAPH_RELOAD_SECONDS
+from services.travel_profiles import get_profile, DEFAULT_PROFILE
+from services.vector_tiles import builds_tile, check_tile, isochrones_tile, scores_tile, tile_cache
+from services.score_surface import score_surface, SCORE_SURFACE_REFRESH_SECONDS
+from services.attraction_scoring import DEFAULT_DECAY, DEFAULT_SCORE_MODE
+from services.score_pipeline import score_pipeline, SCORE_CACHE_REFRESH_SECONDS
+from services.build_index import build_index
+from services.build_rows import fetch_builds_json, stream_builds_ndjson, NDJSON_MEDIA_TYPE
+from services.geo_encoding import encode_geometry, validate_encoding, DEFAULT_GEOMETRY_ENCODING
+from services.graph_registry import graph_registry
 from config import get_async_session, AsyncSessionLocal
 from bd_models import Build
 
@@ -17,26 +30,49 @@ from mock_users import MOCK_USERS
 from models import *
 from bd_models import *
 from config import get_async_session
-from buffer_intersection_service import find_buffer_intersection_centers
 
 from shapely.geometry import Polygon, Point
 
-from services.buffer_service import build_buffers_for_criteries
-from services.get_criteries import get_all_criteries_light
 
+import asyncio
 import logging
 
+import numpy as np
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with AsyncSessionLocal() as session:
-        try:
-            await isochrone_service.initialize(session)
-            print(f" Граф дорог успешно загружен в кэш")
-        except Exception as e:
-            print(f"Ошибка при загрузке графа дорог: {e}")
-            import traceback
-            traceback.print_exc()
+    graph_registry.session_factory = AsyncSessionLocal
+    # При нескольких регионах графы загружаются лениво, по первому запросу
+    if not graph_registry.multi_region:
+        async with AsyncSessionLocal() as session:
+            try:
+                await isochrone_service.initialize(session)
+                print(f" Граф дорог успешно загружен в кэш")
+            except Exception as e:
+                print(f"Ошибка при загрузке графа дорог: {e}")
+                import traceback
+                traceback.print_exc()
+    reload_task = None
+    if GRAPH_RELOAD_SECONDS > 0:
+        # Перезагружаются загруженные графы: общий или регионов
+        reload_task = asyncio.create_task(graph_registry.run_periodic_reload())
+    # Поверхность оценок читается из файла или считается в фоне, старт не ждёт
+    score_tasks = []
+    if not graph_registry.multi_region and isochrone_service.graph_version > 0:
+        score_tasks.append(asyncio.create_task(_refresh_scores()))
+        if SCORE_SURFACE_REFRESH_SECONDS > 0:
+            score_tasks.append(asyncio.create_task(
+                score_surface.run_periodic_refresh(isochrone_service, AsyncSessionLocal)
+            ))
+    if SCORE_CACHE_REFRESH_SECONDS > 0:
+        score_tasks.append(asyncio.create_task(score_pipeline.run_periodic_refresh(AsyncSessionLocal)))
     yield
+    if reload_task is not None:
+        reload_task.cancel()
+    for task in score_tasks:
+        task.cancel()
+    isochrone_service.shutdown()
+    graph_registry.shutdown()
 
 
 app = FastAPI(title="Auth API", version="1.0.0", lifespan=lifespan)
@@ -56,6 +92,13 @@ app.add_middleware(
 	allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
 	allow_headers=["Content-Type"],
 )
+# Сжатие крупных ответов (GeoJSON изохрон, матрицы) для клиентов с Accept-Encoding: gzip.
+# Потоки NDJSON не сжимаются: gzip копит строки в буфере, и клиент получал бы их пачками
+app.add_middleware(
+	GZipMiddleware,
+	minimum_size=1024,
+	exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + (NDJSON_MEDIA_TYPE,),
+)
 
 @app.get("/api/example", response_model=ExampleResponse)
 async def example():
@@ -166,22 +209,22 @@ async def get_all_categories(
 @app.get("/api/builds/by-category/{category}", response_model=BuildsListResponse, status_code=status.HTTP_200_OK)
 async def get_builds_by_category(
     category: str,
+    format: str = "json",
     session: AsyncSession = Depends(get_async_session)
 ):
-    if category:
-        query = select(Build).where(Build.category == category)
-    else:
-        query = select(Build)
-
-    result = await session.execute(query)
-    builds = result.scalars().all()
-
-    builds_data = [build.model_dump() for build in builds]
-
-    return BuildsListResponse(
-        status="success",
-        builds=builds_data
-    )
+    conditions = [Build.category == category] if category else []
+    return await _builds_list_response(session, format, *conditions)
+
+async def _builds_list_response(session: AsyncSession, format: str, *conditions):
+    """
+    Список зданий в формате BuildsListResponse, закодированный напрямую
+    из строк БД (json), или поток NDJSON — по зданию на строку (ndjson).
+    """
+    if format == "ndjson":
+        return StreamingResponse(stream_builds_ndjson(AsyncSessionLocal, *conditions), media_type=NDJSON_MEDIA_TYPE)
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    return Response(content=await fetch_builds_json(session, *conditions), media_type="application/json")
 
 @app.get("/api/builds/{id}", response_model=DateiledBuildResponse, status_code=status.HTTP_200_OK)
 async def get_build_by_id(
@@ -237,11 +280,32 @@ async def get_road_rib_by_id(
 		road_rib=rib.model_dump()
 	)
 
+async def _load_build_points(session: AsyncSession, category: Optional[str], name: Optional[str]):
+    """(id, lon, lat) зданий по категории и/или названию; здания без координат пропускаются."""
+    points = []
+    for condition in ([Build.category == category] if category else []) + ([Build.name == name] if name else []):
+        q = await session.execute(select(Build).where(condition))
+        for b in q.scalars().all():
+            try:
+                lon = float(b.longtitude.replace(",", "."))
+                lat = float(b.latitude.replace(",", "."))
+                points.append((b.id, lon, lat))
+            except:
+                continue
+    return points
+
 @app.post("/api/isochrones", response_model=IsoResponse)
 async def isochrones_api(data: IsoRequest, session: AsyncSession = Depends(get_async_session)
 ):
-    if data.time is None or data.time <= 0 or data.time > 15:
-        raise HTTPException(status_code=400, detail="time must be >0 and <= 15")
+    bands = data.times if data.times else ([data.time] if data.time is not None else [])
+    if not bands:
+        raise HTTPException(status_code=400, detail="send time or times")
+    try:
+        profile = get_profile(data.profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if any(t <= 0 or t > profile.max_minutes for t in bands):
+        raise HTTPException(status_code=400, detail=f"time must be >0 and <= {profile.max_minutes}")
 
     if not (data.points or data.byCategory or data.byName):
         raise HTTPException(status_code=400, detail="send points or byCategory or byName")
@@ -252,41 +316,37 @@ async def isochrones_api(data: IsoRequest, session: AsyncSession = Depends(get_a
         for p in data.points:
             start_coords.append((p.lon, p.lat))
 
-    if data.byCategory:
-        q = await session.execute(select(Build).where(Build.category == data.byCategory))
-        for b in q.scalars().all():
-            try:
-                lon = float(b.longtitude.replace(",", "."))
-                lat = float(b.latitude.replace(",", "."))
-                start_coords.append((lon, lat))
-            except:
-                continue
-
-    if data.byName:
-        q = await session.execute(select(Build).where(Build.name == data.byName))
-        for b in q.scalars().all():
-            try:
-                lon = float(b.longtitude.replace(",", "."))
-                lat = float(b.latitude.replace(",", "."))
-                start_coords.append((lon, lat))
-            except:
-                continue
+    for _, lon, lat in await _load_build_points(session, data.byCategory, data.byName):
+        start_coords.append((lon, lat))
 
     if not start_coords:
         raise HTTPException(status_code=404, detail="No start points found")
     
     try:
-        isochrones_data = await isochrone_service.calculate_isochrones(
+        encoding = data.encoding or DEFAULT_GEOMETRY_ENCODING
+        validate_encoding(encoding, data.precision)
+        service = await graph_registry.service_for(start_coords)
+        isochrones_data = await service.calculate_isochrones(
             points=start_coords,
-            time_minutes=data.time
+            time_minutes=bands,
+            method=data.method or DEFAULT_POLYGON_METHOD,
+            profile=profile.name,
+            snap_mode=data.snap or DEFAULT_SNAP_MODE,
+            simplify_m=data.simplify_m or 0.0
         )
         
         resp_polys = [
-            IsoPolygon(minutes=item["minutes"], polygon=item["polygon"])
+            IsoPolygon(minutes=item["minutes"], polygon=encode_geometry(item["polygon"], encoding, data.precision))
             for item in isochrones_data
         ]
         
-        return IsoResponse(status="success", isochrones=resp_polys)
+        return IsoResponse(
+            status="success",
+            isochrones=resp_polys,
+            graph_version=isochrones_data[0]["graph_version"] if isochrones_data else None,
+            snap=isochrones_data[0]["snap"] if isochrones_data else None,
+            encoding=encoding
+        )
         
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -295,55 +355,317 @@ async def isochrones_api(data: IsoRequest, session: AsyncSession = Depends(get_a
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/isochrones/score", response_model=PointsAndScoresResponse)
-async def isochrones_api(data: IsoScoreRequest, session: AsyncSession = Depends(get_async_session)
+@app.post("/api/isochrones/batch")
+async def isochrones_batch_api(data: IsoBatchRequest, session: AsyncSession = Depends(get_async_session)
 ):
-    if data.byName:
-        raise HTTPException(status_code=400, detail="calculate score by name not suported yet")
-    if not data.byCategory:
-        raise HTTPException(status_code=400, detail="send category")
+    """
+    Отдельная изохрона для каждой точки или здания. Ответ — NDJSON:
+    по строке {"id", "isochrones", "snap_distance_m"} на источник
+    в порядке готовности.
+    """
+    bands = data.times if data.times else ([data.time] if data.time is not None else [])
+    if not bands:
+        raise HTTPException(status_code=400, detail="send time or times")
+    if not (data.points or data.byCategory or data.byName):
+        raise HTTPException(status_code=400, detail="send points or byCategory or byName")
+
+    sources = [(p.id if p.id is not None else i, p.lon, p.lat) for i, p in enumerate(data.points or [])]
+    sources += await _load_build_points(session, data.byCategory, data.byName)
+    if not sources:
+        raise HTTPException(status_code=404, detail="No start points found")
 
+    ids = [source_id for source_id, _, _ in sources]
+    coords = [(lon, lat) for _, lon, lat in sources]
     try:
-        logger = logging.getLogger("iso")
-        # достаем из бд критерии и строения
-        criteries = await get_all_criteries_light(session)
+        service = await graph_registry.service_for(coords)
+        results = service.iter_isochrones_by_source(
+            coords,
+            time_minutes=bands,
+            ids=ids,
+            method=data.method or DEFAULT_POLYGON_METHOD,
+            profile=data.profile,
+            snap_mode=data.snap or DEFAULT_SNAP_MODE,
+            simplify_m=data.simplify_m or 0.0,
+        )
+        encoding = data.encoding or DEFAULT_GEOMETRY_ENCODING
+        validate_encoding(encoding, data.precision)
+        # Ошибки параметров — до начала потока, пока можно ответить 400
+        first = await anext(results, None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail="Service not initialized")
+
+    def encode(item):
+        if "isochrones" in item:
+            item["isochrones"] = [
+                {**iso, "polygon": encode_geometry(iso["polygon"], encoding, data.precision)}
+                for iso in item["isochrones"]
+            ]
+        return json.dumps(item, ensure_ascii=False) + "\n"
+
+    async def lines():
+        if first is not None:
+            yield encode(first)
+        async for item in results:
+            yield encode(item)
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
 
-        # Строим буферы по is_antiattractive = false
-        buffers = build_buffers_for_criteries(criteries)
-        logger.info(f"buffers: {buffers}")
+@app.get("/api/isochrones/cache", response_model=IsoCacheStatsResponse)
+async def isochrones_cache_stats():
+    return IsoCacheStatsResponse(status="success", **graph_registry.cache_stats())
+
+@app.get("/api/isochrones/executor", response_model=IsoExecutorStatsResponse)
+async def isochrones_executor_stats():
+    return IsoExecutorStatsResponse(status="success", **graph_registry.executor_stats())
+
+_background_tasks = set()
+
+def _reload_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.getLogger("iso").error("Ошибка при перезагрузке графа дорог: %s", task.exception())
+
+async def _refresh_scores(force: bool = False):
+    try:
+        await score_surface.refresh(graph_registry.default_service, AsyncSessionLocal, force=force)
+    except Exception as e:
+        logging.getLogger("iso").error("Ошибка при пересчёте поверхности оценок: %s", e)
+
+async def _reload_graph(force: bool):
+    reloaded = await graph_registry.reload(force=force)
+    # Новый общий граф — новая поверхность оценок (пересчёт, только если граф изменился)
+    if not graph_registry.multi_region and any(reloaded.values()):
+        await _refresh_scores()
+
+@app.get("/api/admin/graph", response_model=GraphInfoResponse)
+async def graph_info():
+    return GraphInfoResponse(status="success", **graph_registry.graph_info())
+
+@app.get("/api/admin/regions", response_model=RegionsStatsResponse)
+async def regions_stats():
+    return RegionsStatsResponse(status="success", **graph_registry.stats())
+
+@app.post("/api/admin/graph/reload", response_model=GraphInfoResponse, status_code=status.HTTP_202_ACCEPTED)
+async def graph_reload(response: Response, force: bool = False):
+    # Без force граф перечитывается, только если изменилось содержимое таблиц графа
+    if not force:
+        async with AsyncSessionLocal() as session:
+            changed = await graph_registry.changed_regions(session)
+        if not changed:
+            response.status_code = status.HTTP_200_OK
+            return GraphInfoResponse(status="unchanged", **graph_registry.graph_info())
+    # Граф собирается в фоне; текущие запросы дорабатывают на старой версии
+    task = asyncio.create_task(_reload_graph(force))
+    _background_tasks.add(task)
+    task.add_done_callback(_reload_done)
+    await asyncio.sleep(0)
+    return GraphInfoResponse(status="accepted", **graph_registry.graph_info())
+
+MATRIX_FORMATS = ("dense", "sparse", "binary")
+
+@app.post("/api/matrix", response_model=MatrixResponse, response_model_exclude_none=True)
+async def travel_time_matrix_api(data: MatrixRequest):
+    fmt = data.format or "dense"
+    if fmt not in MATRIX_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(MATRIX_FORMATS)}")
+    if not data.origins:
+        raise HTTPException(status_code=400, detail="send origins")
+
+    origins = [(p.lon, p.lat) for p in data.origins]
+    destinations = [(p.lon, p.lat) for p in data.destinations] if data.destinations is not None else origins
+    if not destinations:
+        raise HTTPException(status_code=400, detail="send destinations")
 
-        # тут идет логика Лизы
-        MIN_INTERSECTION = 2
-        MAX_POINTS = 30
+    try:
+        service = await graph_registry.service_for(origins + destinations)
+        matrix = await service.travel_time_matrix(
+            origins, destinations, max_minutes=data.max_minutes, profile=data.profile
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail="Service not initialized")
 
-        centers_data = find_buffer_intersection_centers(
-            buffers,
-            min_intersections=MIN_INTERSECTION,
-            max_points=MAX_POINTS,
+    durations = matrix["durations"]
+    if fmt == "binary":
+        # float32 little-endian, построчно; NaN — нет пути
+        return Response(
+            content=durations.astype("<f4").tobytes(),
+            media_type="application/octet-stream",
+            headers={
+                "X-Matrix-Shape": f"{durations.shape[0]},{durations.shape[1]}",
+                "X-Graph-Version": str(matrix["graph_version"]),
+            },
         )
 
-        centers = []
-        for center in centers_data:
-            lon, lat = center['coordinates']
-            centers.append((lon, lat))
-
-        points_with_critery = [
-						(c["longitude"], c["latitude"], c["category"])
-						for c in criteries
-						if c.get("longitude") is not None and c.get("latitude") is not None
-				]
-
-        result = await calculate_attractions_by_category(centers, points_with_critery)
-        points = []
-        for i in range(len(result)):
-            if result[i][2] > 5:
-              points.append(IsoPointAndScore(
-								id=i + 1,
-								lon=result[i][0],
-								lat=result[i][1],
-								score=result[i][2]
-							))
+    result = MatrixResponse(
+        status="success",
+        graph_version=matrix["graph_version"],
+        shape=list(durations.shape),
+        origins_snapped=matrix["origins_snapped"].tolist(),
+        destinations_snapped=matrix["destinations_snapped"].tolist(),
+    )
+    rounded = np.round(durations.astype(np.float64), 2)
+    if fmt == "dense":
+        cells = rounded.astype(object)
+        cells[np.isnan(rounded)] = None
+        result.durations = cells.tolist()
+    else:
+        rows, cols = np.nonzero(~np.isnan(rounded))
+        result.rows = rows.tolist()
+        result.cols = cols.tolist()
+        result.values = rounded[rows, cols].tolist()
+    return result
+
+TILE_LAYERS = ("builds", "isochrones", "scores")
+TILE_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+@app.get("/tiles/{layer}/{z}/{x}/{y}.pbf")
+async def vector_tile(
+    layer: str, z: int, x: int, y: int,
+    category: Optional[str] = None,
+    lon: Optional[float] = None,
+    lat: Optional[float] = None,
+    minutes: str = "5,10,15",
+    profile: Optional[str] = None,
+    method: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Векторные тайлы (MVT). builds — здания (фильтр category);
+    isochrones — изохроны от точки lon/lat с порогами minutes ("5,10,15");
+    scores — оценки узлов дорожной сети для тепловой карты.
+    """
+    if layer not in TILE_LAYERS:
+        raise HTTPException(status_code=404, detail=f"Unknown layer {layer}")
+    try:
+        check_tile(z, x, y)
+        if layer == "builds":
+            snapshot = await build_index.ensure_loaded(session)
+            key = ("builds", snapshot.version, category, z, x, y)
+            tile = tile_cache.get(key)
+            if tile is None:
+                tile = await asyncio.to_thread(builds_tile, snapshot, z, x, y, category)
+                tile_cache.put(key, tile, len(tile))
+        elif layer == "scores":
+            node_lon, node_lat, scores = score_surface.nodes_for(graph_registry.default_service)
+            key = ("scores", score_surface.graph_version, score_surface.surface.meta["created_at"], z, x, y)
+            tile = tile_cache.get(key)
+            if tile is None:
+                tile = await asyncio.to_thread(scores_tile, node_lon, node_lat, scores, z, x, y)
+                tile_cache.put(key, tile, len(tile))
+        else:
+            if lon is None or lat is None:
+                raise ValueError("send lon and lat")
+            bands = sorted({int(m) for m in minutes.split(",") if m.strip()})
+            # Значения по умолчанию — до ключа: запросы с ними и без них делят тайл
+            method = method or DEFAULT_POLYGON_METHOD
+            profile = profile or DEFAULT_PROFILE
+            service = await graph_registry.service_for([(lon, lat)])
+            key = ("isochrones", service.graph_version, lon, lat, tuple(bands), profile, method, z, x, y)
+            tile = tile_cache.get(key)
+            if tile is None:
+                # Полигоны обычно уже в кэше изохрон: тайлы одной изохроны считаются один раз
+                isochrones = await service.calculate_isochrones([(lon, lat)], bands, method=method, profile=profile)
+                tile = await asyncio.to_thread(isochrones_tile, isochrones, z, x, y)
+                tile_cache.put(key, tile, len(tile))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        if layer == "scores":
+            raise HTTPException(status_code=503, detail=str(e))
+        raise HTTPException(status_code=500, detail="Service not initialized")
+
+    return Response(content=tile, media_type=TILE_MEDIA_TYPE)
+
+@app.get("/api/tiles/cache", response_model=IsoCacheStatsResponse)
+async def tiles_cache_stats():
+    return IsoCacheStatsResponse(status="success", **tile_cache.stats())
+
+def _parse_bbox(bbox: Optional[str]):
+    if not bbox:
+        return None
+    values = [float(v) for v in bbox.split(",")]
+    if len(values) != 4 or values[0] > values[2] or values[1] > values[3]:
+        raise ValueError("bbox: min_lon,min_lat,max_lon,max_lat")
+    return tuple(values)
+
+@app.get("/api/scores/top", response_model=PointsAndScoresResponse)
+async def scores_top(k: int = 30, bbox: Optional[str] = None):
+    """k узлов дорожной сети с наибольшей оценкой (по поверхности оценок), в bbox или по всему графу."""
+    if not 0 < k <= 10000:
+        raise HTTPException(status_code=400, detail="k must be in 1..10000")
+    try:
+        lon, lat, scores = score_surface.top(graph_registry.default_service, k, _parse_bbox(bbox))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    points = [
+        IsoPointAndScore(id=i + 1, lon=x, lat=y, score=int(round(score)))
+        for i, (x, y, score) in enumerate(zip(lon.tolist(), lat.tolist(), scores.tolist()))
+    ]
+    return PointsAndScoresResponse(status="success", points=points)
+
+@app.post("/api/scores/at", response_model=ScoresAtResponse)
+async def scores_at(data: ScoresAtRequest):
+    """Оценки в точках по ближайшему узлу дорожной сети."""
+    if not data.points:
+        raise HTTPException(status_code=400, detail="send points")
+    points = [(p.lon, p.lat) for p in data.points]
+    try:
+        scores, dist = score_surface.scores_at(graph_registry.default_service, points)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return ScoresAtResponse(
+        status="success",
+        graph_version=score_surface.graph_version,
+        points=[
+            ScoreAtPoint(
+                lon=lon, lat=lat,
+                score=None if math.isnan(score) else score,
+                snap_distance_m=None if math.isinf(d) else round(d, 1),
+            )
+            for (lon, lat), score, d in zip(points, scores.tolist(), dist.tolist())
+        ],
+    )
+
+@app.get("/api/admin/scores", response_model=ScoreSurfaceResponse)
+async def score_surface_info():
+    return ScoreSurfaceResponse(status="success", **score_surface.stats())
+
+@app.post("/api/admin/scores/rebuild", response_model=ScoreSurfaceResponse, status_code=status.HTTP_202_ACCEPTED)
+async def score_surface_rebuild(force: bool = False):
+    if graph_registry.multi_region:
+        raise HTTPException(status_code=503, detail="Поверхность оценок считается только для общего графа")
+    # Без force пересчёт только при изменении критериев или графа
+    task = asyncio.create_task(_refresh_scores(force=force))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    await asyncio.sleep(0)
+    return ScoreSurfaceResponse(status="accepted", **score_surface.stats())
+
+@app.get("/api/isochrones/score/cache", response_model=ScorePipelineStatsResponse)
+async def score_pipeline_stats():
+    return ScorePipelineStatsResponse(status="success", **score_pipeline.stats())
+
+@app.post("/api/isochrones/score", response_model=PointsAndScoresResponse)
+async def isochrones_api(data: IsoScoreRequest, session: AsyncSession = Depends(get_async_session)
+):
+    if data.byName:
+        raise HTTPException(status_code=400, detail="calculate score by name not suported yet")
+    if not data.byCategory:
+        raise HTTPException(status_code=400, detail="send category")
 
+    try:
+        # Результат зависит только от критериев, графа и параметров — берётся из кэша
+        result = await score_pipeline.get(session, data.mode or DEFAULT_SCORE_MODE, data.decay or DEFAULT_DECAY)
+        points = [
+            IsoPointAndScore(id=point_id, lon=lon, lat=lat, score=score)
+            for point_id, lon, lat, score in result
+        ]
         return PointsAndScoresResponse(status="success", points=points)
 
     except ValueError as e:
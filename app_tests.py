@@ -0,0 +1,151 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+import app as app_module
+from bd_models import RoadNode
+from graph_snapshot_tests import make_road_db
+from iso_service_tests import make_service
+from services.graph_registry import GraphRegistry
+from services.iso_service import IsochroneService
+from services.score_surface import ScoreSurfaceStore
+from services.vector_tiles import tile_cache
+from vector_tiles_tests import tile_of
+
+
+class GraphReloadEndpointTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine, self.session_factory = asyncio.run(make_road_db(os.path.join(self.tmp.name, "roads.db")))
+        self.service = IsochroneService(workers=0)
+
+        async def initialize():
+            async with self.session_factory() as session:
+                await self.service.initialize(session, snapshot_path=None)
+
+        asyncio.run(initialize())
+        self.reload_graph = AsyncMock()
+        registry = GraphRegistry([], default_service=self.service, session_factory=self.session_factory)
+        for target, value in (
+            ("AsyncSessionLocal", self.session_factory),
+            ("graph_registry", registry),
+            ("_reload_graph", self.reload_graph),
+        ):
+            patcher = patch.object(app_module, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = TestClient(app_module.app)
+
+    def tearDown(self):
+        self.service.shutdown()
+        asyncio.run(self.engine.dispose())
+        self.tmp.cleanup()
+
+    def test_unchanged_tables_are_reported(self):
+        response = self.client.post("/api/admin/graph/reload")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "unchanged")
+        self.reload_graph.assert_not_called()
+
+    def test_update_only_edit_starts_reload(self):
+        async def edit():
+            async with self.session_factory() as session:
+                await session.execute(update(RoadNode).where(RoadNode.node_id == 1004).values(longtitude=30.0015))
+                await session.commit()
+
+        asyncio.run(edit())
+        response = self.client.post("/api/admin/graph/reload")
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "accepted")
+        self.reload_graph.assert_called_once_with(False)
+
+    def test_force_skips_check(self):
+        response = self.client.post("/api/admin/graph/reload?force=true")
+
+        self.assertEqual(response.status_code, 202)
+        self.reload_graph.assert_called_once_with(True)
+
+
+class MultiRegionAdminTest(unittest.TestCase):
+    def setUp(self):
+        self.default = IsochroneService(workers=0)
+        registry = GraphRegistry([{"name": "north", "bbox": [29.9, 59.9, 30.1, 60.1]}], default_service=self.default)
+        patcher = patch.object(app_module, "graph_registry", registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(app_module.app)
+
+    def test_graph_info_does_not_use_default_service(self):
+        response = self.client.get("/api/admin/graph")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["regions"], {})
+        self.assertIsNone(response.json()["version"])
+
+    def test_score_surface_needs_single_graph(self):
+        self.assertEqual(self.client.post("/api/admin/scores/rebuild").status_code, 503)
+        self.assertEqual(self.client.get("/api/scores/top").status_code, 503)
+        self.assertEqual(self.default.graph_version, 0)
+
+
+class VectorTileEndpointTest(unittest.TestCase):
+    def setUp(self):
+        self.service = make_service()
+        self.surface = ScoreSurfaceStore(None)
+        asyncio.run(self.surface.update(
+            self.service, np.array([30.0, 30.004]), np.array([60.0, 60.002]), ["park", "railway_station"], minutes=2,
+        ))
+        registry = GraphRegistry([], default_service=self.service)
+        for target, value in (("graph_registry", registry), ("score_surface", self.surface)):
+            patcher = patch.object(app_module, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        tile_cache.clear()
+        self.addCleanup(tile_cache.clear)
+        self.client = TestClient(app_module.app)
+        self.z = 16
+        self.x, self.y = tile_of(30.002, 60.001, self.z)
+
+    def _get(self, layer, query=""):
+        return self.client.get(f"/tiles/{layer}/{self.z}/{self.x}/{self.y}.pbf{query}")
+
+    def test_isochrones_tile_is_cached_with_default_params(self):
+        hits = tile_cache.stats()["hits"]
+        first = self._get("isochrones", "?lon=30.002&lat=60.001&minutes=2,3")
+        explicit = self._get("isochrones", "?lon=30.002&lat=60.001&minutes=3,2&profile=walk&method=buffer")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers["content-type"], app_module.TILE_MEDIA_TYPE)
+        self.assertIn(b"isochrones", first.content)
+        self.assertEqual(explicit.content, first.content)
+        # те же параметры по умолчанию — один тайл в кэше
+        self.assertEqual(tile_cache.stats()["entries"], 1)
+        self.assertEqual(tile_cache.stats()["hits"], hits + 1)
+
+    def test_isochrones_tile_needs_point(self):
+        self.assertEqual(self._get("isochrones").status_code, 400)
+        self.assertEqual(self._get("isochrones", "?lon=30.002&lat=60.001&profile=plane").status_code, 400)
+
+    def test_scores_tile_follows_graph(self):
+        hits = tile_cache.stats()["hits"]
+        tile = self._get("scores")
+        self.assertEqual(tile.status_code, 200)
+        self.assertIn(b"score", tile.content)
+        self.assertEqual(self._get("scores").content, tile.content)
+        self.assertEqual(tile_cache.stats()["hits"], hits + 1)
+
+        # новый граф — поверхность ещё не пересчитана
+        self.service._set_graph(self.service.graph)
+        self.assertEqual(self._get("scores").status_code, 503)
+
+
+if __name__ == "__main__":
+    unittest.main()
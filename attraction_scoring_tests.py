@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from shapely.geometry import MultiPolygon, Point, box
+
+import geometry_isochrone
+from iso_service_tests import make_service
+from services.attraction_scoring import ATTRACTION_WEIGHTS, AttractionScorer, decay_factor
+from services.criteria_store import CriteriaColumns
+from services.graph_registry import GraphRegistry
+
+
+def loop_score(geometry, points):
+    return sum(ATTRACTION_WEIGHTS[c] for x, y, c in points if geometry.contains(Point(x, y)))
+
+
+class AttractionScorerTest(unittest.TestCase):
+    def test_matches_point_by_point_contains(self):
+        rng = np.random.default_rng(0)
+        categories = list(ATTRACTION_WEIGHTS)
+        points = [(float(x), float(y), categories[k])
+                  for x, y, k in zip(rng.uniform(0, 10, 500), rng.uniform(0, 10, 500),
+                                     rng.integers(0, len(categories), 500))]
+        geometries = [
+            box(1, 1, 4, 4),
+            Point(6, 6).buffer(2.5),
+            MultiPolygon([box(0, 0, 2, 2), box(7, 7, 9, 10)]),
+            box(20, 20, 21, 21),
+        ]
+
+        scores = AttractionScorer.from_points(points).scores(geometries)
+
+        self.assertEqual(scores.tolist(), [loop_score(g, points) for g in geometries])
+
+    def test_missing_geometry_scores_zero(self):
+        scorer = AttractionScorer.from_points([(0.5, 0.5, "park")])
+
+        self.assertEqual(scorer.scores([None, box(0, 0, 1, 1)]).tolist(), [0, 6])
+        self.assertEqual(AttractionScorer.from_points([]).score(box(0, 0, 1, 1)), 0)
+
+    def test_unknown_category_inside_raises(self):
+        scorer = AttractionScorer.from_points([(0.5, 0.5, "park"), (5, 5, "zoo")])
+
+        self.assertEqual(scorer.score(box(0, 0, 1, 1)), 6)
+        with self.assertRaises(ValueError):
+            scorer.score(box(4, 4, 6, 6))
+
+
+class NetworkScoresTest(unittest.TestCase):
+    def test_decay_functions(self):
+        times = np.array([0.0, 3.5, 7.0, 7.5, np.nan, np.inf])
+
+        np.testing.assert_allclose(decay_factor(times, 7, "step"), [1, 1, 1, 0, 0, 0])
+        np.testing.assert_allclose(decay_factor(times, 7, "linear"), [1, 0.5, 0, 0, 0, 0])
+        np.testing.assert_allclose(decay_factor(times, 7, "exponential"), [1, 0.5, 0.25, 0, 0, 0])
+        np.testing.assert_allclose(decay_factor(times, 7, "gaussian")[:3], [1, np.exp(-0.5), np.exp(-2)])
+        with self.assertRaises(ValueError):
+            decay_factor(times, 7, "cubic")
+
+    def test_scores_from_travel_times(self):
+        scorer = AttractionScorer.from_points([(0, 0, "park"), (1, 1, "industrial"), (2, 2, "zoo")])
+        durations = np.array([[1.0, 6.0, np.nan], [np.nan, np.nan, np.nan]])
+
+        step = scorer.network_scores(durations, 7, "step")
+        self.assertEqual(step.dtype, np.int64)
+        self.assertEqual(step.tolist(), [6 - 12, 0])
+        np.testing.assert_allclose(scorer.network_scores(durations, 7, "linear"), [6 * 6 / 7 - 12 / 7, 0])
+        with self.assertRaises(ValueError):
+            scorer.network_scores(np.array([[1.0, 1.0, 1.0]]), 7)
+
+    def test_network_mode_on_graph(self):
+        service = make_service()
+        points = [(30.0, 60.0, "park"), (30.004, 60.002, "railway_station"), (30.0, 60.0005, "power")]
+        scorer = AttractionScorer.from_points(points)
+        centers = [(30.0, 60.0), (30.004, 60.002), (31.0, 61.0)]
+
+        matrix = asyncio.run(service.travel_time_matrix(centers, [p[:2] for p in points], max_minutes=2))
+        scores = scorer.network_scores(matrix["durations"], 2)
+
+        # от (30.0, 60.0) за 2 минуты достижимы парк и подстанция, вокзал — нет
+        self.assertEqual(scores.tolist(), [6 - 8, 15, 0])
+
+    def test_network_mode_snaps_criteria_once(self):
+        service = make_service()
+        rows = [(1, "30.0", "60.0", "park", False), (2, "30.004", "60.002", "railway_station", False),
+                (3, "30.0", "60.0005", "power", True)]
+        scorer = AttractionScorer.from_columns(CriteriaColumns.from_rows(rows))
+        centers = [(30.0, 60.0), (30.004, 60.002)]
+        registry = GraphRegistry([], default_service=service)
+
+        with patch.object(geometry_isochrone, "graph_registry", registry), \
+                patch.object(service, "snap_points", wraps=service.snap_points) as snap:
+            first = asyncio.run(geometry_isochrone.network_attraction_scores(centers, scorer, 2))
+            second = asyncio.run(geometry_isochrone.network_attraction_scores(centers, scorer, 2))
+            # центры — на каждый запрос, критерии — один раз
+            self.assertEqual(snap.call_count, 3)
+
+            service._set_graph(service._graph)
+            asyncio.run(geometry_isochrone.network_attraction_scores(centers, scorer, 2))
+            self.assertEqual(snap.call_count, 5)
+
+        self.assertEqual(first.tolist(), second.tolist())
+        with self.assertRaises(ValueError):
+            asyncio.run(geometry_isochrone.network_attraction_scores(centers, scorer, 2, decay="cubic"))
+
+
+if __name__ == "__main__":
+    unittest.main()
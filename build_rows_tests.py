@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+
+import app as app_module
+from bd_models import Build
+from config import get_async_session
+from models import BuildBase, BuildsListResponse
+from services.build_rows import BUILD_COLUMNS, fetch_builds_json, stream_builds_ndjson
+
+BUILDS = 40
+
+
+class BuildRowsTest(unittest.TestCase):
+    def test_columns_match_response_model(self):
+        # быстрый путь пропускает валидацию, поэтому набор и порядок полей должны совпадать
+        self.assertEqual([column.key for column in BUILD_COLUMNS], list(BuildBase.model_fields))
+
+
+class BuildRowsQueryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(self.tmp.name, 'builds.db')}")
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+
+        async def fill():
+            async with self.engine.begin() as conn:
+                await conn.run_sync(SQLModel.metadata.create_all)
+            async with self.session_factory() as session:
+                for i in range(BUILDS):
+                    session.add(Build(
+                        id=i + 1, name=f"Дом {i}", category="park" if i % 2 else "school",
+                        phone=None if i % 2 else "+7 812 000", longtitude=f"30.{i}", latitude="60.0",
+                    ))
+                await session.commit()
+
+        asyncio.run(fill())
+
+    def tearDown(self):
+        asyncio.run(self.engine.dispose())
+        self.tmp.cleanup()
+
+    def _reference(self, *conditions) -> dict:
+        """Ответ старым путём: ORM-объекты, model_dump() и BuildsListResponse."""
+        async def run():
+            async with self.session_factory() as session:
+                builds = (await session.execute(select(Build).where(*conditions))).scalars().all()
+            return BuildsListResponse(status="success", builds=[b.model_dump() for b in builds]).model_dump()
+
+        return asyncio.run(run())
+
+    def _json(self, *conditions) -> dict:
+        async def run():
+            async with self.session_factory() as session:
+                return await fetch_builds_json(session, *conditions)
+
+        return json.loads(asyncio.run(run()))
+
+    def _ndjson(self, *conditions, chunk_rows=2) -> list:
+        async def run():
+            return [chunk async for chunk in stream_builds_ndjson(self.session_factory, *conditions, chunk_rows=chunk_rows)]
+
+        return asyncio.run(run())
+
+    def test_json_matches_response_model(self):
+        self.assertEqual(self._json(Build.category == "school"), self._reference(Build.category == "school"))
+        self.assertEqual(self._json(), self._reference())
+
+    def test_json_empty_result(self):
+        self.assertEqual(self._json(Build.category == "none"), {"status": "success", "builds": []})
+
+    def test_ndjson_one_build_per_line(self):
+        chunks = self._ndjson()
+        body = b"".join(chunks)
+
+        # порции по 2 строки, каждая порция — целые строки
+        self.assertEqual(len(chunks), BUILDS // 2)
+        self.assertTrue(all(chunk.endswith(b"\n") for chunk in chunks))
+        lines = body.split(b"\n")
+        self.assertEqual(lines[-1], b"")
+        self.assertEqual([json.loads(line) for line in lines[:-1]], self._reference()["builds"])
+
+    def test_ndjson_empty_result(self):
+        self.assertEqual(self._ndjson(Build.category == "none"), [])
+
+    def test_ndjson_endpoint_is_not_gzipped(self):
+        async def session():
+            async with self.session_factory() as s:
+                yield s
+
+        app_module.app.dependency_overrides[get_async_session] = session
+        self.addCleanup(app_module.app.dependency_overrides.clear)
+        with patch.object(app_module, "AsyncSessionLocal", self.session_factory):
+            client = TestClient(app_module.app)
+            stream = client.get("/api/builds/by-category/park?format=ndjson", headers={"Accept-Encoding": "gzip"})
+            listing = client.get("/api/builds/by-category/park", headers={"Accept-Encoding": "gzip"})
+
+        self.assertEqual(stream.status_code, 200)
+        self.assertEqual(stream.headers["content-type"], "application/x-ndjson")
+        self.assertNotIn("content-encoding", stream.headers)
+        self.assertEqual([json.loads(line) for line in stream.text.splitlines()],
+                         self._reference(Build.category == "park")["builds"])
+        # обычный список того же размера сжимается
+        self.assertEqual(listing.headers["content-encoding"], "gzip")
+        self.assertEqual(listing.json(), self._reference(Build.category == "park"))
+
+
+if __name__ == "__main__":
+    unittest.main()
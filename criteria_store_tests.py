@@ -0,0 +1,107 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from services.attraction_scoring import AttractionScorer
+from services.criteria_store import CriteriaColumns, CriteriaStore
+
+ROWS = [
+    (3, "30,02", "60.0", "industrial", True),
+    (1, "30.0", "60.0", "park", False),
+    (2, "30.01", None, "park", False),
+    (4, "30.03", "60.01", None, False),
+]
+
+
+class CriteriaColumnsTest(unittest.TestCase):
+    def test_columns_from_rows(self):
+        columns = CriteriaColumns.from_rows(ROWS)
+
+        self.assertEqual(columns.ids.tolist(), [1, 3, 4])
+        np.testing.assert_allclose(columns.lon, [30.0, 30.02, 30.03])
+        self.assertEqual(columns.category_names.tolist(), ["park", "industrial", None])
+        self.assertEqual(columns.antiattractive.tolist(), [False, True, False])
+        with self.assertRaises(ValueError):
+            columns.lon[0] = 0.0
+
+    def test_version_depends_on_content_only(self):
+        version = CriteriaColumns.from_rows(ROWS).version
+
+        self.assertEqual(CriteriaColumns.from_rows(ROWS[::-1]).version, version)
+        changed = [(1, "30.0", "60.0", "power", False)] + ROWS[:1] + ROWS[2:]
+        self.assertNotEqual(CriteriaColumns.from_rows(changed).version, version)
+
+    def test_append_matches_full_load(self):
+        extra = [(5, "30.04", "60.0", "railway_station", False), (6, "30.05", "60.0", "park", False)]
+
+        appended = CriteriaColumns.from_rows(ROWS).append(CriteriaColumns.from_rows(extra))
+        full = CriteriaColumns.from_rows(ROWS + extra)
+
+        self.assertEqual(appended.version, full.version)
+        self.assertEqual(appended.category_names.tolist(), full.category_names.tolist())
+
+    def test_scorer_from_columns(self):
+        columns = CriteriaColumns.from_rows(ROWS)
+        points = list(zip(columns.lon.tolist(), columns.lat.tolist(), columns.category_names.tolist()))
+
+        scorer = AttractionScorer.from_columns(columns)
+        reference = AttractionScorer.from_points(points)
+
+        self.assertEqual(scorer.codes.tolist(), reference.codes.tolist())
+        self.assertEqual(scorer.unknown.tolist(), [False, False, True])
+
+
+class CriteriaStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.rows = list(ROWS)
+        self.queries = []
+
+        async def probe(session):
+            return len(self.rows), max(r[0] for r in self.rows)
+
+        async def rows(session, after_id=None):
+            self.queries.append(after_id)
+            return [r for r in self.rows if after_id is None or r[0] > after_id]
+
+        for target, fn in (("fetch_probe", probe), ("fetch_rows", rows)):
+            patcher = patch(f"services.criteria_store.{target}", fn)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_unchanged_table_is_not_read(self):
+        store = CriteriaStore()
+
+        self.assertTrue(asyncio.run(store.refresh(None)))
+        self.assertFalse(asyncio.run(store.refresh(None)))
+        asyncio.run(store.get(None))
+        self.assertEqual(self.queries, [None])
+
+    def test_new_rows_are_read_incrementally(self):
+        store = CriteriaStore()
+        asyncio.run(store.refresh(None))
+
+        self.rows.append((7, "30.06", "60.0", "education", False))
+        self.assertTrue(asyncio.run(store.refresh(None)))
+
+        self.assertEqual(self.queries, [None, 4])
+        self.assertEqual(store.columns.version, CriteriaColumns.from_rows(self.rows).version)
+        self.assertEqual(store.stats()["incremental_loads"], 1)
+
+    def test_deleted_rows_trigger_full_reload(self):
+        store = CriteriaStore()
+        asyncio.run(store.refresh(None))
+
+        del self.rows[1]
+        self.rows.append((8, "30.07", "60.0", "park", False))
+        self.rows.append((9, "30.08", "60.0", "park", False))
+        self.assertTrue(asyncio.run(store.refresh(None)))
+
+        # хвост не сходится с количеством строк — таблица перечитана целиком
+        self.assertEqual(self.queries, [None, 4, None])
+        self.assertEqual(store.columns.ids.tolist(), [3, 4, 8, 9])
+
+
+if __name__ == "__main__":
+    unittest.main()
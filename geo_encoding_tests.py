@@ -0,0 +1,46 @@
+import base64
+import unittest
+
+import shapely
+from shapely.geometry import Polygon, MultiPolygon, mapping
+
+from services.geo_encoding import encode_geometry, to_twkb, encode_varints
+
+
+class GeoEncodingTest(unittest.TestCase):
+    def test_varints(self):
+        self.assertEqual(encode_varints([0, 1, 127, 128, 300]).hex(), "00017f8001ac02")
+
+    def test_twkb_polygon(self):
+        # тип 3, точность 0, без флагов; одно кольцо из 4 точек, дельты в zigzag
+        twkb = to_twkb(Polygon([(0, 0), (1, 0), (1, 1), (0, 0)]), precision=0)
+
+        self.assertEqual(twkb.hex(), "030001040000020000020101")
+
+    def test_twkb_multipolygon_is_smaller_than_wkb(self):
+        square = Polygon([(30.0, 60.0), (30.01, 60.0), (30.01, 60.01), (30.0, 60.01)])
+        geom = MultiPolygon([square, shapely.affinity.translate(square, 0.02)]).segmentize(0.0005)
+
+        twkb = to_twkb(geom, precision=6)
+
+        self.assertEqual(twkb[0], 6 | (12 << 4))
+        self.assertLess(len(twkb), len(shapely.to_wkb(geom)) / 3)
+
+    def test_encode_geometry_precision(self):
+        geometry = mapping(Polygon([(30.1234567, 60.7654321), (30.2, 60.7), (30.2, 60.8)]))
+
+        rounded = encode_geometry(geometry, "geojson", precision=3)
+        self.assertEqual(rounded["coordinates"][0][0], (30.123, 60.765))
+
+        wkb = encode_geometry(geometry, "wkb", precision=3)
+        self.assertEqual(mapping(shapely.from_wkb(base64.b64decode(wkb))), rounded)
+
+        self.assertIs(encode_geometry(geometry), geometry)
+        with self.assertRaises(ValueError):
+            encode_geometry(geometry, "twkb", precision=9)
+        with self.assertRaises(ValueError):
+            encode_geometry(geometry, "flatgeobuf")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+from pyproj import Geod
+
+from services.geo_utils import local_projection, buffer_points
+from services.buffer_service import build_buffers_for_points
+
+
+class GeoUtilsTest(unittest.TestCase):
+    def test_projection_round_trip(self):
+        lon = np.array([37.60, 37.65, 37.70])
+        lat = np.array([55.70, 55.75, 55.80])
+        projection = local_projection(lon, lat)
+
+        x, y = projection.to_metric(lon, lat)
+        back_lon, back_lat = projection.to_lonlat(x, y)
+
+        np.testing.assert_allclose(back_lon, lon)
+        np.testing.assert_allclose(back_lat, lat)
+
+    def test_projection_is_cached_per_extent(self):
+        first = local_projection([37.60, 37.70], [55.70, 55.80])
+        second = local_projection([37.601, 37.699], [55.701, 55.799])
+
+        self.assertIs(first, second)
+
+    def test_buffer_radius_is_in_real_metres(self):
+        geod = Geod(ellps="WGS84")
+        lon, lat = np.array([37.62]), np.array([55.75])
+
+        polygon = buffer_points(lon, lat, 500)[0]
+
+        vx, vy = np.array(polygon.exterior.coords).T
+        _, _, dist = geod.inv(np.full(len(vx), lon[0]), np.full(len(vy), lat[0]), vx, vy)
+        np.testing.assert_allclose(dist, 500, rtol=0.01)
+
+    def test_build_buffers_for_points(self):
+        buffers = build_buffers_for_points(np.array([37.62, 37.63]), np.array([55.75, 55.76]))
+
+        self.assertEqual(len(buffers), 2)
+        self.assertEqual(buffers[0][0], buffers[0][-1])
+        self.assertEqual(build_buffers_for_points(np.empty(0), np.empty(0)), [])
+
+if __name__ == "__main__":
+    unittest.main()
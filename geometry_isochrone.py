@@ -1,4 +1,8 @@
-from services.iso_service import isochrone_service
+import numpy as np
+from services.attraction_scoring import (
+    AttractionScorer, DECAY_FUNCTIONS, DEFAULT_DECAY, DEFAULT_SCORE_MODE, SCORE_MINUTES, SCORE_MODES, attraction_weight,
+)
+from services.graph_registry import graph_registry
 from shapely.geometry import Point, Polygon as ShapelyPolygon
 
 class Vector:
@@ -134,45 +138,72 @@ class Polygon:
 		return poly.contains(Point(point_lon, point_lat))
 
 def attraction_score_by_category(atractive_category: str):
-	match atractive_category:
-		case "railway_station": return 15
-		case "business_center": return 10
-		case "education": return 8
-		case "pedestrian_zone": return 7
-		case "park": return 6
-		case "industrial": return -12
-		case "wastewater_plant": return -15
-		case "military": return -10
-		case "power": return -8
-		case _: raise ValueError("такая категория не поддерживается")
-
-def calculate_attraction(polygon_vectors: list[tuple[float, float]], point: tuple[float, float], atractive_category: str):
-    if ShapelyPolygon(polygon_vectors).contains(Point(point[0], point[1])):
-        return attraction_score_by_category(atractive_category)
-    return 0
-
-def calculate_attractions(polygon_vectors: list[tuple[float, float]], points: list[tuple[float, float, str]]):
-    acc_score = 0
-    poly = ShapelyPolygon(polygon_vectors)
-    for x, y, atractive_category in points:
-        if poly.contains(Point(x, y)):
-            acc_score += attraction_score_by_category(atractive_category)
-    return acc_score
-
-async def build_isochrone_polygon(x: float, y: float, time: int = 7):
-    isochrones_data = await isochrone_service.calculate_isochrones([(x, y)], time)
-    isochrone_polygon = isochrones_data[0]["polygon"]
+	return attraction_weight(atractive_category)
 
-    if isochrone_polygon["type"] == "MultiPolygon":
-        raise ValueError("MultiPolygon не поддерживается")
+def _as_geometry(polygon):
+    """Shapely-геометрия как есть, список вершин — Polygon."""
+    return polygon if hasattr(polygon, "geom_type") else ShapelyPolygon(polygon)
 
-    return [tuple(coord) for coord in isochrone_polygon["coordinates"][0]]
+def calculate_attraction(polygon_vectors, point: tuple[float, float], atractive_category: str):
+    if _as_geometry(polygon_vectors).contains(Point(point[0], point[1])):
+        return attraction_score_by_category(atractive_category)
+    return 0
 
-async def calculate_attractions_by_category(centers: list[tuple[float, float]], points: list[tuple[float, float, str]]):
+def calculate_attractions(polygon_vectors, points: list[tuple[float, float, str]]):
+    """polygon_vectors — список вершин или shapely Polygon/MultiPolygon."""
+    return AttractionScorer.from_points(points).score(_as_geometry(polygon_vectors))
+
+async def build_isochrone_geometries(centers: list[tuple[float, float]], time: int = SCORE_MINUTES):
+    """
+    Изохроны всех центров одним пакетом: shapely Polygon или MultiPolygon
+    для каждого центра, None — центр далеко от дорог.
+    """
+    service = await graph_registry.service_for(centers)
+    return await service.isochrone_geometries(centers, time)
+
+async def network_attraction_scores(
+    centers: list[tuple[float, float]],
+    scorer: AttractionScorer,
+    time: int = SCORE_MINUTES,
+    decay: str = DEFAULT_DECAY,
+):
+    """
+    Оценки центров без полигонов: из каждого центра — один ограниченный
+    поиск, время до критериев берётся прямо из массива расстояний.
+    Критерии известной версии (scorer.version) привязываются к графу один
+    раз на версию критериев и графа; на запрос — только поиски из центров.
+    """
+    if decay not in DECAY_FUNCTIONS:
+        raise ValueError(f"Неизвестная функция затухания: {decay}")
+    service = await graph_registry.service_for(centers)
+    criteria = np.column_stack((scorer.lon, scorer.lat))
+    key = ("criteria", scorer.version) if scorer.version is not None else None
+    matrix = await service.travel_time_matrix(centers, criteria, max_minutes=time, destinations_key=key)
+    return scorer.network_scores(matrix["durations"], time, decay)
+
+async def calculate_attractions_by_category(
+		centers: list[tuple[float, float]],
+		points: list[tuple[float, float, str]] | AttractionScorer,
+		mode: str = DEFAULT_SCORE_MODE,
+		decay: str = DEFAULT_DECAY,
+):
+		"""
+		points — (lon, lat, категория) или готовый AttractionScorer;
+		mode — isochrone (попадание в полигон) или network (время в пути с затуханием decay).
+		"""
+		if mode not in SCORE_MODES:
+			raise ValueError(f"Неизвестный способ оценки: {mode}")
 		result = []
-		for x, y in centers:
-			polygon_vectors = await build_isochrone_polygon(x, y)
-			score = calculate_attractions(polygon_vectors, points)
+		if not centers:
+			return result
+		scorer = points if isinstance(points, AttractionScorer) else AttractionScorer.from_points(points)
+		if mode == "network":
+			scores = await network_attraction_scores(centers, scorer, decay=decay)
+		else:
+			geometries = await build_isochrone_geometries(centers)
+			# Все центры оцениваются одним векторным проходом по критериям
+			scores = scorer.scores(geometries)
+		for (x, y), score in zip(centers, scores.tolist()):
 			result.append((x, y, score))
 		return result
 
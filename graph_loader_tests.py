@@ -0,0 +1,134 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from sqlalchemy import update
+from sqlmodel import select
+
+from bd_models import RoadNode, RoadRib
+from graph_snapshot_tests import make_road_db
+from services import graph_loader
+from services.graph_loader import load_road_graph
+from services.road_graph import RoadGraph
+from services.travel_profiles import parse_max_speeds
+
+SIZE = 4
+
+
+class GraphLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine, self.session_factory = asyncio.run(make_road_db(os.path.join(self.tmp.name, "roads.db"), size=SIZE))
+
+    def tearDown(self):
+        asyncio.run(self.engine.dispose())
+        self.tmp.cleanup()
+
+    def _run(self, fn):
+        async def run():
+            async with self.session_factory() as session:
+                return await fn(session)
+
+        return asyncio.run(run())
+
+    def _load(self, **kwargs):
+        return self._run(lambda session: load_road_graph(session, RoadGraph, chunk_rows=3, **kwargs))
+
+    def _reference(self, bbox=None):
+        """Граф из тех же строк через RoadGraph.from_edges, без загрузчика."""
+        async def rows(session):
+            nodes = (await session.execute(select(RoadNode))).scalars().all()
+            ribs = (await session.execute(select(RoadRib))).scalars().all()
+            return nodes, ribs
+
+        nodes, ribs = self._run(rows)
+        nodes = [n for n in nodes if n.longtitude is not None and n.latitude is not None]
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            nodes = [n for n in nodes if min_lon <= n.longtitude <= max_lon and min_lat <= n.latitude <= max_lat]
+            inside = {n.node_id for n in nodes}
+            ribs = [r for r in ribs if r.start_node_id in inside and r.end_node_id in inside]
+        ribs = [r for r in ribs if None not in (r.start_node_id, r.end_node_id, r.length)]
+        return RoadGraph.from_edges(
+            [n.node_id for n in nodes], [float(n.longtitude) for n in nodes], [float(n.latitude) for n in nodes],
+            [r.start_node_id for r in ribs], [r.end_node_id for r in ribs], [float(r.length) for r in ribs],
+            parse_max_speeds([r.max_speed for r in ribs]),
+        )
+
+    def _edit(self, *statements, add=()):
+        async def edit(session):
+            for statement in statements:
+                await session.execute(statement)
+            session.add_all(add)
+            await session.commit()
+
+        self._run(edit)
+
+    def assertSameGraph(self, graph, reference):
+        expected = reference.core_arrays()
+        actual = graph.core_arrays()
+        self.assertEqual(sorted(actual), sorted(expected))
+        for name, array in expected.items():
+            np.testing.assert_allclose(actual[name], array, err_msg=name)
+
+    def test_matches_from_edges(self):
+        self._edit(update(RoadRib).where(RoadRib.id <= 4).values(max_speed="20"),
+                   update(RoadRib).where(RoadRib.id == 5).values(max_speed="RU:urban"))
+
+        graph, stats = self._load()
+
+        self.assertSameGraph(graph, self._reference())
+        self.assertEqual(stats["nodes_total"], SIZE * SIZE)
+        self.assertEqual(stats["ribs_total"], 2 * SIZE * (SIZE - 1))
+        self.assertEqual((stats["nodes_rejected"], stats["ribs_rejected"], stats["ribs_dropped"]), (0, 0, 0))
+
+    def test_invalid_rows_are_counted(self):
+        self._edit(
+            update(RoadNode).where(RoadNode.node_id == 1000 + SIZE * SIZE - 1).values(latitude=None),
+            add=[
+                RoadRib(id=100, start_node_id=1000, end_node_id=1001, length=None),
+                RoadRib(id=101, start_node_id=None, end_node_id=1001, length=10),
+                # неизвестный узел, петля и параллельное ребро доходят до сборки графа
+                RoadRib(id=102, start_node_id=1000, end_node_id=999999, length=10),
+                RoadRib(id=103, start_node_id=1001, end_node_id=1001, length=10),
+                RoadRib(id=104, start_node_id=1001, end_node_id=1000, length=50),
+            ],
+        )
+
+        graph, stats = self._load()
+
+        self.assertSameGraph(graph, self._reference())
+        self.assertEqual(stats["nodes_rejected"], 1)
+        self.assertEqual(stats["ribs_rejected"], 2)
+        # 3 отброшенных + 2 ребра к узлу без координат
+        self.assertEqual(stats["ribs_dropped"], 5)
+        self.assertEqual(graph.node_count, SIZE * SIZE - 1)
+
+    def test_bbox_keeps_ribs_inside_region(self):
+        # два левых столбца решётки
+        bbox = (29.9995, 59.9995, 30.0015, 60.1)
+
+        graph, stats = self._load(bbox=bbox)
+
+        self.assertSameGraph(graph, self._reference(bbox))
+        self.assertEqual(stats["nodes_total"], 2 * SIZE)
+        # вертикальные рёбра обоих столбцов и горизонтальные между ними
+        self.assertEqual(stats["ribs_total"], 3 * SIZE - 2)
+        self.assertEqual(graph.edge_count, 3 * SIZE - 2)
+
+    def test_rows_beyond_count_grow_arrays(self):
+        query = select(RoadNode.node_id).order_by(RoadNode.node_id)
+
+        with patch.object(graph_loader, "_grow", wraps=graph_loader._grow) as grow:
+            # строк больше, чем насчитали (например, добавились между count и чтением)
+            (node_ids,) = self._run(lambda session: graph_loader._stream_columns(session, query, 1, [np.int64], 3))
+
+        self.assertGreater(grow.call_count, 0)
+        self.assertEqual(node_ids.tolist(), list(range(1000, 1000 + SIZE * SIZE)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import update
+
+from bd_models import RoadRib
+from graph_snapshot_tests import make_road_db
+from road_graph_tests import make_grid
+from services.graph_registry import GraphRegistry, load_regions
+from services.iso_service import IsochroneService
+
+REGIONS = [
+    {"name": "north", "bbox": [29.9, 59.9, 30.1, 60.1]},
+    {"name": "south", "bbox": [29.9, 54.9, 30.1, 55.1]},
+    {"name": "east", "bbox": [39.9, 54.9, 40.1, 55.1]},
+]
+
+
+class FakeRegistry(GraphRegistry):
+    """Регионы собираются из тестовой решётки вместо БД."""
+
+    async def _create_service(self, name):
+        service = IsochroneService(workers=0)
+        service._set_graph(make_grid())
+        service._initialized = True
+        return service
+
+
+class GraphRegistryTest(unittest.TestCase):
+    def test_region_for_picks_majority(self):
+        registry = FakeRegistry(REGIONS)
+
+        self.assertEqual(registry.region_for([(30.0, 60.0)]), "north")
+        self.assertEqual(registry.region_for([(30.0, 60.0), (30.0, 55.0), (30.05, 55.05)]), "south")
+        with self.assertRaises(ValueError):
+            registry.region_for([(10.0, 10.0)])
+
+    def test_lazy_load_and_hits(self):
+        registry = FakeRegistry(REGIONS)
+
+        async def scenario():
+            first = await registry.get("north")
+            second = await registry.get("north")
+            return first, second
+
+        first, second = asyncio.run(scenario())
+
+        self.assertIs(first, second)
+        stats = registry.stats()["regions"]
+        self.assertEqual(stats["north"]["loads"], 1)
+        self.assertEqual(stats["north"]["hits"], 1)
+        self.assertFalse(stats["south"]["loaded"])
+
+    def test_lru_eviction_under_budget(self):
+        one_region = FakeRegistry(REGIONS)
+        asyncio.run(one_region.get("north"))
+        budget = 2 * one_region.memory_bytes() + 1
+        registry = FakeRegistry(REGIONS, memory_budget=budget)
+
+        async def scenario():
+            await registry.get("north")
+            await registry.get("south")
+            await registry.get("north")
+            await registry.get("east")
+
+        asyncio.run(scenario())
+
+        stats = registry.stats()
+        self.assertTrue(stats["regions"]["north"]["loaded"])
+        self.assertTrue(stats["regions"]["east"]["loaded"])
+        self.assertFalse(stats["regions"]["south"]["loaded"])
+        self.assertEqual(stats["regions"]["south"]["evictions"], 1)
+        self.assertLessEqual(stats["memory_bytes"], budget)
+
+    def test_single_region_uses_default_service(self):
+        default = IsochroneService(workers=0)
+        registry = GraphRegistry([], default_service=default)
+
+        service = asyncio.run(registry.service_for([(10.0, 10.0)]))
+
+        self.assertIs(service, default)
+
+    def test_load_regions_validates_bbox(self):
+        self.assertEqual(load_regions(""), [])
+        with self.assertRaises(ValueError):
+            load_regions('[{"name": "bad", "bbox": [1, 2, 3]}]')
+
+
+class GraphRegistryReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.snapshot = os.path.join(self.tmp.name, "graph.snapshot")
+        patcher = patch("services.graph_registry.GRAPH_SNAPSHOT_PATH", self.snapshot)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_reload_goes_to_loaded_regions_only(self):
+        default = IsochroneService(workers=0)
+
+        async def scenario():
+            engine, session_factory = await make_road_db(os.path.join(self.tmp.name, "roads.db"))
+            registry = GraphRegistry(REGIONS, default_service=default, session_factory=session_factory)
+            try:
+                north = await registry.get("north")
+                async with session_factory() as session:
+                    unchanged = await registry.changed_regions(session)
+                    await session.execute(update(RoadRib).values(length=160.0))
+                    await session.commit()
+                    changed = await registry.changed_regions(session)
+                reloaded = await registry.reload()
+                info = registry.graph_info()
+            finally:
+                registry.shutdown()
+                await engine.dispose()
+            return north, unchanged, changed, reloaded, info
+
+        north, unchanged, changed, reloaded, info = asyncio.run(scenario())
+
+        self.assertEqual(unchanged, [])
+        self.assertEqual(changed, ["north"])
+        self.assertEqual(reloaded, {"north": True})
+        self.assertEqual(north.graph_version, 2)
+        self.assertEqual(north.bbox, tuple(REGIONS[0]["bbox"]))
+        # общий граф не загружался, его снимок не перезаписан
+        self.assertEqual(default.graph_version, 0)
+        self.assertTrue(os.path.exists(f"{self.snapshot}.north"))
+        self.assertFalse(os.path.exists(self.snapshot))
+        self.assertIsNone(info["version"])
+        self.assertEqual(info["nodes"], 9)
+        self.assertEqual(list(info["regions"]), ["north"])
+        self.assertEqual(info["regions"]["north"]["version"], 2)
+
+    def test_stats_sum_loaded_regions(self):
+        registry = FakeRegistry(REGIONS)
+
+        async def scenario():
+            for name in ("north", "south"):
+                service = await registry.get(name)
+                await service.calculate_isochrones([(30.002, 60.001)], 2)
+
+        asyncio.run(scenario())
+
+        self.assertEqual(registry.cache_stats()["entries"], 2)
+        self.assertEqual(registry.executor_stats()["completed"], 2)
+        with self.assertRaises(RuntimeError):
+            registry.default_service
+
+
+if __name__ == "__main__":
+    unittest.main()
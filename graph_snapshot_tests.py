@@ -0,0 +1,139 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from bd_models import RoadNode, RoadRib
+from road_graph_tests import make_grid
+from services.graph_snapshot import (
+    SnapshotError, fetch_source_fingerprint, load_snapshot, read_manifest, save_snapshot,
+)
+
+
+async def make_road_db(path: str, size: int = 3, step_m: float = 80.0):
+    """
+    SQLite-база с таблицами road_nodes/road_ribs и решёткой size x size
+    (те же узлы и рёбра, что make_grid). Возвращает (engine, фабрика сессий).
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_factory() as session:
+        rib_id = 1
+        for i in range(size):
+            for j in range(size):
+                nid = 1000 + i * size + j
+                session.add(RoadNode(node_id=nid, longtitude=30.0 + j * 0.001, latitude=60.0 + i * 0.0005))
+                for neighbour, ok in ((nid + 1, j + 1 < size), (nid + size, i + 1 < size)):
+                    if ok:
+                        session.add(RoadRib(id=rib_id, start_node_id=nid, end_node_id=neighbour, length=step_m))
+                        rib_id += 1
+        await session.commit()
+    return engine, session_factory
+
+
+class GraphSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "graph.snapshot")
+        self.source = {"road_nodes": [25, 1024], "road_ribs": [40, 40]}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_is_memory_mapped(self):
+        graph = make_grid()
+        save_snapshot(graph, self.path, self.source, speed_m_per_min=80.0)
+
+        loaded, manifest = load_snapshot(self.path, source=self.source, speed_m_per_min=80.0)
+
+        self.assertEqual(manifest["node_count"], graph.node_count)
+        # массивы не копируются в память, а ссылаются на mmap файла
+        self.assertFalse(loaded.indices.flags.owndata)
+        self.assertIsInstance(loaded.indices.base, np.memmap)
+        loaded_arrays = loaded.core_arrays()
+        for name, arr in graph.core_arrays().items():
+            np.testing.assert_array_equal(loaded_arrays[name], arr)
+        np.testing.assert_allclose(loaded.shortest_times([0]), graph.shortest_times([0]))
+
+    def test_stale_source_is_rejected(self):
+        save_snapshot(make_grid(), self.path, self.source, speed_m_per_min=80.0)
+
+        with self.assertRaises(SnapshotError):
+            load_snapshot(self.path, source={"road_nodes": [26, 1025], "road_ribs": [40, 40]})
+        with self.assertRaises(SnapshotError):
+            load_snapshot(self.path, speed_m_per_min=60.0)
+
+    def test_corrupted_array_is_rejected(self):
+        save_snapshot(make_grid(), self.path, self.source)
+        arr = np.load(os.path.join(self.path, "time_walk.npy"), mmap_mode="r+")
+        arr[0] += 1
+        arr.flush()
+        del arr
+
+        with self.assertRaises(SnapshotError):
+            load_snapshot(self.path)
+
+    def test_missing_snapshot(self):
+        with self.assertRaises(SnapshotError):
+            read_manifest(self.path)
+
+    def test_save_replaces_existing_snapshot(self):
+        save_snapshot(make_grid(size=3), self.path, self.source)
+        save_snapshot(make_grid(size=4), self.path, self.source)
+
+        loaded, _ = load_snapshot(self.path)
+
+        self.assertEqual(loaded.node_count, 16)
+        self.assertFalse(os.path.exists(self.path + ".old"))
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+
+class SourceFingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "graph.snapshot")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_update_without_new_rows_makes_snapshot_stale(self):
+        async def scenario():
+            engine, session_factory = await make_road_db(os.path.join(self.tmp.name, "roads.db"))
+            try:
+                async with session_factory() as session:
+                    source = await fetch_source_fingerprint(session)
+                    self.assertEqual(source, await fetch_source_fingerprint(session))
+                    save_snapshot(make_grid(size=3), self.path, source)
+
+                    # Количество строк и ключи прежние, меняется только содержимое
+                    await session.execute(update(RoadRib).where(RoadRib.id == 2).values(length=120.0))
+                    await session.commit()
+                    by_length = await fetch_source_fingerprint(session)
+                    await session.execute(update(RoadNode).where(RoadNode.node_id == 1004).values(latitude=60.01))
+                    await session.commit()
+                    by_coords = await fetch_source_fingerprint(session)
+            finally:
+                await engine.dispose()
+            return source, by_length, by_coords
+
+        source, by_length, by_coords = asyncio.run(scenario())
+
+        self.assertEqual(by_length["road_ribs"][:2], source["road_ribs"][:2])
+        self.assertEqual(by_coords["road_nodes"][:2], source["road_nodes"][:2])
+        self.assertNotEqual(by_length["road_ribs"], source["road_ribs"])
+        self.assertNotEqual(by_coords["road_nodes"], by_length["road_nodes"])
+        load_snapshot(self.path, source=source)
+        for changed in (by_length, by_coords):
+            with self.assertRaises(SnapshotError):
+                load_snapshot(self.path, source=changed)
+
+
+if __name__ == "__main__":
+    unittest.main()
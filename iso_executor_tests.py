@@ -0,0 +1,86 @@
+import asyncio
+import functools
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from shapely.geometry import shape
+
+from road_graph_tests import make_grid
+from services.graph_snapshot import load_snapshot, save_snapshot
+from services.iso_executor import IsochroneExecutor
+from services.iso_service import IsochroneService
+
+
+def _crash(self):
+    os._exit(1)
+
+
+class IsochroneExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "graph.snapshot")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _isochrone(self, service, minutes=2):
+        result = asyncio.run(service.calculate_isochrones([(30.002, 60.001)], minutes))
+        return shape(result[0]["polygon"])
+
+    def test_worker_refuses_rewritten_snapshot(self):
+        save_snapshot(make_grid(size=5), self.path)
+        graph, _ = load_snapshot(self.path)
+        service = IsochroneService(workers=1)
+        try:
+            service._set_graph(graph)
+            service._initialized = True
+            # Снимок перезаписан до старта процессов пула
+            save_snapshot(make_grid(size=3), self.path)
+
+            first = self._isochrone(service)
+            second = self._isochrone(service, 3)
+            stats = service.executor_stats()
+        finally:
+            service.shutdown()
+
+        inline = IsochroneService(workers=0)
+        inline._set_graph(make_grid(size=5))
+        inline._initialized = True
+        self.assertAlmostEqual(first.symmetric_difference(self._isochrone(inline)).area, 0.0)
+        # новый пул получил массивы графа и посчитал второй запрос без перезапуска
+        self.assertAlmostEqual(second.symmetric_difference(self._isochrone(inline, 3)).area, 0.0)
+        self.assertEqual(stats["restarts"], 1)
+        self.assertEqual(stats["completed"], 2)
+        self.assertEqual(stats["failed"], 0)
+
+    def test_crashed_worker_restarts_pool(self):
+        with patch.object(IsochroneService, "_crash", _crash, create=True):
+            service = IsochroneService(workers=1)
+            try:
+                service._set_graph(make_grid())
+                service._initialized = True
+                executor = service._executor
+                version = service.graph_version
+                local_fn = functools.partial(service._travel_times_from_graph, graph=service._graph)
+
+                crashed = asyncio.run(executor.run(lambda: "local", version, job="_crash"))
+                times = asyncio.run(executor.run(local_fn, version, [0], [1], 15.0, job="_travel_times_from_graph"))
+                stats = service.executor_stats()
+            finally:
+                service.shutdown()
+
+        self.assertEqual(crashed, "local")
+        self.assertAlmostEqual(float(times[0][0]), 1.0, places=5)
+        self.assertEqual(stats["restarts"], 1)
+        self.assertEqual(stats["completed"], 2)
+
+    def test_parallelism_without_pool_follows_cores(self):
+        self.assertEqual(IsochroneExecutor(2).parallelism, 2)
+        with patch("services.iso_executor.os.cpu_count", return_value=6):
+            self.assertEqual(IsochroneExecutor(0).parallelism, 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
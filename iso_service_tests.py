@@ -0,0 +1,348 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from sqlalchemy import update
+
+from shapely.geometry import Point, shape
+
+from bd_models import RoadRib
+from graph_snapshot_tests import make_road_db
+from road_graph_tests import make_grid
+from services.iso_service import IsochroneService
+
+
+def make_service(workers=0):
+    service = IsochroneService(workers=workers)
+    service._set_graph(make_grid())
+    service._initialized = True
+    return service
+
+
+class IsochroneServiceTest(unittest.TestCase):
+    def test_single_band(self):
+        service = make_service()
+
+        result = asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 2))
+
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]["minutes"], 2)
+        self.assertEqual(result[0]["polygon"]["type"], "Polygon")
+
+    def test_bands_are_nested_and_match_single_runs(self):
+        service = make_service()
+
+        bands = asyncio.run(service.calculate_isochrones([(30.002, 60.001)], [3, 1, 2]))
+
+        self.assertEqual([b["minutes"] for b in bands], [1, 2, 3])
+        shapes = [shape(b["polygon"]) for b in bands]
+        for inner, outer in zip(shapes, shapes[1:]):
+            self.assertTrue(outer.buffer(1e-9).contains(inner))
+
+        single = make_service()
+        two = asyncio.run(single.calculate_isochrones([(30.002, 60.001)], 2))
+        self.assertAlmostEqual(shape(two[0]["polygon"]).symmetric_difference(shapes[1]).area, 0.0)
+
+    def test_repeated_request_hits_cache(self):
+        service = make_service()
+
+        first = asyncio.run(service.calculate_isochrones([(30.002, 60.001)], [1, 2]))
+        second = asyncio.run(service.calculate_isochrones([(30.002, 60.001)], [1, 2]))
+
+        self.assertEqual(first, second)
+        self.assertEqual(service.cache_stats()["hits"], 2)
+
+    def test_empty_band_is_cached(self):
+        service = make_service()
+        build = service._build_isochrones_from_graph
+        calls = []
+
+        def without_first_band(start_nodes, bands, *args, **kwargs):
+            # первая полоса пустая, как у старта дальше её порога
+            calls.append(bands)
+            return build(start_nodes, bands, *args, **kwargs)[1:]
+
+        service._build_isochrones_from_graph = without_first_band
+        first = asyncio.run(service.calculate_isochrones([(30.002, 60.001)], [1, 2]))
+        second = asyncio.run(service.calculate_isochrones([(30.002, 60.001)], [1, 2]))
+
+        self.assertEqual([item["minutes"] for item in first], [2])
+        self.assertEqual(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(service.cache_stats()["hits"], 2)
+
+    def test_new_graph_invalidates_cache(self):
+        service = make_service()
+        asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 2))
+
+        service._set_graph(make_grid())
+
+        self.assertEqual(service.cache_stats()["entries"], 0)
+
+    def test_fast_polygon_methods_approximate_buffer(self):
+        service = make_service()
+        exact = shape(asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 2))[0]["polygon"])
+
+        for method in ("hull", "raster"):
+            result = asyncio.run(service.calculate_isochrones([(30.002, 60.001)], [1, 2], method=method))
+            self.assertEqual([r["minutes"] for r in result], [1, 2])
+            approx = shape(result[1]["polygon"])
+            overlap = approx.intersection(exact).area / approx.union(exact).area
+            self.assertGreater(overlap, 0.6, method)
+
+    def test_unknown_polygon_method(self):
+        service = make_service()
+
+        with self.assertRaises(ValueError):
+            asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 2, method="voronoi"))
+
+    def test_process_pool_matches_inline(self):
+        inline = make_service()
+        pooled = make_service(workers=1)
+        try:
+            expected = asyncio.run(inline.calculate_isochrones([(30.002, 60.001)], [1, 2]))
+            result = asyncio.run(pooled.calculate_isochrones([(30.002, 60.001)], [1, 2]))
+        finally:
+            pooled.shutdown()
+
+        self.assertEqual([r["minutes"] for r in result], [1, 2])
+        for a, b in zip(expected, result):
+            self.assertAlmostEqual(shape(a["polygon"]).symmetric_difference(shape(b["polygon"])).area, 0.0)
+        stats = pooled.executor_stats()
+        self.assertEqual(stats["completed"], 1)
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_results_carry_graph_version(self):
+        service = make_service()
+        first = asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 2))
+
+        service._set_graph(make_grid())
+        second = asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 2))
+
+        self.assertEqual(first[0]["graph_version"], 1)
+        self.assertEqual(second[0]["graph_version"], 2)
+
+    def test_in_flight_request_finishes_on_old_graph(self):
+        service = make_service()
+
+        async def scenario():
+            task = asyncio.create_task(service.calculate_isochrones([(30.002, 60.001)], 2))
+            await asyncio.sleep(0)
+            service._set_graph(make_grid(size=3))
+            return await task
+
+        result = asyncio.run(scenario())
+
+        self.assertEqual(result[0]["graph_version"], 1)
+        self.assertEqual(service.graph_version, 2)
+        # результат по старому графу не попадает в кэш новой версии
+        self.assertEqual(service.cache_stats()["entries"], 0)
+
+    def test_snap_points_in_metres(self):
+        service = make_service()
+        # ~11 м к северу от узла 1012 (30.002, 60.001); вторая точка в ~1.1 км от сети
+        idx, dist = service.snap_points([(30.002, 60.0011), (30.002, 60.012)], max_distance=500)
+
+        self.assertEqual(int(service._graph.node_ids[idx[0]]), 1012)
+        self.assertAlmostEqual(float(dist[0]), 11.1, delta=0.5)
+        self.assertEqual(idx[1], -1)
+        self.assertTrue(np.isinf(dist[1]))
+
+    def test_snap_to_edge_seeds_both_ends(self):
+        service = make_service()
+        graph = service._graph
+        # четверть ребра 1012 (30.002) – 1013 (30.003), в 5 м от дороги
+        edge, frac, dist = service.snap_points_to_edges([(30.00225, 60.00105)])
+
+        u, v, _ = graph.edge_ends
+        self.assertEqual(sorted(graph.node_ids[[u[edge[0]], v[edge[0]]]].tolist()), [1012, 1013])
+        self.assertAlmostEqual(float(dist[0]), 5.6, delta=0.5)
+        near = frac[0] if graph.node_ids[u[edge[0]]] == 1012 else 1 - frac[0]
+        self.assertAlmostEqual(float(near), 0.25, places=2)
+
+        node = asyncio.run(service.calculate_isochrones([(30.00225, 60.00105)], 1))
+        on_edge = asyncio.run(service.calculate_isochrones([(30.00225, 60.00105)], 1, snap_mode="edge"))
+        # из точки на ребре за минуту достигаются только 1012 и 1013, а не все соседи 1012
+        polygon = shape(on_edge[0]["polygon"])
+        self.assertTrue(polygon.contains(Point(30.00225, 60.001)))
+        self.assertLess(polygon.area, shape(node[0]["polygon"]).area)
+
+    def test_far_points_are_rejected(self):
+        service = make_service()
+
+        result = asyncio.run(service.calculate_isochrones([(30.002, 60.001), (31.0, 61.0)], 2))
+        self.assertEqual(result[0]["snap"]["snapped"], 1)
+        self.assertEqual(result[0]["snap"]["rejected"], 1)
+
+        with self.assertRaises(ValueError):
+            asyncio.run(service.calculate_isochrones([(31.0, 61.0)], 2))
+
+    def test_travel_time_matrix(self):
+        service = make_service()
+        origins = [(30.0, 60.0), (30.0, 60.0), (31.0, 61.0)]
+        destinations = [(30.004, 60.002), (30.001, 60.0)]
+
+        matrix = asyncio.run(service.travel_time_matrix(origins, destinations, max_minutes=10))
+
+        durations = matrix["durations"]
+        self.assertEqual(durations.shape, (3, 2))
+        np.testing.assert_allclose(durations[0], [8.0, 1.0])
+        np.testing.assert_array_equal(durations[0], durations[1])
+        # точка вне сети не привязана — строка nan
+        self.assertTrue(np.isnan(durations[2]).all())
+        self.assertEqual(matrix["origins_snapped"].tolist(), [True, True, False])
+
+        bounded = asyncio.run(service.travel_time_matrix(origins, destinations, max_minutes=5))
+        self.assertTrue(np.isnan(bounded["durations"][0, 0]))
+
+    def test_travel_time_matrix_splits_across_threads(self):
+        service = make_service()
+        origins = [(30.0 + 0.001 * j, 60.0 + 0.0005 * i) for i in range(5) for j in range(5)]
+        destinations = [(30.004, 60.002), (30.001, 60.0)]
+        reference = asyncio.run(service.travel_time_matrix(origins, destinations, max_minutes=10))
+
+        run = service._executor.run
+        with patch("services.iso_executor.os.cpu_count", return_value=4), \
+                patch.object(service._executor, "run", wraps=run) as calls:
+            matrix = asyncio.run(service.travel_time_matrix(origins, destinations, max_minutes=10))
+
+        # без пула процессов порции идут по потокам, по одной на ядро
+        self.assertEqual(calls.call_count, 4)
+        np.testing.assert_array_equal(matrix["durations"], reference["durations"])
+
+    def test_travel_time_matrix_in_process_pool(self):
+        service = make_service(workers=2)
+        try:
+            points = [(30.0 + 0.001 * j, 60.0 + 0.0005 * i) for i in range(5) for j in range(5)]
+            pooled = asyncio.run(service.travel_time_matrix(points, points, profile="bike"))
+            inline = asyncio.run(make_service().travel_time_matrix(points, points, profile="bike"))
+        finally:
+            service.shutdown()
+
+        np.testing.assert_allclose(pooled["durations"], inline["durations"])
+        self.assertEqual(service.executor_stats()["completed"], 2)
+
+    def test_isochrones_by_source(self):
+        service = make_service()
+        points = [(30.0, 60.0), (30.004, 60.002), (30.0, 60.0), (31.0, 61.0)]
+
+        async def collect():
+            return [item async for item in service.iter_isochrones_by_source(
+                points, [1, 2], ids=["a", "b", "c", "d"], concurrency=1)]
+
+        items = {item["id"]: item for item in asyncio.run(collect())}
+
+        self.assertEqual(sorted(items), ["a", "b", "c", "d"])
+        self.assertIn("error", items["d"])
+        self.assertEqual([i["minutes"] for i in items["a"]["isochrones"]], [1, 2])
+        # одинаковый старт считается один раз
+        self.assertEqual(items["a"]["isochrones"], items["c"]["isochrones"])
+        self.assertEqual(service.executor_stats()["completed"], 2)
+
+        single = asyncio.run(make_service().calculate_isochrones([points[1]], 2))
+        band = shape(items["b"]["isochrones"][1]["polygon"])
+        self.assertAlmostEqual(band.symmetric_difference(shape(single[0]["polygon"])).area, 0.0)
+
+    def test_isochrone_geometries_batch(self):
+        service = make_service(workers=2)
+        points = [(30.0, 60.0), (30.004, 60.002), (30.0, 60.0), (31.0, 61.0)]
+        try:
+            geometries = asyncio.run(service.isochrone_geometries(points, 2))
+        finally:
+            service.shutdown()
+
+        self.assertIsNone(geometries[3])
+        self.assertIs(geometries[0], geometries[2])
+        self.assertEqual(service.executor_stats()["completed"], 2)
+        for point, geom in zip(points[:2], geometries):
+            self.assertIn(geom.geom_type, ("Polygon", "MultiPolygon"))
+            single = shape(asyncio.run(make_service().calculate_isochrones([point], 2))[0]["polygon"])
+            self.assertAlmostEqual(geom.symmetric_difference(single).area, 0.0)
+
+        # повторный пакет берётся из кэша
+        service = make_service()
+        asyncio.run(service.isochrone_geometries(points, 2))
+        asyncio.run(service.isochrone_geometries(points, 2))
+        self.assertEqual(service.executor_stats()["completed"], 2)
+
+    def test_simplify_in_metres(self):
+        service = make_service()
+
+        full = shape(asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 3))[0]["polygon"])
+        simple = shape(asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 3, simplify_m=10))[0]["polygon"])
+
+        self.assertLess(len(simple.exterior.coords), len(full.exterior.coords))
+        self.assertTrue(simple.is_valid)
+        self.assertAlmostEqual(simple.area / full.area, 1.0, delta=0.05)
+        # разные допуски — разные записи кэша
+        self.assertEqual(service.cache_stats()["entries"], 2)
+        with self.assertRaises(ValueError):
+            asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 3, simplify_m=-1))
+
+    def test_time_out_of_range(self):
+        service = make_service()
+
+        with self.assertRaises(ValueError):
+            asyncio.run(service.calculate_isochrones([(30.002, 60.001)], [5, 16]))
+
+    def test_profile_changes_reach_and_time_limit(self):
+        service = make_service()
+
+        walk = asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 2))
+        car = asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 2, profile="car"))
+        # машина за те же минуты уезжает дальше, время до 60 минут допустимо
+        self.assertGreater(shape(car[0]["polygon"]).area, shape(walk[0]["polygon"]).area)
+        self.assertEqual(service.cache_stats()["entries"], 2)
+        asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 45, profile="car"))
+
+        with self.assertRaises(ValueError):
+            asyncio.run(service.calculate_isochrones([(30.002, 60.001)], 2, profile="plane"))
+
+
+class IsochroneServiceReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_reload_follows_table_content(self):
+        async def scenario():
+            engine, session_factory = await make_road_db(os.path.join(self.tmp.name, "roads.db"))
+            service = IsochroneService(workers=0)
+            try:
+                async with session_factory() as session:
+                    await service.initialize(session, snapshot_path=None)
+                    unchanged = await service.source_changed(session)
+                reloaded_unchanged = await service.reload(session_factory, snapshot_path=None)
+
+                # UPDATE без новых строк: количество и ключи прежние
+                async with session_factory() as session:
+                    await session.execute(update(RoadRib).values(length=160.0))
+                    await session.commit()
+                    changed = await service.source_changed(session)
+                reloaded = await service.reload(session_factory, snapshot_path=None)
+                forced = await service.reload(session_factory, force=True, snapshot_path=None)
+            finally:
+                service.shutdown()
+                await engine.dispose()
+            return service, unchanged, reloaded_unchanged, changed, reloaded, forced
+
+        service, unchanged, reloaded_unchanged, changed, reloaded, forced = asyncio.run(scenario())
+
+        self.assertFalse(unchanged)
+        self.assertFalse(reloaded_unchanged)
+        self.assertTrue(changed)
+        self.assertTrue(reloaded)
+        self.assertTrue(forced)
+        self.assertEqual(service.graph_version, 3)
+        # рёбра стали вдвое длиннее — и вдвое дольше пешком
+        np.testing.assert_allclose(service._graph.time, 2.0)
+        self.assertIsNone(service.graph_info()["last_error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from services.isochrone_cache import IsochroneCache, geojson_nbytes
+
+
+class IsochroneCacheTest(unittest.TestCase):
+    def test_hit_and_miss_counters(self):
+        cache = IsochroneCache(max_bytes=10_000)
+
+        self.assertIsNone(cache.get(("a", 7)))
+        cache.put(("a", 7), ["value"], 100)
+
+        self.assertEqual(cache.get(("a", 7)), ["value"])
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 1)
+
+    def test_lru_eviction_by_size(self):
+        cache = IsochroneCache(max_bytes=2500)
+
+        cache.put(1, "one", 400)
+        cache.put(2, "two", 400)
+        cache.get(1)
+        cache.put(3, "three", 400)
+
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), "one")
+        self.assertEqual(cache.get(3), "three")
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertLessEqual(cache.stats()["bytes"], cache.max_bytes)
+
+    def test_oversized_value_is_not_cached(self):
+        cache = IsochroneCache(max_bytes=1000)
+
+        cache.put(1, "big", 10_000)
+
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_clear(self):
+        cache = IsochroneCache(max_bytes=10_000)
+        cache.put(1, "one", 10)
+
+        cache.clear()
+
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_geojson_nbytes_counts_coordinates(self):
+        square = {"type": "Polygon", "coordinates": (((0, 0), (1, 0), (1, 1), (0, 0)),)}
+        multi = {"type": "MultiPolygon", "coordinates": (square["coordinates"], square["coordinates"])}
+
+        self.assertEqual(geojson_nbytes(multi), 2 * geojson_nbytes(square))
+        self.assertGreater(geojson_nbytes(square), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import shapely
+
+from services.isochrone_polygons import RASTER_CELL_METERS, build_raster_bands, raster_grid
+
+
+def street_grid(extent_m: float, step_m: float = 400.0) -> np.ndarray:
+    """Горизонтальные улицы с шагом step_m на квадрате extent_m, отрезками по step_m."""
+    starts = [(x, y) for x in np.arange(0, extent_m, step_m) for y in np.arange(0, extent_m + 1, 10 * step_m)]
+    return np.array([[(x, y), (x + step_m, y)] for x, y in starts], dtype=np.float64)
+
+
+class RasterGridTest(unittest.TestCase):
+    def test_small_extent_keeps_base_cell(self):
+        cell, origin, shape, radius = raster_grid(street_grid(2000).reshape(-1, 2), 50)
+
+        self.assertEqual(cell, RASTER_CELL_METERS)
+        self.assertEqual(radius, int(np.ceil(50 / RASTER_CELL_METERS)))
+
+    def test_large_extent_is_capped(self):
+        # 120 км — изохрона машины за 60 минут
+        coords = street_grid(120_000).reshape(-1, 2)
+
+        cell, origin, shape, radius = raster_grid(coords, 50, max_cells=1_000_000)
+
+        self.assertLessEqual(int(shape[0]) * int(shape[1]), 1_000_000)
+        self.assertGreater(cell, RASTER_CELL_METERS)
+        # сетка покрывает все точки
+        self.assertTrue((coords >= origin).all())
+        self.assertTrue((coords < origin + shape[::-1] * cell).all())
+
+    def test_raster_bands_under_cap(self):
+        segments = street_grid(120_000)
+        edge_time = np.linspace(0, 60, len(segments))
+
+        with patch("services.isochrone_polygons.RASTER_MAX_CELLS", 250_000):
+            bands = build_raster_bands(segments, edge_time, None, None, [30, 60], 50)
+
+        self.assertEqual([minutes for minutes, _ in bands], [30, 60])
+        outer = bands[1][1]
+        self.assertTrue(outer.contains(bands[0][1].buffer(-1)))
+        # все улицы внутри полигона последней полосы
+        self.assertTrue(shapely.contains(outer.buffer(1), shapely.linestrings(segments)).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,221 @@
+import unittest
+
+import numpy as np
+
+from services.road_graph import RoadGraph, NetworkxRoadGraph
+from services.travel_profiles import parse_max_speed, parse_max_speeds
+
+
+def make_grid(cls=RoadGraph, size=5, step_m=80.0, max_speed=None):
+    """Квадратная решётка size x size, рёбра по 80 м (1 минута пешком)."""
+    node_ids, lons, lats = [], [], []
+    for i in range(size):
+        for j in range(size):
+            node_ids.append(1000 + i * size + j)
+            lons.append(30.0 + j * 0.001)
+            lats.append(60.0 + i * 0.0005)
+
+    starts, ends, lengths = [], [], []
+    for i in range(size):
+        for j in range(size):
+            nid = 1000 + i * size + j
+            if j + 1 < size:
+                starts.append(nid)
+                ends.append(nid + 1)
+                lengths.append(step_m)
+            if i + 1 < size:
+                starts.append(nid)
+                ends.append(nid + size)
+                lengths.append(step_m)
+
+    max_speeds = None if max_speed is None else [max_speed] * len(starts)
+    return cls.from_edges(node_ids, lons, lats, starts, ends, lengths, max_speeds)
+
+
+class RoadGraphTest(unittest.TestCase):
+    def test_from_edges_builds_symmetric_csr(self):
+        graph = make_grid()
+
+        self.assertEqual(graph.node_count, 25)
+        self.assertEqual(graph.edge_count, 40)
+        self.assertEqual(graph.indices.dtype, np.int32)
+        self.assertEqual(graph.time.dtype, np.float32)
+        self.assertEqual(graph.length.dtype, np.float32)
+        self.assertEqual(graph.indptr[-1], len(graph.indices))
+
+        # угловой узел связан с двумя соседями
+        corner = graph.index_of([1000])[0]
+        neighbours = graph.indices[graph.indptr[corner]:graph.indptr[corner + 1]]
+        self.assertEqual(sorted(graph.node_ids[neighbours].tolist()), [1001, 1005])
+
+    def test_from_edges_drops_invalid_and_parallel_edges(self):
+        graph = RoadGraph.from_edges(
+            [1, 2, 3], [0.0, 0.1, 0.2], [0.0, 0.0, 0.0],
+            [1, 1, 2, 2, 3], [2, 2, 1, 99, 3], [100.0, 80.0, 70.0, 10.0, 5.0],
+        )
+
+        self.assertEqual(graph.edge_count, 1)
+        self.assertAlmostEqual(float(graph.length[0]), 70.0)
+        self.assertAlmostEqual(float(graph.time[0]), 70.0 / 80.0, places=6)
+
+    def test_profiles_share_topology(self):
+        graph = make_grid(max_speed=30.0)
+
+        self.assertEqual(sorted(graph.profiles), ["bike", "car", "walk"])
+        # 80 м: пешком 1 мин, велосипед ограничен 15 км/ч, машина едет 30 км/ч
+        self.assertAlmostEqual(float(graph.times["walk"][0]), 1.0, places=5)
+        self.assertAlmostEqual(float(graph.times["bike"][0]), 0.08 / 15 * 60, places=5)
+        self.assertAlmostEqual(float(graph.times["car"][0]), 0.08 / 30 * 60, places=5)
+        for arr in graph.times.values():
+            self.assertEqual(arr.shape, graph.indices.shape)
+
+        times = graph.shortest_times(graph.index_of([1000]), profile="car")
+        self.assertAlmostEqual(times[graph.index_of([1024])[0]], 8 * 0.16, places=4)
+
+    def test_unknown_max_speed_uses_profile_speed(self):
+        graph = make_grid()
+
+        self.assertAlmostEqual(float(graph.times["car"][0]), 0.08 / 40 * 60, places=5)
+        with self.assertRaises(ValueError):
+            graph.shortest_times([0], profile="plane")
+
+    def test_parse_max_speed(self):
+        self.assertEqual(parse_max_speed("60"), 60.0)
+        self.assertAlmostEqual(parse_max_speed("30 mph"), 48.28, places=2)
+        self.assertEqual(parse_max_speed("RU:urban"), 60.0)
+        self.assertEqual(parse_max_speed("60;40"), 40.0)
+        self.assertTrue(np.isnan(parse_max_speed("signals")))
+        self.assertTrue(np.isnan(parse_max_speed(None)))
+
+        parsed = parse_max_speeds(["60", None, "60", "none"])
+        self.assertEqual(parsed.dtype, np.float32)
+        self.assertEqual(parsed[0], 60.0)
+        self.assertEqual(parsed[2], 60.0)
+        self.assertTrue(np.isnan(parsed[1]) and np.isnan(parsed[3]))
+
+    def test_index_of_unknown_ids(self):
+        graph = make_grid()
+
+        idx = graph.index_of([1000, 5, 1024, 99999])
+
+        self.assertEqual(idx[0], 0)
+        self.assertEqual(idx[1], -1)
+        self.assertEqual(idx[2], 24)
+        self.assertEqual(idx[3], -1)
+
+    def test_shortest_times_multi_source(self):
+        graph = make_grid()
+        sources = graph.index_of([1000, 1024])
+
+        times = graph.shortest_times(sources)
+
+        self.assertEqual(len(times), graph.node_count)
+        self.assertAlmostEqual(times[graph.index_of([1012])[0]], 4.0)
+        self.assertAlmostEqual(times[graph.index_of([1004])[0]], 4.0)
+        self.assertAlmostEqual(times[graph.index_of([1001])[0]], 1.0)
+
+    def test_shortest_times_stops_at_limit(self):
+        graph = make_grid()
+        sources = graph.index_of([1000])
+
+        times = graph.shortest_times(sources, limit=2.0)
+
+        self.assertEqual(int(np.isfinite(times).sum()), 6)
+        self.assertTrue(np.isinf(times[graph.index_of([1024])[0]]))
+
+    def test_shortest_times_with_initial_costs(self):
+        graph = make_grid()
+        # старт посередине ребра 1012–1013: до обоих концов по полминуты
+        sources = graph.index_of([1012, 1013])
+
+        times = graph.shortest_times(sources, limit=2.0, initial=[0.5, 0.5])
+
+        self.assertEqual(len(times), graph.node_count)
+        self.assertAlmostEqual(times[graph.index_of([1012])[0]], 0.5)
+        self.assertAlmostEqual(times[graph.index_of([1011])[0]], 1.5)
+        self.assertTrue(np.isinf(times[graph.index_of([1010])[0]]))
+        reference = make_grid(NetworkxRoadGraph)
+        np.testing.assert_allclose(times, reference.shortest_times(sources, limit=2.0, initial=[0.5, 0.5]))
+
+    def test_many_initial_costs_match_reference(self):
+        graph = make_grid()
+        # больше _SEPARATE_SOURCES_MAX стартов — поиск из виртуального узла
+        sources = graph.index_of(list(range(1000, 1025, 2)))
+        initial = np.linspace(0.1, 0.9, len(sources))
+
+        times = graph.shortest_times(sources, limit=3.0, initial=initial)
+
+        reference = make_grid(NetworkxRoadGraph)
+        np.testing.assert_allclose(times, reference.shortest_times(sources, limit=3.0, initial=initial), rtol=1e-6)
+
+    def test_search_matrix_is_built_once_per_profile(self):
+        graph = make_grid()
+
+        graph.shortest_times([0], limit=2.0)
+        matrix = graph._matrix("walk")
+        graph.travel_times([0], [1, 2])
+        graph.shortest_times([0, 1], limit=2.0, initial=[0.1, 0.2])
+
+        self.assertIs(graph._matrix("walk"), matrix)
+        self.assertEqual(matrix.data.dtype, np.float64)
+        self.assertTrue(np.shares_memory(matrix.indices, graph.indices))
+        self.assertEqual(graph.matrix_nbytes, 8 * len(graph.indices))
+        self.assertIsNot(graph._matrix("car"), matrix)
+
+    def test_travel_times_matrix_in_chunks(self):
+        graph = make_grid()
+        sources = graph.index_of([1000, 1012, 1024])
+        targets = graph.index_of([1004, 1020, 1000])
+
+        # порция в одну строку: каждый источник считается отдельно
+        matrix = graph.travel_times(sources, targets, limit=6.0, chunk_bytes=1)
+
+        self.assertEqual(matrix.shape, (3, 3))
+        self.assertEqual(matrix.dtype, np.float32)
+        np.testing.assert_allclose(matrix[1], [4.0, 4.0, 4.0])
+        self.assertEqual(matrix[0, 2], 0.0)
+        self.assertTrue(np.isinf(matrix[2, 2]))
+        reference = make_grid(NetworkxRoadGraph)
+        np.testing.assert_allclose(matrix, reference.travel_times(sources, targets, limit=6.0))
+
+    def test_reach_sums_add_weights_of_reaching_sources(self):
+        graph = make_grid()
+        sources = graph.index_of([1000, 1012, 1024])
+        weights = [6.0, -10.0, 15.0]
+
+        sums = graph.reach_sums(sources, weights, limit=2.0, chunk_bytes=1)
+
+        times = graph.travel_times(sources, np.arange(graph.node_count), limit=2.0)
+        np.testing.assert_allclose(sums, np.asarray(weights) @ (times <= 2.0))
+        self.assertEqual(sums[graph.index_of([1012])[0]], -10.0)
+        reference = make_grid(NetworkxRoadGraph)
+        np.testing.assert_allclose(sums, reference.reach_sums(sources, weights, limit=2.0))
+
+    def test_incident_edges_matches_full_scan(self):
+        graph = make_grid()
+        times = graph.shortest_times(graph.index_of([1012]), limit=1.0)
+        settled = np.isfinite(times)
+
+        u, v, pos = graph.incident_edges(np.flatnonzero(settled), settled)
+
+        all_u, all_v, _ = graph.edge_arrays()
+        expected = {(int(a), int(b)) for a, b in zip(all_u, all_v) if settled[a] or settled[b]}
+        found = {(min(int(a), int(b)), max(int(a), int(b))) for a, b in zip(u, v)}
+        self.assertEqual(len(u), len(expected))
+        self.assertEqual(found, expected)
+        np.testing.assert_array_equal(graph.indices[pos], v)
+
+    def test_networkx_backend_matches_csr(self):
+        csr = make_grid()
+        reference = make_grid(NetworkxRoadGraph)
+        sources = csr.index_of([1006, 1018])
+
+        np.testing.assert_allclose(csr.shortest_times(sources), reference.shortest_times(sources))
+        np.testing.assert_allclose(csr.shortest_times(sources, limit=1.5),
+                                   reference.shortest_times(sources, limit=1.5))
+        np.testing.assert_allclose(csr.shortest_times(sources, profile="bike"),
+                                   reference.shortest_times(sources, profile="bike"), rtol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, conlist, confloat, constr
-from typing import List, Optional
+from typing import List, Optional, Union
 from typing import Dict, List, Any
 
 class IsoPoint(BaseModel):
@@ -10,25 +10,43 @@ class IsoPointAndScore(BaseModel):
     id: int
     lat: float
     lon: float
-    score: int
+    score: Union[int, float]  # дробная при затухании по времени
 
 class IsoPolygon(BaseModel):
     minutes: int
-    polygon: Dict[str, Any]
+    polygon: Union[Dict[str, Any], str]  # GeoJSON или base64 (wkb, twkb)
 
 class IsoRequest(BaseModel):
-    time: int
+    time: Optional[int] = None
+    times: Optional[List[int]] = None  # пороги полос, например [5, 10, 15]
+    method: Optional[str] = None  # buffer (точно) | hull | raster (быстрее)
+    profile: Optional[str] = None  # walk (по умолчанию) | bike | car
+    snap: Optional[str] = None  # node (ближайший узел) | edge (точка на ближайшем ребре)
+    simplify_m: Optional[float] = None  # допуск упрощения контура в метрах
+    precision: Optional[int] = None  # знаков после запятой в координатах
+    encoding: Optional[str] = None  # geojson (по умолчанию) | wkb | twkb
     points: Optional[List[IsoPoint]] = None
     byCategory: Optional[str] = None
     byName: Optional[str] = None
 
+class IsoBatchPoint(IsoPoint):
+    id: Optional[Union[int, str]] = None  # по умолчанию — номер точки в запросе
+
+class IsoBatchRequest(IsoRequest):
+    points: Optional[List[IsoBatchPoint]] = None  # для byCategory/byName id источника — id здания
+
 class IsoScoreRequest(BaseModel):
     byCategory: Optional[str] = None
     byName: Optional[str] = None
+    mode: Optional[str] = None  # isochrone (по умолчанию) | network
+    decay: Optional[str] = None  # step | linear | exponential | gaussian (для network)
 
 class IsoResponse(BaseModel):
     status: str
     isochrones: List[IsoPolygon]
+    graph_version: Optional[int] = None
+    snap: Optional[Dict[str, Any]] = None  # привязано/отброшено точек, макс. расстояние до узла
+    encoding: Optional[str] = None
 
 
 class PointInput(BaseModel):
@@ -46,3 +64,98 @@ class PointsIsoResponse(BaseModel):
 class PointsAndScoresResponse(BaseModel):
     status: str
     points: List[IsoPointAndScore]
+
+class IsoCacheStatsResponse(BaseModel):
+    status: str
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+    max_bytes: int
+
+class IsoExecutorStatsResponse(BaseModel):
+    status: str
+    workers: int
+    queue_depth: int
+    completed: int
+    failed: int
+    restarts: int = 0
+    latency_ms_avg: float
+    latency_ms_max: float
+
+class GraphInfoResponse(BaseModel):
+    status: str
+    version: Optional[int] = None  # None — при регионах версии у каждого свои
+    nodes: int
+    edges: int
+    reloading: bool
+    last_reload_at: Optional[float] = None
+    last_error: Optional[str] = None
+    load_stats: Optional[Dict[str, Any]] = None
+    regions: Optional[Dict[str, Dict[str, Any]]] = None  # по загруженным регионам
+
+class RegionsStatsResponse(BaseModel):
+    status: str
+    memory_bytes: int
+    memory_budget: int
+    regions: Dict[str, Dict[str, Any]]
+
+class MatrixRequest(BaseModel):
+    origins: List[IsoPoint]
+    destinations: Optional[List[IsoPoint]] = None  # по умолчанию — те же origins
+    profile: Optional[str] = None  # walk | bike | car
+    max_minutes: Optional[float] = None  # по умолчанию — лимит профиля
+    format: Optional[str] = None  # dense (по умолчанию) | sparse | binary
+
+class MatrixResponse(BaseModel):
+    status: str
+    graph_version: int
+    shape: List[int]
+    origins_snapped: List[bool]
+    destinations_snapped: List[bool]
+    # dense: минуты, null — нет пути за max_minutes
+    durations: Optional[List[List[Optional[float]]]] = None
+    # sparse: только достижимые пары
+    rows: Optional[List[int]] = None
+    cols: Optional[List[int]] = None
+    values: Optional[List[float]] = None
+
+class ScoresAtRequest(BaseModel):
+    points: List[IsoPoint]
+
+class ScoreAtPoint(BaseModel):
+    lat: float
+    lon: float
+    score: Optional[float] = None  # None — рядом нет дорог
+    snap_distance_m: Optional[float] = None
+
+class ScoresAtResponse(BaseModel):
+    status: str
+    graph_version: int
+    points: List[ScoreAtPoint]
+
+class ScoreSurfaceResponse(BaseModel):
+    status: str
+    ready: bool
+    graph_version: Optional[int] = None
+    nodes: int = 0
+    created_at: Optional[float] = None
+    build_seconds: Optional[float] = None
+    criteria_snapped: Optional[int] = None
+    unknown_categories: Optional[List[Optional[str]]] = None
+    params: Optional[Dict[str, Any]] = None
+    refreshing: bool = False
+    last_refresh_at: Optional[float] = None
+    last_error: Optional[str] = None
+
+class ScorePipelineStatsResponse(BaseModel):
+    status: str
+    criteria_version: Optional[int] = None
+    criteria: int
+    entries: int
+    hits: int
+    misses: int
+    refreshes: int
+    last_refresh_at: Optional[float] = None
+    last_error: Optional[str] = None
@@ -0,0 +1,140 @@
+import asyncio
+import contextlib
+import unittest
+from unittest.mock import patch
+
+from services.criteria_store import CriteriaColumns
+from services.score_pipeline import ScorePipelineCache
+
+ROWS = [
+    (1, "30.0", "60.0", "park", False),
+    (2, "30.01", "60.0", "education", False),
+]
+
+
+@contextlib.asynccontextmanager
+async def fake_session():
+    yield None
+
+
+class FakeStore:
+    """Хранилище критериев без БД: снимок собирается из self.rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.columns = None
+
+    async def get(self, session):
+        if self.columns is None:
+            await self.refresh(session)
+        return self.columns
+
+    async def refresh(self, session):
+        self.columns = CriteriaColumns.from_rows(self.rows)
+
+
+class ScorePipelineCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.store = FakeStore(list(ROWS))
+        self.runs = []
+
+        async def run(columns, mode, decay):
+            self.runs.append((len(columns), mode, decay))
+            await asyncio.sleep(0.01)
+            return [(1, 30.0, 60.0, len(columns))]
+
+        patcher = patch("services.score_pipeline.run_score_pipeline", run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeated_and_concurrent_requests_compute_once(self):
+        cache = ScorePipelineCache(self.store)
+
+        async def scenario():
+            first = await asyncio.gather(*(cache.get(None, "isochrone", "step") for _ in range(5)))
+            again = await cache.get(None, "isochrone", "step")
+            other = await cache.get(None, "network", "linear")
+            return first, again, other
+
+        first, again, other = asyncio.run(scenario())
+
+        self.assertEqual(first[0], [(1, 30.0, 60.0, 2)])
+        self.assertEqual(again, first[0])
+        self.assertEqual(self.runs, [(2, "isochrone", "step"), (2, "network", "linear")])
+        self.assertEqual(cache.stats()["hits"], 1)
+        with self.assertRaises(ValueError):
+            asyncio.run(cache.get(None, "isochrone", "cubic"))
+
+    def test_refresh_recomputes_when_criteria_change(self):
+        cache = ScorePipelineCache(self.store)
+        asyncio.run(cache.get(None, "isochrone", "step"))
+
+        self.assertFalse(asyncio.run(cache.refresh(fake_session)))
+        self.store.rows.append((3, "30.02", "60.0", "park", False))
+        self.assertTrue(asyncio.run(cache.refresh(fake_session)))
+
+        # новый результат посчитан заранее, запрос берёт его из кэша
+        self.assertEqual(asyncio.run(cache.get(None, "isochrone", "step")), [(1, 30.0, 60.0, 3)])
+        self.assertEqual(len(self.runs), 2)
+        self.assertEqual(cache.stats()["entries"], 1)
+
+    def test_requests_probe_criteria_without_background_refresh(self):
+        cache = ScorePipelineCache(self.store, probe_seconds=0)
+
+        async def scenario():
+            await cache.get(None, "isochrone", "step")
+            self.store.rows.append((3, "30.02", "60.0", "park", False))
+            # изменение замечено запросом: пока идёт пересчёт — прежний результат
+            stale = await cache.get(None, "isochrone", "step")
+            await cache._rebuilding
+            return stale, await cache.get(None, "isochrone", "step")
+
+        stale, fresh = asyncio.run(scenario())
+
+        self.assertEqual(stale, [(1, 30.0, 60.0, 2)])
+        self.assertEqual(fresh, [(1, 30.0, 60.0, 3)])
+        self.assertEqual(len(self.runs), 2)
+
+    def test_old_graph_results_are_evicted(self):
+        cache = ScorePipelineCache(self.store, max_entries=2)
+        versions = [(("default", 1),)]
+
+        async def scenario():
+            await cache.get(None, "isochrone", "step")
+            await cache.get(None, "network", "step")
+            versions[0] = (("default", 2),)
+            await cache.get(None, "isochrone", "step")
+
+        with patch("services.score_pipeline.graph_registry.graph_versions", lambda: versions[0]):
+            asyncio.run(scenario())
+            # записи прежнего графа не копятся
+            self.assertEqual(list(cache._results), [(cache.version, (("default", 2),), ("isochrone", "step"))])
+
+            async def more():
+                for decay in ("step", "linear", "exponential"):
+                    await cache.get(None, "network", decay)
+
+            asyncio.run(more())
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_probes_are_rate_limited(self):
+        cache = ScorePipelineCache(self.store, probe_seconds=3600)
+        probes = []
+        refresh = self.store.refresh
+
+        async def counted(session):
+            probes.append(session)
+            await refresh(session)
+
+        self.store.refresh = counted
+
+        async def scenario():
+            for _ in range(3):
+                await cache.get(None, "isochrone", "step")
+
+        asyncio.run(scenario())
+        self.assertEqual(len(probes), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
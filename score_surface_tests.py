@@ -0,0 +1,133 @@
+import asyncio
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from iso_service_tests import make_service
+from services.score_surface import ScoreSurface, ScoreSurfaceStore
+from services.vector_tiles import scores_tile
+
+CRITERIA_LON = np.array([30.0, 30.004, 30.004, 30.0])
+CRITERIA_LAT = np.array([60.0, 60.002, 60.002, 61.0])
+CATEGORIES = ["park", "railway_station", "industrial", "park"]
+
+
+class ScoreSurfaceTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "scores.npz")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def update(self, store, service, categories=CATEGORIES, **kwargs):
+        return asyncio.run(store.update(service, CRITERIA_LON, CRITERIA_LAT, categories, minutes=2, **kwargs))
+
+    def test_node_scores_sum_reachable_criteria(self):
+        service = make_service()
+        store = ScoreSurfaceStore(self.path)
+
+        self.assertTrue(self.update(store, service))
+
+        graph = service._graph
+        scores = store.scores_for(service)
+        self.assertEqual(len(scores), graph.node_count)
+        sources, _ = service.snap_points(list(zip(CRITERIA_LON[:3], CRITERIA_LAT[:3])), graph)
+        times = graph.travel_times(sources, np.arange(graph.node_count), limit=2)
+        expected = np.array([6, 15, -12]) @ (times <= 2)
+        np.testing.assert_allclose(scores, expected)
+        # критерий вне графа не привязан
+        self.assertEqual(store.stats()["criteria_snapped"], 3)
+
+    def test_rebuild_only_when_inputs_change(self):
+        service = make_service()
+        store = ScoreSurfaceStore(self.path)
+        self.assertTrue(self.update(store, service))
+        self.assertFalse(self.update(store, service))
+
+        # сохранённая поверхность подхватывается без пересчёта
+        restarted = ScoreSurfaceStore(self.path)
+        self.assertFalse(self.update(restarted, service))
+        np.testing.assert_array_equal(restarted.scores_for(service), store.scores_for(service))
+
+        changed = ["park", "railway_station", "park", "park"]
+        self.assertTrue(self.update(store, service, categories=changed))
+        self.assertTrue(self.update(store, service, categories=changed, force=True))
+
+    def test_moved_nodes_rebuild_surface(self):
+        service = make_service()
+        store = ScoreSurfaceStore(None)
+        self.update(store, service)
+
+        # те же рёбра и время, сдвинуты только узлы
+        arrays = service.graph.core_arrays()
+        service._set_graph(type(service.graph)(**{**arrays, "lon": arrays["lon"] + 0.0005}))
+
+        self.assertTrue(self.update(store, service))
+
+    def test_unknown_categories_are_reported(self):
+        service = make_service()
+        store = ScoreSurfaceStore(None)
+        output = io.StringIO()
+
+        with redirect_stdout(output):
+            self.update(store, service, categories=["park", "railway_station", None, "casino"])
+
+        self.assertIn("2 критериев", output.getvalue())
+        self.assertEqual(store.stats()["unknown_categories"], [None, "casino"])
+        # неизвестные категории идут с весом 0
+        self.assertGreater(store.scores_for(service).max(), 0)
+
+    def test_new_graph_needs_refresh(self):
+        service = make_service()
+        store = ScoreSurfaceStore(None)
+        self.update(store, service)
+
+        service._set_graph(service._graph)
+        with self.assertRaises(RuntimeError):
+            store.scores_for(service)
+        # тот же граф — без пересчёта
+        self.assertFalse(self.update(store, service))
+        store.scores_for(service)
+
+    def test_top_and_scores_at(self):
+        service = make_service()
+        store = ScoreSurfaceStore(None)
+        self.update(store, service)
+        scores = store.scores_for(service)
+
+        lon, lat, top = store.top(service, 3)
+        self.assertEqual(top.tolist(), sorted(scores, reverse=True)[:3])
+        at, dist = store.scores_at(service, [(lon[0], lat[0]), (31.0, 61.0)])
+        self.assertEqual(at[0], top[0])
+        self.assertTrue(np.isnan(at[1]))
+        self.assertTrue(np.isinf(dist[1]))
+
+        graph = service._graph
+        lon, lat, top = store.top(service, 100, bbox=(30.0, 60.0, 30.0015, 60.001))
+        inside = (graph.lon <= 30.0015) & (graph.lat <= 60.001)
+        self.assertEqual(len(top), inside.sum())
+
+    def test_scores_tile(self):
+        service = make_service()
+        store = ScoreSurfaceStore(None)
+        self.update(store, service)
+        graph = service._graph
+
+        tile = scores_tile(graph.lon, graph.lat, store.scores_for(service), 14, 9557, 4757)
+
+        self.assertIn(b"scores", tile)
+        self.assertEqual(scores_tile(graph.lon, graph.lat, np.zeros(graph.node_count), 14, 9557, 4757), b"")
+
+    def test_unreadable_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"garbage")
+        self.assertIsNone(ScoreSurface.load(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
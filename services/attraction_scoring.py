@@ -0,0 +1,157 @@
+"""
+Оценка привлекательности точек по критериям, попавшим в их изохроны.
+
+Критерии хранятся в numpy: координаты и целые коды категорий, вес
+категории берётся из массива по коду. Кандидаты для каждой изохроны
+отбираются STRtree по bbox, попадание проверяется одним вызовом
+shapely.contains_xy по подготовленным геометриям.
+
+Без полигонов (network): вклад критерия определяется временем в пути
+по графу от точки до критерия, с затуханием по времени (DECAY_FUNCTIONS).
+"""
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+SCORE_MINUTES = 7  # бюджет изохроны оценки точки, минут
+
+# isochrone — критерий внутри полигона изохроны; network — по времени в пути до критерия
+SCORE_MODES = ("isochrone", "network")
+DEFAULT_SCORE_MODE = os.getenv("SCORE_MODE", "isochrone")
+# Доля веса критерия в зависимости от времени t до него (T — бюджет):
+# step — 1 до T; linear — 1 - t/T; exponential — вдвое меньше каждые T/2;
+# gaussian — exp(-t²/(2σ²)) с σ = T/2. За пределами T вклад всегда 0
+DECAY_FUNCTIONS = ("step", "linear", "exponential", "gaussian")
+DEFAULT_DECAY = os.getenv("SCORE_DECAY", "step")
+
+# Вес категории критерия: положительный — привлекает, отрицательный — отталкивает
+ATTRACTION_WEIGHTS: Dict[str, int] = {
+    "railway_station": 15,
+    "business_center": 10,
+    "education": 8,
+    "pedestrian_zone": 7,
+    "park": 6,
+    "industrial": -12,
+    "wastewater_plant": -15,
+    "military": -10,
+    "power": -8,
+}
+
+
+def attraction_weight(category: str) -> int:
+    weight = ATTRACTION_WEIGHTS.get(category)
+    if weight is None:
+        raise ValueError("такая категория не поддерживается")
+    return weight
+
+
+def decay_factor(times: np.ndarray, minutes: float, decay: str = DEFAULT_DECAY) -> np.ndarray:
+    """Доля веса для времени в пути times (nan/inf — недостижим, доля 0)."""
+    if decay not in DECAY_FUNCTIONS:
+        raise ValueError(f"Неизвестная функция затухания: {decay}")
+    times = np.asarray(times, dtype=np.float64)
+    reached = times <= minutes  # nan и inf дают False
+    t = np.where(reached, times, 0.0)
+    if decay == "step":
+        factor = np.ones_like(t)
+    elif decay == "linear":
+        factor = 1.0 - t / minutes
+    elif decay == "exponential":
+        factor = np.exp2(-t / (minutes / 2))
+    else:
+        factor = np.exp(-t ** 2 / (2 * (minutes / 2) ** 2))
+    return np.where(reached, factor, 0.0)
+
+
+class AttractionScorer:
+    """Критерии в массивах и STRtree по их точкам; считает баллы для пачки геометрий."""
+
+    def __init__(
+        self,
+        lon: Sequence[float],
+        lat: Sequence[float],
+        codes: Sequence[int],
+        weights: Dict[str, int] = ATTRACTION_WEIGHTS,
+        version: Optional[int] = None,
+    ):
+        """
+        codes — код категории каждого критерия: позиция в weights, а
+        len(weights) — неизвестная категория (нулевой вес, помечается в
+        self.unknown). version — версия критериев, если известна.
+        """
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.categories = tuple(weights)
+        self.codes = np.asarray(codes, dtype=np.int32)
+        self.weights = np.array([*weights.values(), 0], dtype=np.int64)
+        self.unknown = self.codes == len(self.categories)
+        self.version = version
+        self._tree = shapely.STRtree(shapely.points(self.lon, self.lat))
+
+    @staticmethod
+    def category_codes(categories: Sequence[Optional[str]], weights: Dict[str, int] = ATTRACTION_WEIGHTS) -> np.ndarray:
+        """Коды категорий для __init__; неизвестные получают код len(weights)."""
+        codes = {name: code for code, name in enumerate(weights)}
+        return np.array([codes.get(c, len(codes)) for c in categories], dtype=np.int32)
+
+    @classmethod
+    def from_points(
+        cls, points: Iterable[Tuple[float, float, str]], weights: Dict[str, int] = ATTRACTION_WEIGHTS,
+    ) -> "AttractionScorer":
+        """Из списка (lon, lat, категория)."""
+        points = list(points)
+        lon = [p[0] for p in points]
+        lat = [p[1] for p in points]
+        return cls(lon, lat, cls.category_codes([p[2] for p in points], weights), weights)
+
+    @classmethod
+    def from_columns(cls, columns, weights: Dict[str, int] = ATTRACTION_WEIGHTS) -> "AttractionScorer":
+        """Из снимка services/criteria_store.py: коды категорий переводятся без строк на каждую запись."""
+        remap = cls.category_codes(columns.categories, weights)
+        codes = remap[columns.codes] if len(columns) else np.empty(0, dtype=np.int32)
+        return cls(columns.lon, columns.lat, codes, weights, version=columns.version)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def hits(self, geometries: List[Optional[BaseGeometry]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Пары (номер геометрии, номер критерия) для критериев строго внутри
+        геометрии. None — пустая геометрия.
+        """
+        geoms = np.array(
+            [shapely.Polygon() if g is None else g for g in geometries], dtype=object,
+        )
+        if not len(geoms) or not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        shapely.prepare(geoms)
+        # Кандидаты по bbox, затем точная проверка по парам
+        geom_idx, crit_idx = self._tree.query(geoms)
+        inside = shapely.contains_xy(geoms[geom_idx], self.lon[crit_idx], self.lat[crit_idx])
+        return geom_idx[inside], crit_idx[inside]
+
+    def scores(self, geometries: List[Optional[BaseGeometry]]) -> np.ndarray:
+        """Сумма весов критериев внутри каждой геометрии (int64)."""
+        geom_idx, crit_idx = self.hits(geometries)
+        if self.unknown[crit_idx].any():
+            raise ValueError("такая категория не поддерживается")
+        weights = self.weights[self.codes[crit_idx]]
+        return np.bincount(geom_idx, weights=weights, minlength=len(geometries)).astype(np.int64)
+
+    def score(self, geometry: Optional[BaseGeometry]) -> int:
+        return int(self.scores([geometry])[0])
+
+    def network_scores(self, durations: np.ndarray, minutes: float, decay: str = DEFAULT_DECAY) -> np.ndarray:
+        """
+        Оценки по матрице времени в пути (точки x критерии, nan — нет пути):
+        сумма весов критериев с долей decay_factor. При step — int64,
+        как у scores, иначе float64.
+        """
+        factor = decay_factor(durations, minutes, decay)
+        if (factor[:, self.unknown] > 0).any():
+            raise ValueError("такая категория не поддерживается")
+        scores = factor @ self.weights[self.codes].astype(np.float64)
+        return np.rint(scores).astype(np.int64) if decay == "step" else scores
@@ -1,48 +1,25 @@
-import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Point, Polygon, MultiPolygon
+import numpy as np
+from shapely.geometry import Polygon, MultiPolygon
 
+from services.geo_utils import buffer_points
 
-def build_buffers_for_criteries(criteries, buffer_m: int = 500):
-    """Строит буфер 500 м для каждой точки и возвращает список полигонов из координат в EPSG:4326."""
 
-    rows = []
-    for c in criteries:
-        lon = c.get("longitude")
-        lat = c.get("latitude")
-
-        if lon is None or lat is None:
-            continue
-
-        # только is_antiattractive = False
-        if not c.get("is_antiattractive", False):
-            rows.append({"longitude": float(lon), "latitude": float(lat)})
-
-    if not rows:
+def build_buffers_for_points(lon: np.ndarray, lat: np.ndarray, buffer_m: int = 500):
+    """
+    Строит буфер buffer_m метров вокруг каждой точки (массивы координат,
+    например колонки services/criteria_store.py) и возвращает список
+    контуров в EPSG:4326.
+    """
+    if not len(lon):
         return []
 
-    df = pd.DataFrame(rows)
-
-    # Создаем GeoDataFrame в WGS84
-    gdf = gpd.GeoDataFrame(
-        df,
-        geometry=gpd.points_from_xy(df.longitude, df.latitude),
-        crs="EPSG:4326"
-    )
-
-    # Перевод в метры
-    gdf_m = gdf.to_crs(epsg=3857)
-
-    # Строим буфер (в метрах)
-    gdf_m["buffer"] = gdf_m.geometry.buffer(buffer_m)
-
-    # Возвращаем в WGS84
-    gdf_buffer = gdf_m.set_geometry("buffer").to_crs(epsg=4326)
+    # Буферы строятся сразу для всего массива в локальной метрической проекции
+    buffered = buffer_points(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64), buffer_m)
 
     # Преобразуем каждый буфер в список координат
     buffers = []
 
-    for geom in gdf_buffer.geometry:
+    for geom in buffered:
         if geom.is_empty:
             continue
 
@@ -54,4 +31,4 @@ def build_buffers_for_criteries(criteries, buffer_m: int = 500):
             largest = max(geom.geoms, key=lambda g: g.area)
             buffers.append([[x, y] for x, y in largest.exterior.coords])
 
-    return buffers
\ No newline at end of file
+    return buffers
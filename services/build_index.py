@@ -0,0 +1,118 @@
+"""
+Индекс зданий в памяти для тайлов: колонки в numpy и STRtree по точкам.
+
+Индекс загружается из builds при первом обращении и перечитывается,
+если старше BUILD_INDEX_TTL_SECONDS.
+"""
+import asyncio
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import shapely
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from bd_models import Build
+
+BUILD_INDEX_TTL_SECONDS = int(os.getenv("BUILD_INDEX_TTL_SECONDS", "300"))
+
+
+def parse_coordinate(value: Optional[str]) -> float:
+    """Координата здания из строки ("30,123" или "30.123"); nan, если не число."""
+    try:
+        return float(value.replace(",", "."))
+    except (AttributeError, ValueError):
+        return float("nan")
+
+
+class BuildSnapshot:
+    """
+    Неизменяемый снимок индекса: колонки и STRtree одной загрузки.
+    Читатели берут ссылку на снимок один раз, поэтому перезагрузка в
+    другом потоке не смешивает позиции из дерева с колонками другой версии.
+    """
+
+    __slots__ = ("ids", "names", "categories", "lon", "lat", "tree", "version", "loaded_at")
+
+    def __init__(self, ids, names, categories, lon, lat, tree, version: int, loaded_at: float):
+        for name, value in zip(self.__slots__, (ids, names, categories, lon, lat, tree, version, loaded_at)):
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BuildSnapshot неизменяем")
+
+    @classmethod
+    def empty(cls) -> "BuildSnapshot":
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=object), np.empty(0, dtype=object),
+                   np.empty(0), np.empty(0), None, 0, 0.0)
+
+    def query(self, bbox: Tuple[float, float, float, float], category: Optional[str] = None) -> np.ndarray:
+        """Позиции зданий снимка внутри bbox (min_lon, min_lat, max_lon, max_lat)."""
+        if self.tree is None:
+            return np.empty(0, dtype=np.int64)
+        found = self.tree.query(shapely.box(*bbox))
+        if category is not None:
+            found = found[self.categories[found] == category]
+        return np.sort(found)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class BuildIndex:
+    def __init__(self, ttl: int = BUILD_INDEX_TTL_SECONDS):
+        self.ttl = ttl
+        self.snapshot = BuildSnapshot.empty()
+        self._lock = asyncio.Lock()
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
+    def set_rows(self, rows):
+        """
+        Собирает новый снимок из строк (id, name, category, longtitude, latitude)
+        и подменяет его одним присваиванием.
+        """
+        rows = list(rows)
+        lon = np.array([parse_coordinate(r[3]) for r in rows], dtype=np.float64)
+        lat = np.array([parse_coordinate(r[4]) for r in rows], dtype=np.float64)
+        valid = np.isfinite(lon) & np.isfinite(lat)
+        lon, lat = lon[valid], lat[valid]
+        self.snapshot = BuildSnapshot(
+            ids=np.array([r[0] for r in rows], dtype=np.int64)[valid],
+            names=np.array([r[1] for r in rows], dtype=object)[valid],
+            categories=np.array([r[2] for r in rows], dtype=object)[valid],
+            lon=lon,
+            lat=lat,
+            tree=shapely.STRtree(shapely.points(lon, lat)),
+            version=self.snapshot.version + 1,
+            loaded_at=time.time(),
+        )
+
+    def _fresh(self) -> bool:
+        snapshot = self.snapshot
+        return snapshot.tree is not None and time.time() - snapshot.loaded_at < self.ttl
+
+    async def ensure_loaded(self, session: AsyncSession) -> BuildSnapshot:
+        """Загружает индекс, если он пуст или устарел; возвращает текущий снимок."""
+        if self._fresh():
+            return self.snapshot
+        async with self._lock:
+            if not self._fresh():
+                result = await session.execute(
+                    select(Build.id, Build.name, Build.category, Build.longtitude, Build.latitude)
+                )
+                rows = result.all()
+                await asyncio.to_thread(self.set_rows, rows)
+            return self.snapshot
+
+    def __len__(self) -> int:
+        return len(self.snapshot)
+
+
+build_index = BuildIndex()
@@ -0,0 +1,61 @@
+"""
+Быстрая выдача списков зданий: строки БД сразу кодируются в JSON
+через orjson, без ORM-объектов, model_dump() и повторной валидации
+в BuildsListResponse. Формат ответа тот же, что у BuildsListResponse.
+"""
+import os
+from typing import AsyncIterator
+
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from bd_models import Build
+
+BUILDS_STREAM_CHUNK_ROWS = int(os.getenv("BUILDS_STREAM_CHUNK_ROWS", "2000"))
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Колонки в порядке полей models.BuildBase
+BUILD_COLUMNS = (
+    Build.id,
+    Build.name,
+    Build.category,
+    Build.opening_hours,
+    Build.website,
+    Build.phone,
+    Build.addr_street,
+    Build.addr_housenumber,
+    Build.geometry,
+    Build.longtitude,
+    Build.latitude,
+)
+_KEYS = tuple(column.key for column in BUILD_COLUMNS)
+
+
+def builds_query(*conditions):
+    return select(*BUILD_COLUMNS).where(*conditions)
+
+
+async def fetch_builds_json(session: AsyncSession, *conditions) -> bytes:
+    """Тело ответа {"status": "success", "builds": [...]} для зданий, подходящих под conditions."""
+    result = await session.execute(builds_query(*conditions))
+    builds = [dict(zip(_KEYS, row)) for row in result]
+    return orjson.dumps({"status": "success", "builds": builds})
+
+
+async def stream_builds_ndjson(
+    session_factory,
+    *conditions,
+    chunk_rows: int = BUILDS_STREAM_CHUNK_ROWS,
+) -> AsyncIterator[bytes]:
+    """
+    Здания по одному JSON-объекту на строку. Строки читаются серверным
+    курсором порциями по chunk_rows, и первая порция уходит клиенту
+    раньше, чем запрос дочитан до конца.
+
+    Сессия открывается здесь же: поток живёт дольше обработчика запроса.
+    """
+    async with session_factory() as session:
+        result = await session.stream(builds_query(*conditions).execution_options(yield_per=chunk_rows))
+        async for partition in result.partitions(chunk_rows):
+            yield b"".join(orjson.dumps(dict(zip(_KEYS, row))) + b"\n" for row in partition)
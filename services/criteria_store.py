@@ -0,0 +1,182 @@
+"""
+Критерии в памяти процесса: колонки numpy вместо строк-словарей.
+
+Таблица criteries читается целиком один раз. Дальше перед чтением
+выполняется дешёвая проверка — количество строк и максимальный id.
+Если добавились только новые строки (id больше прежнего максимума),
+дочитываются они. Любое другое расхождение (удаление, замена) —
+полная перезагрузка. Правки строк без изменения количества и id проверка
+не видит, поэтому раз в CRITERIA_FULL_RELOAD_SECONDS таблица
+перечитывается целиком.
+
+Потребители получают CriteriaColumns — неизменяемый снимок с массивами
+только для чтения; при обновлении снимок подменяется целиком.
+"""
+import asyncio
+import os
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from bd_models import Criteria
+from services.build_index import parse_coordinate
+
+CRITERIA_FULL_RELOAD_SECONDS = int(os.getenv("CRITERIA_FULL_RELOAD_SECONDS", "3600"))
+
+
+def _read_only(arr: np.ndarray) -> np.ndarray:
+    view = arr.view()
+    view.flags.writeable = False
+    return view
+
+
+@dataclass(frozen=True)
+class CriteriaColumns:
+    """
+    Снимок критериев с координатами. categories — словарь категорий,
+    codes — номер категории строки в нём; version — контрольная сумма
+    содержимого (не зависит от порядка строк).
+    """
+    ids: np.ndarray
+    lon: np.ndarray
+    lat: np.ndarray
+    codes: np.ndarray
+    categories: Tuple[Optional[str], ...]
+    antiattractive: np.ndarray
+    version: int
+
+    @classmethod
+    def from_rows(cls, rows) -> "CriteriaColumns":
+        """Из строк (id, longitude, latitude, category, is_antiattractive); строки без координат пропускаются."""
+        rows = list(rows)
+        lon = np.array([parse_coordinate(r[1]) for r in rows], dtype=np.float64)
+        lat = np.array([parse_coordinate(r[2]) for r in rows], dtype=np.float64)
+        valid = np.isfinite(lon) & np.isfinite(lat)
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        names = np.array(["" if r[3] is None else r[3] for r in rows], dtype=object)
+        categories, codes = np.unique(names, return_inverse=True)
+        antiattractive = np.array([bool(r[4]) for r in rows], dtype=bool)
+        return cls.build(
+            ids[valid], lon[valid], lat[valid], codes[valid].astype(np.int32),
+            tuple(c or None for c in categories), antiattractive[valid],
+        )
+
+    @classmethod
+    def build(cls, ids, lon, lat, codes, categories, antiattractive) -> "CriteriaColumns":
+        # Строки по возрастанию id: снимок и его версия не зависят от порядка выборки
+        order = np.argsort(ids, kind="stable")
+        ids, lon, lat, codes, antiattractive = (a[order] for a in (ids, lon, lat, codes, antiattractive))
+        names = np.array(categories, dtype=object)[codes] if len(codes) else np.empty(0, dtype=object)
+        crc = zlib.crc32(repr(names.tolist()).encode())
+        for arr in (ids, lon, lat, antiattractive):
+            crc = zlib.crc32(memoryview(np.ascontiguousarray(arr)).cast("B"), crc)
+        return cls(
+            _read_only(ids), _read_only(lon), _read_only(lat), _read_only(codes),
+            tuple(categories), _read_only(antiattractive), crc,
+        )
+
+    def append(self, other: "CriteriaColumns") -> "CriteriaColumns":
+        """Снимок с добавленными строками other (словари категорий объединяются)."""
+        categories = list(self.categories)
+        index = {name: code for code, name in enumerate(categories)}
+        for name in other.categories:
+            if name not in index:
+                index[name] = len(categories)
+                categories.append(name)
+        remap = np.array([index[name] for name in other.categories], dtype=np.int32)
+        return CriteriaColumns.build(
+            np.concatenate((self.ids, other.ids)),
+            np.concatenate((self.lon, other.lon)),
+            np.concatenate((self.lat, other.lat)),
+            np.concatenate((self.codes, remap[other.codes] if len(other.codes) else other.codes)),
+            tuple(categories),
+            np.concatenate((self.antiattractive, other.antiattractive)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def category_names(self) -> np.ndarray:
+        """Категория каждой строки (object-массив)."""
+        return np.array(self.categories, dtype=object)[self.codes] if len(self) else np.empty(0, dtype=object)
+
+
+_COLUMNS = (Criteria.id, Criteria.longitude, Criteria.latitude, Criteria.category, Criteria.is_antiattractive)
+
+
+async def fetch_probe(session: AsyncSession) -> Tuple[int, int]:
+    """Дешёвая проверка изменений: (количество строк, максимальный id)."""
+    row = (await session.execute(select(func.count(), func.max(Criteria.id)))).one()
+    return int(row[0]), int(row[1] or 0)
+
+
+async def fetch_rows(session: AsyncSession, after_id: Optional[int] = None) -> list:
+    """Строки (id, longitude, latitude, category, is_antiattractive); after_id — только с большим id."""
+    query = select(*_COLUMNS)
+    if after_id is not None:
+        query = query.where(Criteria.id > after_id)
+    return (await session.execute(query)).all()
+
+
+class CriteriaStore:
+    def __init__(self, full_reload_seconds: int = CRITERIA_FULL_RELOAD_SECONDS):
+        self.full_reload_seconds = full_reload_seconds
+        self.columns: Optional[CriteriaColumns] = None
+        self._probe: Optional[Tuple[int, int]] = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self.full_loads = 0
+        self.incremental_loads = 0
+        self.probes = 0
+
+    async def get(self, session: AsyncSession) -> CriteriaColumns:
+        """Текущий снимок; при первом обращении таблица читается из БД."""
+        if self.columns is None:
+            await self.refresh(session)
+        return self.columns
+
+    async def refresh(self, session: AsyncSession) -> bool:
+        """Сверяет снимок с таблицей и дочитывает изменения. True — снимок изменился."""
+        async with self._lock:
+            probe = await fetch_probe(session)
+            self.probes += 1
+            expired = time.time() - self._loaded_at >= self.full_reload_seconds
+            if self.columns is not None and probe == self._probe and not expired:
+                return False
+
+            old = self.columns
+            count, max_id = self._probe or (0, 0)
+            if old is not None and not expired and probe[1] > max_id and probe[0] > count:
+                # Только новые строки: дочитываем хвост по id
+                rows = await fetch_rows(session, after_id=max_id)
+                if count + len(rows) == probe[0]:
+                    self.columns = old.append(await asyncio.to_thread(CriteriaColumns.from_rows, rows))
+                    self._probe = probe
+                    self.incremental_loads += 1
+                    return True
+
+            rows = await fetch_rows(session)
+            self.columns = await asyncio.to_thread(CriteriaColumns.from_rows, rows)
+            self._probe = probe
+            self._loaded_at = time.time()
+            self.full_loads += 1
+            return old is None or old.version != self.columns.version
+
+    def stats(self) -> dict:
+        return {
+            "criteria": len(self.columns) if self.columns is not None else 0,
+            "version": self.columns.version if self.columns is not None else None,
+            "full_loads": self.full_loads,
+            "incremental_loads": self.incremental_loads,
+            "probes": self.probes,
+        }
+
+
+criteria_store = CriteriaStore()
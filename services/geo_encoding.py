@@ -0,0 +1,116 @@
+"""
+Компактные представления геометрий изохрон для ответа API.
+
+- geojson — словарь GeoJSON, при заданной точности координаты округляются;
+- wkb — стандартный WKB (shapely.to_wkb) в base64;
+- twkb — Tiny WKB в base64: координаты с фиксированной точностью,
+  дельта-кодирование и varint. Обычно в 3-5 раз меньше WKB.
+
+FlatGeobuf не поддерживается: для одиночного полигона его заголовок
+и индекс не окупаются, а для потоков есть NDJSON.
+"""
+import base64
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+import shapely
+from shapely.geometry import mapping, shape
+
+GEOMETRY_ENCODINGS = ("geojson", "wkb", "twkb")
+DEFAULT_GEOMETRY_ENCODING = "geojson"
+TWKB_DEFAULT_PRECISION = 6  # ~0.1 м по широте
+
+_TWKB_TYPES = {"Polygon": 3, "MultiPolygon": 6}
+
+
+def round_coordinates(geom, precision: int):
+    """Округляет координаты shapely-геометрии до precision знаков."""
+    return shapely.transform(geom, lambda coords: np.round(coords, precision))
+
+
+def validate_encoding(encoding: str, precision: Optional[int] = None):
+    if encoding not in GEOMETRY_ENCODINGS:
+        raise ValueError(f"Неизвестный формат геометрии: {encoding}")
+    max_precision = 7 if encoding == "twkb" else 15
+    if precision is not None and not 0 <= precision <= max_precision:
+        raise ValueError(f"Точность координат для {encoding} должна быть от 0 до {max_precision}")
+
+
+def encode_geometry(
+    geometry: Dict[str, Any],
+    encoding: str = DEFAULT_GEOMETRY_ENCODING,
+    precision: Optional[int] = None,
+) -> Union[Dict[str, Any], str]:
+    """
+    Переводит GeoJSON-геометрию в выбранное представление.
+
+    precision — число знаков после запятой для координат (None — без
+    округления; для twkb по умолчанию TWKB_DEFAULT_PRECISION).
+    """
+    validate_encoding(encoding, precision)
+    if encoding == "geojson" and precision is None:
+        return geometry
+
+    geom = shape(geometry)
+    if encoding == "twkb":
+        return base64.b64encode(to_twkb(geom, TWKB_DEFAULT_PRECISION if precision is None else precision)).decode()
+    if precision is not None:
+        geom = round_coordinates(geom, precision)
+    if encoding == "wkb":
+        return base64.b64encode(shapely.to_wkb(geom)).decode()
+    return mapping(geom)
+
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """Беззнаковые varint (LEB128) для массива чисел, одним проходом numpy."""
+    v = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(v), dtype=np.int64)
+    for k in range(1, 10):
+        sizes += v >= np.uint64(1 << (7 * k))
+    out = np.zeros((len(v), 10), dtype=np.uint8)
+    for k in range(10):
+        byte = (v >> np.uint64(7 * k)) & np.uint64(0x7F)
+        out[:, k] = byte | np.where(k < sizes - 1, 0x80, 0).astype(np.uint64)
+    return out[np.arange(10) < sizes[:, None]].tobytes()
+
+
+def zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def to_twkb(geom, precision: int = TWKB_DEFAULT_PRECISION) -> bytes:
+    """
+    Кодирует Polygon или MultiPolygon в TWKB (без bbox, размера и id).
+    Координаты кодируются дельтами от предыдущей точки через все кольца.
+    """
+    if geom.geom_type not in _TWKB_TYPES:
+        raise ValueError(f"TWKB: неподдерживаемый тип геометрии {geom.geom_type}")
+    if not -8 <= precision <= 7:
+        raise ValueError("TWKB: точность должна быть от -8 до 7")
+
+    header = bytes([_TWKB_TYPES[geom.geom_type] | ((int(zigzag(np.array([precision]))[0]) & 0x0F) << 4)])
+    if geom.is_empty:
+        return header + bytes([0x10])
+
+    polygons = list(geom.geoms) if geom.geom_type == "MultiPolygon" else [geom]
+    rings = [[p.exterior, *p.interiors] for p in polygons]
+    # Замыкающая точка кольца пишется, как в PostGIS
+    coords = [np.asarray(r.coords)[:, :2] for poly in rings for r in poly]
+    scaled = np.round(np.concatenate(coords) * 10.0 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    encoded = zigzag(deltas.ravel())
+
+    parts = [header, bytes([0])]
+    if geom.geom_type == "MultiPolygon":
+        parts.append(encode_varints([len(polygons)]))
+    start = 0
+    ring_sizes = iter(len(c) for c in coords)
+    for poly in rings:
+        parts.append(encode_varints([len(poly)]))
+        for _ in poly:
+            n = next(ring_sizes)
+            parts.append(encode_varints([n]))
+            parts.append(encode_varints(encoded[2 * start:2 * (start + n)]))
+            start += n
+    return b"".join(parts)
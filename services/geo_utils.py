@@ -0,0 +1,66 @@
+from functools import lru_cache
+
+import numpy as np
+import shapely
+from pyproj import CRS, Transformer
+
+
+class LocalProjection:
+    """
+    Локальная азимутальная равнопромежуточная проекция (AEQD) с центром
+    в середине охвата данных. В пределах города искажение расстояний
+    меньше 0.1%, в отличие от EPSG:3857, где на широте 56° масштаб
+    завышен в ~1.8 раза.
+    """
+
+    def __init__(self, lon0: float, lat0: float):
+        self.lon0 = lon0
+        self.lat0 = lat0
+        crs = CRS.from_proj4(f"+proj=aeqd +lat_0={lat0} +lon_0={lon0} +datum=WGS84 +units=m +no_defs")
+        self._forward = Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+        self._inverse = Transformer.from_crs(crs, "EPSG:4326", always_xy=True)
+
+    def to_metric(self, lon, lat) -> tuple[np.ndarray, np.ndarray]:
+        return self._forward.transform(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+
+    def to_lonlat(self, x, y) -> tuple[np.ndarray, np.ndarray]:
+        return self._inverse.transform(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+
+    def geometry_to_lonlat(self, geom):
+        """Переводит shapely-геометрию (или массив геометрий) из метров в lon/lat."""
+        return shapely.transform(geom, self._inverse_coords)
+
+    def geometry_to_metric(self, geom):
+        return shapely.transform(geom, self._forward_coords)
+
+    def _inverse_coords(self, coords: np.ndarray) -> np.ndarray:
+        return np.column_stack(self._inverse.transform(coords[:, 0], coords[:, 1]))
+
+    def _forward_coords(self, coords: np.ndarray) -> np.ndarray:
+        return np.column_stack(self._forward.transform(coords[:, 0], coords[:, 1]))
+
+
+@lru_cache(maxsize=32)
+def _projection_at(lon0: float, lat0: float) -> LocalProjection:
+    return LocalProjection(lon0, lat0)
+
+
+def local_projection(lon, lat) -> LocalProjection:
+    """
+    Проекция для охвата переданных координат. Центр округляется до 0.01°,
+    поэтому для одного и того же города трансформер создаётся один раз.
+    """
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    lon0 = round(float((np.nanmin(lon) + np.nanmax(lon)) / 2), 2)
+    lat0 = round(float((np.nanmin(lat) + np.nanmax(lat)) / 2), 2)
+    return _projection_at(lon0, lat0)
+
+
+def buffer_points(lon, lat, radius_m: float, projection: LocalProjection = None) -> np.ndarray:
+    """Буферы радиусом radius_m вокруг точек; возвращает массив полигонов в lon/lat."""
+    if projection is None:
+        projection = local_projection(lon, lat)
+    x, y = projection.to_metric(lon, lat)
+    buffered = shapely.buffer(shapely.points(x, y), radius_m)
+    return projection.geometry_to_lonlat(buffered)
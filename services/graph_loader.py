@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from typing import Mapping, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Float, cast, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from bd_models import RoadNode, RoadRib
+from services.road_graph import RoadGraph
+from services.travel_profiles import PROFILES, TravelProfile, parse_max_speeds
+
+GRAPH_LOAD_CHUNK_ROWS = int(os.getenv("ISO_GRAPH_LOAD_CHUNK_ROWS", "50000"))
+
+
+def _grow(arrays: list, size: int) -> list:
+    """Увеличивает предвыделенные массивы, если строк пришло больше, чем насчитали."""
+    capacity = max(size, 2 * len(arrays[0]))
+    grown = []
+    for a in arrays:
+        b = np.empty(capacity, dtype=a.dtype)
+        b[:len(a)] = a
+        grown.append(b)
+    return grown
+
+
+async def _stream_columns(session: AsyncSession, query, total: int, dtypes: list, chunk_rows: int) -> list:
+    """
+    Читает выбранные колонки порциями через серверный курсор и складывает
+    их сразу в numpy-массивы, без ORM-объектов и промежуточных списков на всю таблицу.
+    """
+    arrays = [np.empty(total, dtype=dt) for dt in dtypes]
+    filled = 0
+    result = await session.stream(query.execution_options(yield_per=chunk_rows))
+    async for partition in result.partitions(chunk_rows):
+        n = len(partition)
+        if filled + n > len(arrays[0]):
+            arrays = _grow(arrays, filled + n)
+        for arr, column in zip(arrays, zip(*partition)):
+            arr[filled:filled + n] = column
+        filled += n
+    return [a[:filled] for a in arrays]
+
+
+async def load_road_graph(
+    session: AsyncSession,
+    graph_cls: type,
+    profiles: Mapping[str, TravelProfile] = PROFILES,
+    chunk_rows: int = GRAPH_LOAD_CHUNK_ROWS,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+) -> Tuple[RoadGraph, dict]:
+    """
+    Загружает граф из road_nodes/road_ribs, выбирая только нужные колонки.
+    Время рёбер считается для всех profiles по длине и RoadRib.max_speed.
+
+    bbox (min_lon, min_lat, max_lon, max_lat) ограничивает граф регионом:
+    берутся узлы внутри прямоугольника и рёбра, оба конца которых в нём.
+
+    Строки с NULL в координатах, концах или длине отбрасываются на стороне
+    БД; их количество считается как разница с общим числом строк.
+
+    Returns:
+        (граф, статистика загрузки)
+    """
+    started = time.perf_counter()
+
+    node_filter = []
+    rib_filter = []
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        node_filter = [RoadNode.longtitude.between(min_lon, max_lon), RoadNode.latitude.between(min_lat, max_lat)]
+        region_nodes = select(RoadNode.node_id).where(*node_filter)
+        rib_filter = [RoadRib.start_node_id.in_(region_nodes), RoadRib.end_node_id.in_(region_nodes)]
+
+    nodes_total = (await session.execute(select(func.count()).select_from(RoadNode).where(*node_filter))).scalar_one()
+    node_ids, lon, lat = await _stream_columns(
+        session,
+        select(RoadNode.node_id, cast(RoadNode.longtitude, Float), cast(RoadNode.latitude, Float))
+        .where(RoadNode.longtitude.isnot(None), RoadNode.latitude.isnot(None), *node_filter),
+        nodes_total,
+        [np.int64, np.float64, np.float64],
+        chunk_rows,
+    )
+
+    ribs_total = (await session.execute(select(func.count()).select_from(RoadRib).where(*rib_filter))).scalar_one()
+    starts, ends, length, max_speed = await _stream_columns(
+        session,
+        select(RoadRib.start_node_id, RoadRib.end_node_id, cast(RoadRib.length, Float), RoadRib.max_speed)
+        .where(RoadRib.start_node_id.isnot(None), RoadRib.end_node_id.isnot(None), RoadRib.length.isnot(None),
+               *rib_filter),
+        ribs_total,
+        [np.int64, np.int64, np.float64, object],
+        chunk_rows,
+    )
+    fetched = time.perf_counter()
+
+    # Разбор max_speed и сборка CSR — чистые вычисления, не держим на них event loop
+    max_speed = await asyncio.to_thread(parse_max_speeds, max_speed)
+    graph = await asyncio.to_thread(
+        graph_cls.from_edges, node_ids, lon, lat, starts, ends, length, max_speed, profiles,
+    )
+
+    stats = {
+        "nodes_total": int(nodes_total),
+        "nodes_rejected": int(nodes_total - len(node_ids)),
+        "ribs_total": int(ribs_total),
+        "ribs_rejected": int(ribs_total - len(starts)),
+        # неизвестные узлы, петли и параллельные рёбра
+        "ribs_dropped": int(len(starts) - graph.edge_count),
+        "fetch_seconds": round(fetched - started, 3),
+        "build_seconds": round(time.perf_counter() - fetched, 3),
+    }
+    return graph, stats
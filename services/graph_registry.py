@@ -0,0 +1,263 @@
+"""
+Реестр графов по регионам.
+
+Регионы задаются в ISO_REGIONS — JSON-строкой или путём к JSON-файлу:
+    [{"name": "spb", "bbox": [29.4, 59.6, 30.8, 60.2]}, ...]
+bbox — (min_lon, min_lat, max_lon, max_lat). Граф региона загружается при
+первом запросе в его границах, а при превышении ISO_REGIONS_MEMORY_MB
+вытесняются давно не использовавшиеся регионы.
+
+Если регионы не заданы, реестр содержит один регион "default" без
+границ, который обслуживает общий isochrone_service. Перезагрузка графов
+и статистика для админки тоже идут через реестр: при заданных регионах
+общий isochrone_service не используется.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.graph_snapshot import GRAPH_SNAPSHOT_PATH, fetch_source_fingerprint
+from services.iso_service import GRAPH_RELOAD_SECONDS, IsochroneService, isochrone_service
+
+DEFAULT_REGION = "default"
+REGIONS_MEMORY_BYTES = int(os.getenv("ISO_REGIONS_MEMORY_MB", "2048")) * 1024 * 1024
+
+
+def load_regions(value: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Читает описание регионов из ISO_REGIONS (JSON или путь к файлу)."""
+    value = value if value is not None else os.getenv("ISO_REGIONS", "")
+    if not value:
+        return []
+    if os.path.exists(value):
+        with open(value) as f:
+            value = f.read()
+    regions = json.loads(value)
+    for region in regions:
+        if len(region.get("bbox", ())) != 4:
+            raise ValueError(f"Для региона {region.get('name')} нужен bbox из 4 чисел")
+    return regions
+
+
+class GraphRegistry:
+    def __init__(
+        self,
+        regions: List[Dict[str, Any]],
+        default_service: Optional[IsochroneService] = None,
+        memory_budget: int = REGIONS_MEMORY_BYTES,
+        session_factory=None,
+    ):
+        self.memory_budget = memory_budget
+        self.session_factory = session_factory
+        self._names = [r["name"] for r in regions]
+        # Индекс регионов: массив bbox, поиск точки — одной векторной операцией
+        self._bboxes = np.array([r["bbox"] for r in regions], dtype=np.float64).reshape(-1, 4)
+        self._default = default_service if not regions else None
+        self._loaded: "OrderedDict[str, IsochroneService]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._stats: Dict[str, Dict[str, float]] = {
+            name: {"loads": 0, "hits": 0, "evictions": 0, "last_load_seconds": 0.0}
+            for name in (self._names or [DEFAULT_REGION])
+        }
+
+    @property
+    def multi_region(self) -> bool:
+        return self._default is None
+
+    @property
+    def default_service(self) -> IsochroneService:
+        """Сервис общего графа; при заданных регионах его нет."""
+        if self.multi_region:
+            raise RuntimeError("Заданы регионы ISO_REGIONS: общего графа нет")
+        return self._default
+
+    def services(self) -> Dict[str, IsochroneService]:
+        """Загруженные сервисы по регионам (без регионов — один "default")."""
+        if not self.multi_region:
+            return {DEFAULT_REGION: self._default}
+        return dict(self._loaded)
+
+    def region_for(self, points: Sequence[Tuple[float, float]]) -> str:
+        """Регион, в который попадает больше всего точек."""
+        if not self.multi_region:
+            return DEFAULT_REGION
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        lon, lat = coords[:, 0:1], coords[:, 1:2]
+        b = self._bboxes
+        inside = (lon >= b[:, 0]) & (lat >= b[:, 1]) & (lon <= b[:, 2]) & (lat <= b[:, 3])
+        counts = inside.sum(axis=0)
+        if not len(counts) or counts.max() == 0:
+            raise ValueError("Точки не попадают ни в один из обслуживаемых регионов")
+        return self._names[int(np.argmax(counts))]
+
+    async def service_for(self, points: Sequence[Tuple[float, float]]) -> IsochroneService:
+        return await self.get(self.region_for(points))
+
+    async def get(self, name: str) -> IsochroneService:
+        """Сервис региона; граф загружается при первом обращении."""
+        if not self.multi_region:
+            self._stats[DEFAULT_REGION]["hits"] += 1
+            return self._default
+        if name not in self._stats:
+            raise ValueError(f"Неизвестный регион: {name}")
+
+        service = self._loaded.get(name)
+        if service is not None:
+            self._loaded.move_to_end(name)
+            self._stats[name]["hits"] += 1
+            return service
+
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            service = self._loaded.get(name)
+            if service is None:
+                service = await self._load(name)
+            else:
+                self._stats[name]["hits"] += 1
+            self._loaded.move_to_end(name)
+            return service
+
+    async def _load(self, name: str) -> IsochroneService:
+        started = time.perf_counter()
+        service = await self._create_service(name)
+        stats = self._stats[name]
+        stats["loads"] += 1
+        stats["last_load_seconds"] = round(time.perf_counter() - started, 3)
+
+        self._evict(service.memory_bytes())
+        self._loaded[name] = service
+        return service
+
+    async def _create_service(self, name: str) -> IsochroneService:
+        """Сервис с графом региона: из снимка региона или из БД."""
+        if self.session_factory is None:
+            raise RuntimeError("GraphRegistry: не задан session_factory для загрузки регионов")
+        service = IsochroneService(bbox=tuple(self._bboxes[self._names.index(name)]))
+        async with self.session_factory() as session:
+            await service.initialize(session, snapshot_path=self._snapshot_path(name))
+        return service
+
+    def _snapshot_path(self, name: str) -> Optional[str]:
+        """Снимок графа региона; у общего графа — GRAPH_SNAPSHOT_PATH."""
+        if not self.multi_region:
+            return GRAPH_SNAPSHOT_PATH
+        return f"{GRAPH_SNAPSHOT_PATH}.{name}" if GRAPH_SNAPSHOT_PATH else None
+
+    async def changed_regions(self, session) -> List[str]:
+        """Загруженные регионы, чей граф собран не по текущему содержимому таблиц графа."""
+        source = await fetch_source_fingerprint(session)
+        return [name for name, service in self.services().items() if service.graph_source != source]
+
+    async def reload(self, force: bool = False) -> Dict[str, bool]:
+        """
+        Перечитывает графы загруженных регионов, каждый — со своим bbox и
+        снимком; незагруженные регионы и так загрузятся из актуальных данных.
+
+        Returns:
+            {регион: граф подменён}
+        """
+        if self.session_factory is None:
+            raise RuntimeError("GraphRegistry: не задан session_factory для загрузки регионов")
+        results = {}
+        for name, service in self.services().items():
+            results[name] = await service.reload(
+                self.session_factory, force=force, snapshot_path=self._snapshot_path(name),
+            )
+            if self.multi_region and self._loaded.get(name) is not service:
+                # Регион вытеснили во время перезагрузки — пул нового графа не нужен
+                service.shutdown()
+        if self.multi_region:
+            # Новый граф региона мог оказаться больше прежнего
+            self._evict(0)
+        return results
+
+    async def run_periodic_reload(self, interval: int = GRAPH_RELOAD_SECONDS):
+        """Фоновая задача: проверяет изменения графа раз в interval секунд."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                print(f"Ошибка при перезагрузке графа дорог: {e}")
+
+    def _evict(self, incoming: int):
+        """Вытесняет LRU-регионы, пока новый граф не помещается в бюджет."""
+        while self._loaded and self.memory_bytes() + incoming > self.memory_budget:
+            name, service = self._loaded.popitem(last=False)
+            # Запросы, уже получившие этот сервис, дорабатывают на нём
+            service.shutdown()
+            self._stats[name]["evictions"] += 1
+
+    def graph_versions(self) -> Tuple[Tuple[str, int], ...]:
+        """Версии графов загруженных регионов: меняются при любой перезагрузке графа."""
+        if not self.multi_region:
+            return ((DEFAULT_REGION, self._default.graph_version),)
+        return tuple(sorted((name, service.graph_version) for name, service in self._loaded.items()))
+
+    def memory_bytes(self) -> int:
+        if not self.multi_region:
+            return self._default.memory_bytes()
+        return sum(service.memory_bytes() for service in self._loaded.values())
+
+    def shutdown(self):
+        for service in self._loaded.values():
+            service.shutdown()
+        self._loaded.clear()
+
+    def graph_info(self) -> Dict[str, Any]:
+        """Состояние графа; при регионах — суммарно по загруженным и по каждому в regions."""
+        if not self.multi_region:
+            return self._default.graph_info()
+        regions = {name: service.graph_info() for name, service in self._loaded.items()}
+        errors = [info["last_error"] for info in regions.values() if info["last_error"]]
+        reload_times = [info["last_reload_at"] for info in regions.values() if info["last_reload_at"]]
+        return {
+            "version": None,
+            "nodes": sum(info["nodes"] for info in regions.values()),
+            "edges": sum(info["edges"] for info in regions.values()),
+            "reloading": any(info["reloading"] for info in regions.values()),
+            "last_reload_at": max(reload_times) if reload_times else None,
+            "last_error": errors[0] if errors else None,
+            "regions": regions,
+        }
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Счётчики кэшей изохрон, сложенные по загруженным регионам."""
+        totals = {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "bytes": 0, "max_bytes": 0}
+        for service in self.services().values():
+            for key, value in service.cache_stats().items():
+                totals[key] += value
+        return totals
+
+    def executor_stats(self) -> Dict[str, float]:
+        """Статистика исполнителей по загруженным регионам: счётчики складываются."""
+        stats = [service.executor_stats() for service in self.services().values()]
+        completed = sum(s["completed"] for s in stats)
+        return {
+            "workers": sum(s["workers"] for s in stats),
+            "queue_depth": sum(s["queue_depth"] for s in stats),
+            "completed": completed,
+            "failed": sum(s["failed"] for s in stats),
+            "restarts": sum(s["restarts"] for s in stats),
+            "latency_ms_avg": sum(s["latency_ms_avg"] * s["completed"] for s in stats) / completed if completed else 0.0,
+            "latency_ms_max": max((s["latency_ms_max"] for s in stats), default=0.0),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        regions = {}
+        for name, stats in self._stats.items():
+            service = self._default if not self.multi_region else self._loaded.get(name)
+            regions[name] = {
+                **stats,
+                "loaded": service is not None and service.graph_version > 0,
+                "memory_bytes": service.memory_bytes() if service is not None else 0,
+                "graph_version": service.graph_version if service is not None else None,
+            }
+        return {"memory_bytes": self.memory_bytes(), "memory_budget": self.memory_budget, "regions": regions}
+
+
+graph_registry = GraphRegistry(load_regions(), default_service=isochrone_service)
@@ -0,0 +1,218 @@
+"""
+Бинарный снимок дорожного графа для быстрого старта.
+
+Снимок — каталог с массивами RoadGraph в формате .npy (загружаются через
+mmap без копирования) и manifest.json с версией формата, контрольными
+суммами массивов и отпечатком содержимого исходных таблиц road_nodes/road_ribs.
+KD-дерево строится из координат узлов, которые уже лежат в снимке.
+
+Сборка снимка из БД:
+    python -m services.graph_snapshot build [путь]
+Проверка:
+    python -m services.graph_snapshot info [путь]
+"""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import time
+import zlib
+from typing import Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Numeric, cast, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from bd_models import RoadNode, RoadRib
+from services.road_graph import RoadGraph
+
+SNAPSHOT_FORMAT_VERSION = 2
+GRAPH_SNAPSHOT_PATH = os.getenv("ISO_GRAPH_SNAPSHOT", "road_graph.snapshot")
+SNAPSHOT_VERIFY = os.getenv("ISO_GRAPH_SNAPSHOT_VERIFY", "1") == "1"
+
+_MANIFEST = "manifest.json"
+
+
+class SnapshotError(Exception):
+    """Снимок отсутствует, повреждён или не соответствует текущим данным."""
+
+
+def _crc32(arr: np.ndarray) -> int:
+    return zlib.crc32(memoryview(np.ascontiguousarray(arr)).cast("B"))
+
+
+def _checksum(*values) -> int:
+    return zlib.crc32(repr([None if v is None else str(v) for v in values]).encode())
+
+
+async def fetch_source_fingerprint(session: AsyncSession) -> dict:
+    """
+    Отпечаток содержимого таблиц графа: количество строк, максимальный ключ
+    и контрольная сумма колонок, из которых строится граф. Суммы считаются
+    агрегатами на стороне БД одним проходом по таблице, строки не передаются.
+
+    Каждая колонка входит простой суммой и суммой, взвешенной ключом строки,
+    поэтому UPDATE длины, концов ребра или координат узла меняет отпечаток,
+    даже если количество строк и ключи прежние. max_speed — строка и входит
+    только своей длиной.
+    """
+    node_key = cast(RoadNode.node_id, Numeric)
+    nodes = (await session.execute(select(
+        func.count(), func.max(RoadNode.node_id),
+        func.sum(RoadNode.longtitude), func.sum(RoadNode.latitude),
+        func.sum(node_key * RoadNode.longtitude), func.sum(node_key * RoadNode.latitude),
+    ))).one()
+    rib_key = cast(RoadRib.id, Numeric)
+    speed_len = func.length(RoadRib.max_speed)
+    ribs = (await session.execute(select(
+        func.count(), func.max(RoadRib.id),
+        func.sum(RoadRib.length), func.sum(RoadRib.start_node_id), func.sum(RoadRib.end_node_id),
+        func.sum(speed_len),
+        func.sum(rib_key * RoadRib.length), func.sum(rib_key * RoadRib.start_node_id),
+        func.sum(rib_key * RoadRib.end_node_id), func.sum(rib_key * speed_len),
+    ))).one()
+    return {
+        "road_nodes": [int(nodes[0]), int(nodes[1] or 0), _checksum(*nodes[2:])],
+        "road_ribs": [int(ribs[0]), int(ribs[1] or 0), _checksum(*ribs[2:])],
+    }
+
+
+def save_snapshot(graph: RoadGraph, path: str, source: Optional[dict] = None, **params):
+    """
+    Записывает снимок графа. Каталог подменяется целиком, поэтому
+    читатели никогда не видят наполовину записанный снимок.
+    """
+    tmp = f"{path}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    arrays = {}
+    for name, arr in graph.core_arrays().items():
+        np.save(os.path.join(tmp, f"{name}.npy"), arr)
+        arrays[name] = {"dtype": str(arr.dtype), "shape": list(arr.shape), "crc32": _crc32(arr)}
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": time.time(),
+        "node_count": graph.node_count,
+        "edge_count": graph.edge_count,
+        "source": source,
+        "params": params,
+        "arrays": arrays,
+    }
+    with open(os.path.join(tmp, _MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    old = f"{path}.old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def manifest_id(manifest: dict) -> int:
+    """Идентификатор записи снимка: время записи и контрольные суммы массивов."""
+    return zlib.crc32(json.dumps([manifest.get("created_at"), manifest.get("arrays")], sort_keys=True).encode())
+
+
+def snapshot_matches(path: str, expected_id: Optional[int]) -> bool:
+    """Лежит ли по пути та же запись снимка, что expected_id."""
+    try:
+        return expected_id is not None and manifest_id(read_manifest(path)) == expected_id
+    except SnapshotError:
+        return False
+
+
+def read_manifest(path: str) -> dict:
+    try:
+        with open(os.path.join(path, _MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Нет снимка графа в {path}: {e}")
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Неподдерживаемая версия снимка: {manifest.get('format_version')}")
+    return manifest
+
+
+def load_snapshot(
+    path: str,
+    graph_cls: type = RoadGraph,
+    source: Optional[dict] = None,
+    verify: bool = SNAPSHOT_VERIFY,
+    expected_id: Optional[int] = None,
+    **params,
+) -> Tuple[RoadGraph, dict]:
+    """
+    Загружает граф из снимка через mmap.
+
+    Если передан source (отпечаток БД) или params (например, профили),
+    они должны совпадать с записанными в снимке, иначе снимок устарел.
+    expected_id (см. manifest_id) — снимок должен быть той же записью,
+    что уже загружен в другом процессе; иначе SnapshotError.
+    """
+    manifest = read_manifest(path)
+    if expected_id is not None and manifest_id(manifest) != expected_id:
+        raise SnapshotError(f"Снимок графа в {path} перезаписан после загрузки")
+    if source is not None and manifest.get("source") != source:
+        raise SnapshotError("Снимок графа устарел: данные road_nodes/road_ribs изменились")
+    for key, value in params.items():
+        if manifest.get("params", {}).get(key) != value:
+            raise SnapshotError(f"Снимок графа собран с другим параметром {key}")
+
+    arrays = {}
+    for name, meta in manifest["arrays"].items():
+        try:
+            arr = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"Не удалось прочитать {name}.npy: {e}")
+        if str(arr.dtype) != meta["dtype"] or list(arr.shape) != meta["shape"]:
+            raise SnapshotError(f"Массив {name} не соответствует манифесту")
+        if verify and _crc32(arr) != meta["crc32"]:
+            raise SnapshotError(f"Контрольная сумма массива {name} не совпадает")
+        arrays[name] = arr
+
+    # Каталог мог подмениться, пока открывались массивы: файлы уже
+    # отображены, достаточно убедиться, что запись снимка та же
+    if expected_id is not None and not snapshot_matches(path, expected_id):
+        raise SnapshotError(f"Снимок графа в {path} перезаписан во время загрузки")
+
+    graph = graph_cls(**arrays)
+    graph.snapshot_path = path
+    graph.snapshot_id = manifest_id(manifest)
+    return graph, manifest
+
+
+async def _build(path: str):
+    from config import AsyncSessionLocal
+    from services.iso_service import IsochroneService
+
+    service = IsochroneService()
+    async with AsyncSessionLocal() as session:
+        source = await fetch_source_fingerprint(session)
+        started = time.perf_counter()
+        graph = await service._build_graph_from_db(session)
+    save_snapshot(graph, path, source, **service._snapshot_params())
+    print(f"Снимок графа записан в {path}: {graph.node_count} узлов, {graph.edge_count} рёбер, "
+          f"{graph.nbytes / 2**20:.1f} МБ, {time.perf_counter() - started:.1f} с")
+
+
+def _info(path: str):
+    started = time.perf_counter()
+    graph, manifest = load_snapshot(path, verify=True)
+    print(json.dumps({k: v for k, v in manifest.items() if k != "arrays"}, indent=2))
+    print(f"Загрузка с проверкой: {1000 * (time.perf_counter() - started):.1f} мс")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    target = sys.argv[2] if len(sys.argv) > 2 else GRAPH_SNAPSHOT_PATH
+    if command == "build":
+        asyncio.run(_build(target))
+    elif command == "info":
+        _info(target)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from services.road_graph import RoadGraph
+
+# Количество процессов для расчёта изохрон; по умолчанию — по ядру, но не
+# больше 4 (каждый процесс держит свою копию графа, если граф не из снимка).
+# 0 — считать в пуле потоков текущего процесса: без копий графа, порции
+# поисков идут параллельно, но Python-часть сборки полигонов делит GIL
+ISO_WORKERS = int(os.getenv("ISO_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Состояние процесса-воркера: сервис со своей копией графа
+_worker_service = None
+
+
+def _init_worker(graph_cls: type, arrays: Optional[dict], snapshot_path: Optional[str], snapshot_id: Optional[int]):
+    """
+    Инициализатор воркера: граф загружается один раз при старте процесса.
+    Если граф пришёл из снимка, воркер отображает те же файлы через mmap,
+    и страницы графа делятся между процессами. Снимок должен быть той же
+    записью (snapshot_id), что загружена в основном процессе: если файл
+    успели перезаписать, воркер не стартует, а пул пересоздаётся с
+    массивами графа (см. IsochroneExecutor.run).
+    """
+    global _worker_service
+    from services.iso_service import IsochroneService
+    from services.graph_snapshot import load_snapshot
+
+    if snapshot_path is not None:
+        graph, _ = load_snapshot(snapshot_path, graph_cls, verify=False, expected_id=snapshot_id)
+    else:
+        graph = graph_cls(**arrays)
+    _worker_service = IsochroneService(workers=0)
+    _worker_service._set_graph(graph)
+
+
+def _run_job(job: str, *args):
+    """Вызывает метод сервиса воркера (расчёт изохрон или порции матрицы)."""
+    return getattr(_worker_service, job)(*args)
+
+
+class IsochroneExecutor:
+    """
+    Выполняет тяжёлую часть расчёта изохрон (Дейкстра, буферы, объединение)
+    вне event loop.
+
+    Задание компактное: индексы стартовых узлов, пороги в минутах, способ
+    построения полигона, профиль передвижения и начальное время в стартовых
+    узлах; результат — список (минуты, GeoJSON или shapely-геометрия). Так же выполняются порции
+    матрицы времени. Процессы получают массивы графа один раз при старте пула.
+
+    Если процесс пула упал или отказался от графа, пул пересоздаётся, а
+    задание досчитывается в текущем процессе.
+    """
+
+    def __init__(self, workers: int = ISO_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_version: Optional[int] = None
+        self._graph: Optional[RoadGraph] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    @property
+    def parallelism(self) -> int:
+        """
+        Сколько порций задания имеет смысл считать одновременно: по процессу
+        пула или, без пула, по ядру — Дейкстра scipy отпускает GIL, и потоки
+        считают параллельно.
+        """
+        return self.workers if self.workers > 0 else os.cpu_count() or 1
+
+    def start(self, graph: RoadGraph, version: int):
+        """(Пере)запускает пул процессов с новой версией графа."""
+        if self.workers <= 0:
+            return
+        old = self._pool
+        self._pool = self._make_pool(graph)
+        self._pool_version = version
+        self._graph = graph
+        if old is not None:
+            # Запущенные задания дорабатывают на старом пуле
+            old.shutdown(wait=False)
+
+    def _make_pool(self, graph: RoadGraph) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=self._graph_initargs(graph),
+        )
+
+    @staticmethod
+    def _graph_initargs(graph: RoadGraph) -> tuple:
+        """
+        Снимок передаётся процессам, только если на диске всё та же его
+        запись, что загружена здесь; иначе — массивы графа.
+        """
+        from services.graph_snapshot import snapshot_matches
+
+        snapshot_path = getattr(graph, "snapshot_path", None)
+        snapshot_id = getattr(graph, "snapshot_id", None)
+        if snapshot_path is not None and snapshot_matches(snapshot_path, snapshot_id):
+            return type(graph), None, snapshot_path, snapshot_id
+        return type(graph), graph.core_arrays(), None, None
+
+    def _restart(self, broken: ProcessPoolExecutor, error: Exception):
+        """Пересоздаёт сломанный пул для того же графа (если его ещё не пересоздали или не сменили)."""
+        with self._lock:
+            if self._pool is not broken:
+                return
+            self.restarts += 1
+            self._pool = self._make_pool(self._graph)
+        print(f"Пул процессов изохрон пересоздан после ошибки: {error}")
+        broken.shutdown(wait=False)
+
+    def shutdown(self):
+        if self._pool is not None:
+            # Уже отправленные задания дорабатывают, новые в пул не попадут
+            self._pool.shutdown(wait=False)
+            self._pool = None
+            self._pool_version = None
+            self._graph = None
+
+    async def run(
+        self,
+        local_fn: Callable[..., Any],
+        version: int,
+        *job_args,
+        job: str = "_build_isochrones_from_graph",
+    ) -> Any:
+        """
+        Выполняет задание в пуле процессов, а если он не запущен или уже
+        работает с другой версией графа — через local_fn в пуле потоков.
+        job — метод IsochroneService, job_args — его аргументы.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        with self._lock:
+            self.pending += 1
+        try:
+            pool = self._pool
+            if pool is not None and self._pool_version == version:
+                try:
+                    result = await loop.run_in_executor(pool, _run_job, job, *job_args)
+                except BrokenProcessPool as e:
+                    # Процесс пула упал или не принял граф: следующие задания
+                    # идут в новый пул, это — в текущем процессе
+                    self._restart(pool, e)
+                    result = await loop.run_in_executor(None, local_fn, *job_args)
+            else:
+                result = await loop.run_in_executor(None, local_fn, *job_args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        else:
+            latency = time.perf_counter() - started
+            with self._lock:
+                self.completed += 1
+                self._latency_total += latency
+                self._latency_max = max(self._latency_max, latency)
+            return result
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "restarts": self.restarts,
+                "latency_ms_avg": 1000 * self._latency_total / self.completed if self.completed else 0.0,
+                "latency_ms_max": 1000 * self._latency_max,
+            }
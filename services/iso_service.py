@@ -1,98 +1,422 @@
 import asyncio
-from typing import List, Tuple, Optional, Dict, Any
-import networkx as nx
+import functools
+import os
+import time
+from typing import AsyncIterator, List, Tuple, Optional, Dict, Any, Hashable, Union
 from shapely.ops import unary_union
-from shapely.geometry import LineString, Point, mapping
-import geopandas as gpd
+from shapely.geometry import mapping
+from shapely.geometry.base import BaseGeometry
+import shapely
 import numpy as np
 from scipy.spatial import cKDTree
 
-from bd_models import RoadNode, RoadRib
-from sqlmodel import select
+from services.road_graph import RoadGraph, GRAPH_BACKENDS, merge_sources
+from services.graph_loader import load_road_graph
+from services.isochrone_cache import IsochroneCache, geojson_nbytes, geometry_nbytes
+from services.isochrone_polygons import POLYGON_METHODS
+from services.geo_utils import local_projection
+from services.travel_profiles import DEFAULT_PROFILE, PROFILES, get_profile
+from services.iso_executor import IsochroneExecutor, ISO_WORKERS
+from services.graph_snapshot import (
+    GRAPH_SNAPSHOT_PATH, SnapshotError, fetch_source_fingerprint, load_snapshot, save_snapshot,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
-WALKING_SPEED_M_PER_MIN = 80.0  # 80 метров/мин
 BUFFER_METERS = 50  # ширина буфера вокруг дорог
+GRAPH_BACKEND = os.getenv("ISO_GRAPH_BACKEND", "csr")  # csr | networkx
+ISO_CACHE_MAX_BYTES = int(os.getenv("ISO_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DEFAULT_POLYGON_METHOD = "buffer"  # buffer | hull | raster, см. services/isochrone_polygons.py
+GRAPH_RELOAD_SECONDS = int(os.getenv("ISO_GRAPH_RELOAD_SECONDS", "0"))  # 0 — без периодической перезагрузки
+SNAP_RADIUS_METERS = float(os.getenv("ISO_SNAP_RADIUS_METERS", "500"))  # дальше от дорог точки отбрасываются
+# node — старт из ближайшего узла; edge — из точки на ближайшем ребре
+# (оба конца ребра получают начальное время пропорционально остатку ребра)
+SNAP_MODES = ("node", "edge")
+DEFAULT_SNAP_MODE = os.getenv("ISO_SNAP_MODE", "node")
+MAX_SIMPLIFY_METERS = 100.0  # больший допуск заметно искажает изохрону
+# Пустая полоса в кэше изохрон: в ответ не попадает, но и не пересчитывается
+_EMPTY_BAND = object()
+_EMPTY_BAND_NBYTES = 64
+MATRIX_MAX_CELLS = int(os.getenv("ISO_MATRIX_MAX_CELLS", str(4_000_000)))  # origins x destinations
+
+
+
+def _simplify(geom, tolerance_m: float):
+    """Упрощение контура в метрах; топология (кольца, дыры) сохраняется."""
+    if tolerance_m <= 0:
+        return geom
+    return shapely.simplify(geom, tolerance_m, preserve_topology=True)
 
 
 class IsochroneService:
-    def __init__(self):
-        self._graph: Optional[nx.Graph] = None
+    def __init__(
+        self,
+        backend: str = GRAPH_BACKEND,
+        workers: int = ISO_WORKERS,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+    ):
+        """bbox (min_lon, min_lat, max_lon, max_lat) — загрузить граф только этого региона."""
+        if backend not in GRAPH_BACKENDS:
+            raise ValueError(f"Неизвестный бэкенд графа: {backend}")
+        self._graph_cls = GRAPH_BACKENDS[backend]
+        self.bbox = bbox
+        self._graph: Optional[RoadGraph] = None
+        self._graph_version = 0
+        self._cache = IsochroneCache(ISO_CACHE_MAX_BYTES)
+        self._executor = IsochroneExecutor(workers)
+        self.load_stats: Optional[Dict[str, Any]] = None
+        self._reload_lock = asyncio.Lock()
+        self._reload_info: Dict[str, Any] = {"reloading": False, "last_reload_at": None, "last_error": None}
         self._initialized = False
     
-    async def initialize(self, session: AsyncSession):
+    async def initialize(self, session: AsyncSession, snapshot_path: Optional[str] = GRAPH_SNAPSHOT_PATH):
         if self._initialized:
             return
-        self._graph = await self._build_graph_from_db(session)
-        self._init_graph_attributes()
+        graph = None
+        # Отпечаток нужен и без снимка: по нему reload() видит изменения таблиц
+        source = await fetch_source_fingerprint(session)
+        if snapshot_path:
+            graph = self._load_snapshot(snapshot_path, source)
+        if graph is None:
+            graph = await self._build_graph_from_db(session)
+            if snapshot_path:
+                self._save_snapshot(graph, snapshot_path, source)
+        graph.source = source
+        self._set_graph(graph)
         self._initialized = True
-  
-    async def _build_graph_from_db(self, session: AsyncSession) -> nx.Graph:
 
-        G = nx.Graph()
-        
-        q = await session.execute(select(RoadNode))
-        nodes = q.scalars().all()
-        for n in nodes:
+    def _load_snapshot(self, path: str, source: dict) -> Optional[RoadGraph]:
+        """Граф из снимка; None, если снимка нет или он устарел."""
+        try:
+            graph, _ = load_snapshot(path, self._graph_cls, source, **self._snapshot_params())
+        except SnapshotError as e:
+            print(f"Снимок графа не используется: {e}")
+            return None
+        return graph
+
+    def _snapshot_params(self) -> Dict[str, Any]:
+        """Параметры сборки графа; снимок с другими параметрами считается устаревшим."""
+        return {
+            "profiles": {name: profile.signature() for name, profile in PROFILES.items()},
+            "bbox": list(self.bbox) if self.bbox is not None else None,
+        }
+
+    def _save_snapshot(self, graph: RoadGraph, path: str, source: dict):
+        try:
+            save_snapshot(graph, path, source, **self._snapshot_params())
+        except OSError as e:
+            print(f"Не удалось записать снимок графа: {e}")
+
+    def _set_graph(self, graph: RoadGraph):
+        """Устанавливает новый граф; кэш изохрон старого графа сбрасывается."""
+        self._init_graph_attributes(graph)
+        self._swap_graph(graph)
+
+    def _swap_graph(self, graph: RoadGraph):
+        """
+        Подменяет граф одним шагом. Граф уже подготовлен: KD-дерево и
+        проекция висят на нём же, поэтому запросы, захватившие старый граф,
+        дорабатывают на нём, а новые сразу видят новую версию.
+        """
+        graph.version = self._graph_version + 1
+        self._graph = graph
+        self._graph_version = graph.version
+        self._cache.clear()
+        self._executor.start(graph, graph.version)
+
+    @property
+    def graph_version(self) -> int:
+        return self._graph_version
+
+    @property
+    def graph(self) -> Optional[RoadGraph]:
+        """Текущий граф (None до загрузки); его версия — graph.version."""
+        return self._graph
+
+    @property
+    def graph_source(self) -> Optional[dict]:
+        """Отпечаток таблиц графа, по которому собран текущий граф (см. fetch_source_fingerprint)."""
+        return getattr(self._graph, "source", None)
+
+    async def source_changed(self, session: AsyncSession) -> bool:
+        """Изменилось ли содержимое road_nodes/road_ribs с загрузки текущего графа."""
+        return self._graph is None or await fetch_source_fingerprint(session) != self.graph_source
+
+    async def reload(self, session_factory, force: bool = False, snapshot_path: Optional[str] = GRAPH_SNAPSHOT_PATH) -> bool:
+        """
+        Перечитывает граф из БД в фоне и атомарно подменяет текущий.
+
+        Без force граф не перестраивается, если отпечаток содержимого таблиц
+        road_nodes/road_ribs (см. fetch_source_fingerprint) не изменился.
+        Возвращает True, если граф подменён.
+        """
+        if self._reload_lock.locked():
+            return False
+        async with self._reload_lock:
+            self._reload_info["reloading"] = True
             try:
-                lon = float(n.longtitude)
-                lat = float(n.latitude)
-            except Exception:
-                continue
-            G.add_node(n.node_id, lon=lon, lat=lat)
-
-        q = await session.execute(select(RoadRib))
-        ribs = q.scalars().all()
-        for r in ribs:
+                async with session_factory() as session:
+                    source = await fetch_source_fingerprint(session)
+                    if not force and self._graph is not None and source == self.graph_source:
+                        return False
+                    graph = await self._build_graph_from_db(session)
+                graph.source = source
+                # KD-дерево и проекция строятся до подмены, вне event loop
+                await asyncio.to_thread(self._init_graph_attributes, graph)
+                self._swap_graph(graph)
+                self._initialized = True
+                if snapshot_path:
+                    await asyncio.to_thread(self._save_snapshot, graph, snapshot_path, source)
+                self._reload_info["last_error"] = None
+                return True
+            except Exception as e:
+                self._reload_info["last_error"] = str(e)
+                raise
+            finally:
+                self._reload_info["reloading"] = False
+                self._reload_info["last_reload_at"] = time.time()
+
+    async def run_periodic_reload(self, session_factory, interval: int = GRAPH_RELOAD_SECONDS):
+        """Фоновая задача: проверяет изменения графа раз в interval секунд."""
+        while True:
+            await asyncio.sleep(interval)
             try:
-                length = float(r.length)
-            except Exception:
-                continue
-            time_min = length / WALKING_SPEED_M_PER_MIN
-            if r.start_node_id in G.nodes and r.end_node_id in G.nodes:
-                G.add_edge(r.start_node_id, r.end_node_id,
-                           length=length,
-                           time=time_min)
-        return G
+                await self.reload(session_factory)
+            except Exception as e:
+                print(f"Ошибка при перезагрузке графа дорог: {e}")
+
+    def memory_bytes(self) -> int:
+        """Оценка памяти графа вместе с матрицами поиска, KD-деревом, STRtree рёбер и метрическими координатами."""
+        graph = self._graph
+        if graph is None:
+            return 0
+        return graph.nbytes + graph.matrix_nbytes + 48 * graph.node_count + 200 * graph.edge_count
+
+    def graph_info(self) -> Dict[str, Any]:
+        graph = self._graph
+        return {
+            "version": self._graph_version,
+            "nodes": graph.node_count if graph is not None else 0,
+            "edges": graph.edge_count if graph is not None else 0,
+            "load_stats": self.load_stats,
+            **self._reload_info,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+    def cache_stats(self) -> Dict[str, int]:
+        return self._cache.stats()
+
+    def executor_stats(self) -> Dict[str, float]:
+        return self._executor.stats()
+  
+    async def _build_graph_from_db(self, session: AsyncSession) -> RoadGraph:
+        graph, stats = await load_road_graph(session, self._graph_cls, PROFILES, bbox=self.bbox)
+        print(f"Граф дорог загружен из БД: {graph.node_count} узлов, {graph.edge_count} рёбер, {stats}")
+        self.load_stats = stats
+        return graph
     
-    def _init_graph_attributes(self):
-        if self._graph is None:
+    def _init_graph_attributes(self, graph: Optional[RoadGraph] = None):
+        graph = graph if graph is not None else self._graph
+        if graph is None:
             return
         
-        node_ids = list(self._graph.nodes)
-        coords = [(self._graph.nodes[nid]['lon'], self._graph.nodes[nid]['lat']) 
-                  for nid in node_ids]
-        arr = np.array(coords)
-        
-        if len(arr) > 0:
-            kdtree = cKDTree(arr)
-            self._graph.kdtree = kdtree
-            self._graph.node_index_to_id = node_ids
-            self._graph.node_pos = {nid: (lon, lat) for nid, (lon, lat) in zip(node_ids, coords)}
+        if graph.node_count > 0:
+            # Локальная метрическая проекция и координаты узлов в метрах
+            # считаются один раз на граф, а не на каждый запрос
+            graph.projection = local_projection(graph.lon, graph.lat)
+            graph.x, graph.y = graph.projection.to_metric(graph.lon, graph.lat)
+            # KD-дерево в метрах: расстояния привязки сразу в метрах
+            # и одинаковы по широте и долготе
+            graph.kdtree = cKDTree(np.column_stack((graph.x, graph.y)))
         else:
-            self._graph.kdtree = None
-            self._graph.node_index_to_id = []
-            self._graph.node_pos = {}
-    
-    def _nearest_node_kdtree(self, lon: float, lat: float) -> Optional[int]:
-        if self._graph is None or not hasattr(self._graph, "kdtree") or self._graph.kdtree is None:
-            return None
-        # Попробуйте поменять местами
-        dist, idx = self._graph.kdtree.query([lat, lon], k=1)  # ← [lat, lon]
-        return self._graph.node_index_to_id[int(idx)]
+            graph.kdtree = None
+            graph.projection = None
+
+        # STRtree отрезков рёбер для привязки к ребру (snap="edge")
+        graph.edge_tree = None
+        if graph.edge_count > 0:
+            u, v, pos = graph.edge_arrays()
+            graph.edge_ends = (u, v, pos)
+            graph.edge_tree = shapely.STRtree(shapely.linestrings(
+                np.stack((np.column_stack((graph.x[u], graph.y[u])),
+                          np.column_stack((graph.x[v], graph.y[v]))), axis=1)
+            ))
+
+    def snap_points(
+        self,
+        points: List[Tuple[float, float]],
+        graph: Optional[RoadGraph] = None,
+        max_distance: float = SNAP_RADIUS_METERS,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Привязывает точки (lon, lat) к ближайшим узлам графа одним запросом к KD-дереву.
+
+        Returns:
+            (индексы узлов, расстояния в метрах); для точек дальше
+            max_distance от дорожной сети индекс -1 и расстояние inf
+        """
+        graph = graph if graph is not None else self._graph
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if graph is None or getattr(graph, "kdtree", None) is None or not len(coords):
+            return np.full(len(coords), -1, dtype=np.int64), np.full(len(coords), np.inf)
+
+        x, y = graph.projection.to_metric(coords[:, 0], coords[:, 1])
+        dist, idx = graph.kdtree.query(np.column_stack((x, y)), k=1, distance_upper_bound=max_distance)
+        # Промахи cKDTree помечает индексом node_count
+        idx = np.where(np.isfinite(dist), idx, -1).astype(np.int64)
+        return idx, dist
+
+    def snap_points_to_edges(
+        self,
+        points: List[Tuple[float, float]],
+        graph: Optional[RoadGraph] = None,
+        max_distance: float = SNAP_RADIUS_METERS,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Привязывает точки (lon, lat) к ближайшим рёбрам графа одним запросом к STRtree.
+
+        Returns:
+            (номера рёбер в graph.edge_ends, доля ребра от u до проекции
+            точки, расстояния в метрах); для точек дальше max_distance
+            номер ребра -1 и расстояние inf
+        """
+        graph = graph if graph is not None else self._graph
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        edge = np.full(len(coords), -1, dtype=np.int64)
+        frac = np.zeros(len(coords))
+        dist = np.full(len(coords), np.inf)
+        if graph is None or getattr(graph, "edge_tree", None) is None or not len(coords):
+            return edge, frac, dist
+
+        x, y = graph.projection.to_metric(coords[:, 0], coords[:, 1])
+        (found, nearest), found_dist = graph.edge_tree.query_nearest(
+            shapely.points(x, y), max_distance=max_distance, return_distance=True, all_matches=False,
+        )
+        edge[found] = nearest
+        dist[found] = found_dist
+
+        # Проекция точки на отрезок (u, v) — параметр t в [0, 1]
+        u, v, _ = graph.edge_ends
+        eu, ev = u[nearest], v[nearest]
+        dx, dy = graph.x[ev] - graph.x[eu], graph.y[ev] - graph.y[eu]
+        seg2 = dx * dx + dy * dy
+        t = ((x[found] - graph.x[eu]) * dx + (y[found] - graph.y[eu]) * dy) / np.where(seg2 > 0, seg2, 1.0)
+        frac[found] = np.clip(t, 0.0, 1.0)
+        return edge, frac, dist
+
+    def _snap(
+        self,
+        points: List[Tuple[float, float]],
+        graph: RoadGraph,
+        snap_mode: str,
+        profile: str,
+    ) -> Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]:
+        """
+        Стартовые узлы каждой точки и их начальное время (None для привязки к узлам).
+
+        Returns:
+            (узлы (точки x k), начальное время (точки x k) или None,
+            расстояния привязки); у непривязанных точек узлы -1
+        """
+        if snap_mode == "edge" and getattr(graph, "edge_tree", None) is not None:
+            edge, frac, dist = self.snap_points_to_edges(points, graph)
+            found = edge >= 0
+            nodes = np.full((len(edge), 2), -1, dtype=np.int64)
+            costs = np.zeros((len(edge), 2))
+            u, v, pos = (arr[edge[found]] for arr in graph.edge_ends)
+            weight = graph.weights(profile)[pos].astype(np.float64)
+            t = frac[found]
+            # Из точки до u — доля t ребра, до v — остаток
+            nodes[found] = np.column_stack((u, v))
+            costs[found] = np.column_stack((t * weight, (1.0 - t) * weight))
+            return nodes, costs, dist
+
+        idx, dist = self.snap_points(points, graph)
+        return idx[:, None], None, dist
+
+    @staticmethod
+    def _start_set(nodes: np.ndarray, costs: Optional[np.ndarray]) -> Tuple[List[int], Optional[List[float]], tuple]:
+        """
+        Канонический набор стартов для поиска и ключ кэша.
+
+        Returns:
+            (узлы, начальное время или None, ключ)
+        """
+        if costs is None:
+            key = tuple(np.unique(nodes).tolist())
+            return list(key), None, key
+        # При привязке к рёбрам старт — узел и начальное время (с точностью до 0.001 мин)
+        start_nodes, start_costs = merge_sources(nodes.ravel(), np.round(costs.ravel(), 3))
+        key = tuple(zip(start_nodes.tolist(), start_costs.tolist()))
+        return start_nodes.tolist(), start_costs.tolist(), key
+
+    def _group_starts(
+        self,
+        nodes: np.ndarray,
+        costs: Optional[np.ndarray],
+        snap_dist: np.ndarray,
+    ) -> Dict[tuple, Tuple[tuple, List[int]]]:
+        """Привязанные точки, сгруппированные по набору стартов: {ключ: (старт, номера точек)}."""
+        groups: Dict[tuple, Tuple[tuple, List[int]]] = {}
+        for i in np.flatnonzero(np.isfinite(snap_dist)).tolist():
+            start = self._start_set(nodes[i:i + 1], None if costs is None else costs[i:i + 1])
+            groups.setdefault(start[2], (start, []))[1].append(i)
+        return groups
+
+    def _validate_request(
+        self,
+        time_minutes: Union[int, List[int]],
+        method: str,
+        profile: str,
+        snap_mode: str,
+        simplify_m: float = 0.0,
+    ):
+        """Проверяет параметры запроса изохрон; возвращает (профиль, пороги)."""
+        if not self._initialized:
+            raise RuntimeError("IsochroneService не инициализирован. Запустите initialize() при старте приложения.")
+
+        travel = get_profile(profile)
+        bands = sorted(set([time_minutes] if isinstance(time_minutes, int) else time_minutes))
+        if not bands or bands[0] <= 0 or bands[-1] > travel.max_minutes:
+            raise ValueError(f"Время должно быть >0 и <= {travel.max_minutes} минут")
+        if method not in POLYGON_METHODS:
+            raise ValueError(f"Неизвестный способ построения полигона: {method}")
+        if snap_mode not in SNAP_MODES:
+            raise ValueError(f"Неизвестный способ привязки точек: {snap_mode}")
+        if not 0 <= simplify_m <= MAX_SIMPLIFY_METERS:
+            raise ValueError(f"Допуск упрощения должен быть от 0 до {MAX_SIMPLIFY_METERS:g} м")
+        return travel, bands
     
-    def _build_isochrones_from_graph(self, start_nodes: List[int], time_min: int) -> List[Tuple[int, dict]]:
+    def _build_isochrones_from_graph(
+        self,
+        start_nodes: List[int],
+        bands: List[int],
+        method: str = DEFAULT_POLYGON_METHOD,
+        profile: str = DEFAULT_PROFILE,
+        start_costs: Optional[List[float]] = None,
+        simplify_m: float = 0.0,
+        as_geojson: bool = True,
+        graph: Optional[RoadGraph] = None,
+    ) -> List[Tuple[int, Any]]:
         """
-        Строит изохроны доступности.
+        Строит вложенные изохроны доступности за один проход Дейкстры.
         
         Args:
-            start_nodes: список ID начальных узлов графа
-            time_min: время в минутах
+            start_nodes: список плотных индексов начальных узлов графа
+            bands: пороги времени в минутах, например [5, 10, 15]
+            method: способ построения полигона (buffer, hull, raster)
+            profile: профиль передвижения (walk, bike, car)
+            start_costs: начальное время в start_nodes (привязка к ребру)
+            simplify_m: допуск упрощения контура в метрах (0 — без упрощения)
+            as_geojson: False — вернуть shapely-геометрии в lon/lat
+            graph: граф, на котором считать (по умолчанию текущий)
             
         Returns:
-            List[Tuple[int, dict]]: список из одного кортежа (time_min, геометрия)
+            List[Tuple[int, Any]]: по кортежу (минуты, геометрия) на каждый порог,
+            по возрастанию минут; пустые полосы пропускаются
             
-        Формат геометрии: GeoJSON (shapely.mapping)
+        Формат геометрии: GeoJSON (shapely.mapping) или shapely при as_geojson=False
         Пример: [(10, {"type": "Polygon", "coordinates": [[[lon,lat],...]]})]
         
         Полигоны:
@@ -100,71 +424,413 @@ class IsochroneService:
         - type: "Polygon" или "MultiPolygon"
         - coordinates: вложенные списки координат [долгота, широта]
         """
-        if self._graph is None:
+        graph = graph if graph is not None else self._graph
+        if graph is None:
             return []
         
-        lengths = nx.multi_source_dijkstra_path_length(
-            self._graph, 
-            sources=start_nodes, 
-            weight='time'
-        )
-        reachable_nodes = {nid for nid, t in lengths.items() if t <= time_min}
+        bands = sorted(set(bands))
+        max_minutes = bands[-1]
+        # Поиск ограничен наибольшим порогом: дальше узлы не раскрываются
+        times = graph.shortest_times(start_nodes, limit=max_minutes, profile=profile, initial=start_costs)
+        reachable = times <= max_minutes
+        nodes = np.flatnonzero(reachable)
         
-        if not reachable_nodes:
+        if not len(nodes):
             return []
         
-        lines = []
-        for u, v, data in self._graph.edges(data=True):
-            if u in reachable_nodes or v in reachable_nodes:
-                udata = self._graph.nodes[u]
-                vdata = self._graph.nodes[v]
-                lines.append(LineString([(udata['lon'], udata['lat']), 
-                                         (vdata['lon'], vdata['lat'])]))
+        # Рёбра берём только из смежности достигнутых узлов
+        u, v, _ = graph.incident_edges(nodes, reachable)
+        x, y = graph.x, graph.y
+        projection = graph.projection
+
+        def output(geom):
+            geom = projection.geometry_to_lonlat(_simplify(geom, simplify_m))
+            return mapping(geom) if as_geojson else geom
+        
+        if not len(u):
+            results = []
+            for minutes in bands:
+                band_nodes = nodes[times[nodes] <= minutes]
+                if not len(band_nodes):
+                    continue
+                geom = unary_union(shapely.buffer(shapely.points(x[band_nodes], y[band_nodes]), BUFFER_METERS))
+                results.append((minutes, output(geom)))
+            return results
+        
+        # Ребро попадает в полосу по времени достижения ближайшего из концов
+        edge_time = np.minimum(times[u], times[v])
+        order = np.argsort(edge_time, kind="stable")
+        u, v, edge_time = u[order], v[order], edge_time[order]
         
-        if not lines:
-            points = [Point(self._graph.nodes[n]['lon'], self._graph.nodes[n]['lat']) 
-                      for n in reachable_nodes]
-            geom = unary_union([p.buffer(0.0005) for p in points])
-            return [(time_min, mapping(geom))]
+        segments = np.stack((np.column_stack((x[u], y[u])),
+                             np.column_stack((x[v], y[v]))), axis=1)
+        points = np.column_stack((x[nodes], y[nodes]))
         
-        gdf = gpd.GeoSeries(lines, crs="EPSG:4326")
-        gdf_proj = gdf.to_crs(epsg=3857)
-        buffered = [geom.buffer(BUFFER_METERS) for geom in gdf_proj.geometry]
-        unioned = unary_union(buffered)
-        joined = gpd.GeoSeries([unioned], crs="EPSG:3857").to_crs(epsg=4326).iloc[0]
-        return [(time_min, mapping(joined))]
+        build_bands = POLYGON_METHODS[method]
+        unions = build_bands(segments, edge_time, points, times[nodes], bands, BUFFER_METERS)
+        
+        return [(minutes, output(geom)) for minutes, geom in unions]
     
     async def calculate_isochrones(
         self,
         points: List[Tuple[float, float]],
-        time_minutes: int
+        time_minutes: Union[int, List[int]],
+        method: str = DEFAULT_POLYGON_METHOD,
+        profile: str = DEFAULT_PROFILE,
+        snap_mode: str = DEFAULT_SNAP_MODE,
+        simplify_m: float = 0.0,
     ) -> List[Dict[str, Any]]:
-        if not self._initialized:
-            raise RuntimeError("IsochroneService не инициализирован. Запустите initialize() при старте приложения.")
-        
-        if time_minutes <= 0 or time_minutes > 15:
-            raise ValueError("Время должно быть >0 и <= 15 минут")
-
-        start_nodes = set()
-        for lon, lat in points:
-            nid = self._nearest_node_kdtree(lon, lat)
-            if nid:
-                start_nodes.add(nid)
-        
-        if not start_nodes:
-            raise ValueError("Не найдены ближайшие узлы дорожной сети")
+        """
+        Считает изохроны от points. time_minutes — один порог или список
+        порогов; все полосы строятся за один поиск по графу. method —
+        способ построения полигона (см. services/isochrone_polygons.py),
+        profile — профиль передвижения (см. services/travel_profiles.py),
+        snap_mode — привязка точек к ближайшему узлу (node) или ребру (edge),
+        simplify_m — допуск упрощения контура в метрах с сохранением топологии.
+        Каждая изохрона помечается версией графа, на котором посчитана,
+        и статистикой привязки точек к графу (snap).
+        """
+        travel, bands = self._validate_request(time_minutes, method, profile, snap_mode, simplify_m)
+
+        # Весь запрос считается на одной версии графа, даже если во время
+        # расчёта граф перезагрузят
+        graph = self._graph
 
-        results = self._build_isochrones_from_graph(list(start_nodes), time_minutes)
+        nodes, costs, snap_dist = self._snap(points, graph, snap_mode, travel.name)
+        found = np.isfinite(snap_dist)
+        if not found.any():
+            raise ValueError(f"Не найдены узлы дорожной сети ближе {SNAP_RADIUS_METERS:g} м к точкам")
+        snap = {
+            "snapped": int(found.sum()),
+            "rejected": int(len(snap_dist) - found.sum()),
+            "max_distance_m": round(float(snap_dist[found].max()), 1),
+        }
+
+        start = self._start_set(nodes[found], None if costs is None else costs[found])
+        isochrones = await self._isochrones_for_start(graph, start, bands, method, travel.name, simplify_m)
+        return [{**item, "snap": snap} for item in isochrones]
+
+    async def _isochrones_for_start(
+        self,
+        graph: RoadGraph,
+        start: Tuple[List[int], Optional[List[float]], tuple],
+        bands: List[int],
+        method: str,
+        profile: str,
+        simplify_m: float = 0.0,
+    ) -> List[Dict[str, Any]]:
+        """Изохроны одного набора стартов (см. _start_set): из кэша или через исполнитель."""
+        version = graph.version
+        start_nodes, start_costs, nodes_key = start
+
+        # Ключ: версия графа + канонический набор стартов + минуты + способ + профиль + упрощение
+        cached = [self._cache.get((version, nodes_key, minutes, method, profile, simplify_m)) for minutes in bands]
+        if all(item is not None for item in cached):
+            return [dict(item) for item in cached if item is not _EMPTY_BAND]
+
+        # Тяжёлая часть выполняется вне event loop
+        results = await self._executor.run(
+            functools.partial(self._build_isochrones_from_graph, graph=graph),
+            version, start_nodes, bands, method, profile, start_costs, simplify_m,
+        )
 
         isochrones = []
         for minutes, geom in results:
             if hasattr(geom, "geom_type"):
                 geom = mapping(geom)
-            isochrones.append({
+            item = {
                 "minutes": minutes,
-                "polygon": geom
-            })
-        
+                "polygon": geom,
+                "graph_version": version,
+            }
+            # Результаты по уже заменённому графу в кэш не кладём
+            if version == self._graph_version:
+                self._cache.put((version, nodes_key, minutes, method, profile, simplify_m), item, geojson_nbytes(geom))
+            isochrones.append(dict(item))
+        if version == self._graph_version:
+            # Пустые полосы (поиск их не достиг) запоминаются меткой
+            built = {minutes for minutes, _ in results}
+            for minutes in bands:
+                if minutes not in built:
+                    self._cache.put((version, nodes_key, minutes, method, profile, simplify_m), _EMPTY_BAND, _EMPTY_BAND_NBYTES)
+
         return isochrones
 
+    async def iter_isochrones_by_source(
+        self,
+        points: List[Tuple[float, float]],
+        time_minutes: Union[int, List[int]],
+        ids: Optional[List[Any]] = None,
+        method: str = DEFAULT_POLYGON_METHOD,
+        profile: str = DEFAULT_PROFILE,
+        snap_mode: str = DEFAULT_SNAP_MODE,
+        simplify_m: float = 0.0,
+        concurrency: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Отдельные изохроны для каждой точки, по мере готовности.
+
+        Точки привязываются к графу одной пачкой; точки с одинаковым стартом
+        считаются один раз. Одновременно в исполнителе не больше
+        concurrency заданий (по умолчанию — два на процесс), поэтому
+        весь пакет не держится в памяти.
+
+        Yields:
+            {"id", "isochrones", "snap_distance_m"} для каждой точки или
+            {"id", "error"}, если точка не привязана к графу
+        """
+        travel, bands = self._validate_request(time_minutes, method, profile, snap_mode, simplify_m)
+        ids = list(range(len(points))) if ids is None else list(ids)
+        if len(ids) != len(points):
+            raise ValueError("Количество id не совпадает с количеством точек")
+
+        graph = self._graph
+        nodes, costs, snap_dist = self._snap(points, graph, snap_mode, travel.name)
+        groups = self._group_starts(nodes, costs, snap_dist)
+        for i in np.flatnonzero(~np.isfinite(snap_dist)).tolist():
+            yield {"id": ids[i], "error": f"Нет узлов дорожной сети ближе {SNAP_RADIUS_METERS:g} м"}
+
+        async def run_group(start, members):
+            return members, await self._isochrones_for_start(graph, start, bands, method, travel.name, simplify_m)
+
+        limit = concurrency or 2 * self._executor.parallelism
+        pending = iter(groups.values())
+        running = set()
+        try:
+            while True:
+                for start, members in pending:
+                    running.add(asyncio.ensure_future(run_group(start, members)))
+                    if len(running) >= limit:
+                        break
+                if not running:
+                    break
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    members, isochrones = task.result()
+                    for i in members:
+                        yield {
+                            "id": ids[i],
+                            "isochrones": isochrones,
+                            "snap_distance_m": round(float(snap_dist[i]), 1),
+                        }
+        finally:
+            # Клиент отключился или расчёт упал — оставшиеся задания не нужны
+            for task in running:
+                task.cancel()
+
+    async def isochrone_geometries(
+        self,
+        points: List[Tuple[float, float]],
+        time_minutes: int,
+        method: str = DEFAULT_POLYGON_METHOD,
+        profile: str = DEFAULT_PROFILE,
+        snap_mode: str = DEFAULT_SNAP_MODE,
+        simplify_m: float = 0.0,
+        concurrency: Optional[int] = None,
+    ) -> List[Optional[BaseGeometry]]:
+        """
+        Изохроны time_minutes для каждой из points сразу shapely-геометриями
+        в lon/lat (Polygon или MultiPolygon), без перевода в GeoJSON.
+
+        Точки привязываются к графу одной пачкой, одинаковые старты
+        считаются один раз, поиски идут параллельно — не больше
+        concurrency заданий в исполнителе одновременно.
+
+        Returns:
+            геометрия для каждой точки по порядку; None, если точка не
+            привязана к графу
+        """
+        travel, bands = self._validate_request(time_minutes, method, profile, snap_mode, simplify_m)
+        if len(bands) != 1:
+            raise ValueError("Для пакета геометрий нужен один порог времени")
+
+        graph = self._graph
+        version = graph.version
+        nodes, costs, snap_dist = self._snap(points, graph, snap_mode, travel.name)
+        groups = self._group_starts(nodes, costs, snap_dist)
+
+        geometries: List[Optional[BaseGeometry]] = [None] * len(points)
+        semaphore = asyncio.Semaphore(concurrency or 2 * self._executor.parallelism)
+        local_fn = functools.partial(self._build_isochrones_from_graph, graph=graph)
+
+        async def run_group(start, members):
+            start_nodes, start_costs, nodes_key = start
+            key = (version, nodes_key, bands[0], method, travel.name, simplify_m, "shapely")
+            geom = self._cache.get(key)
+            if geom is None:
+                async with semaphore:
+                    results = await self._executor.run(
+                        local_fn, version, start_nodes, bands, method, travel.name, start_costs, simplify_m, False,
+                    )
+                geom = results[0][1] if results else shapely.Polygon()
+                if version == self._graph_version:
+                    self._cache.put(key, geom, geometry_nbytes(geom))
+            for i in members:
+                geometries[i] = geom
+
+        await asyncio.gather(*(run_group(start, members) for start, members in groups.values()))
+        return geometries
+
+    def _travel_times_from_graph(
+        self,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        limit: float,
+        profile: str = DEFAULT_PROFILE,
+        graph: Optional[RoadGraph] = None,
+    ) -> np.ndarray:
+        """Порция матрицы времени: строки sources, столбцы targets (плотные индексы узлов)."""
+        graph = graph if graph is not None else self._graph
+        return graph.travel_times(sources, targets, limit=limit, profile=profile)
+
+    def _reach_sums_from_graph(
+        self,
+        sources: np.ndarray,
+        weights: np.ndarray,
+        limit: float,
+        profile: str = DEFAULT_PROFILE,
+        graph: Optional[RoadGraph] = None,
+    ) -> np.ndarray:
+        """Порция суммы весов по узлам (см. RoadGraph.reach_sums)."""
+        graph = graph if graph is not None else self._graph
+        return graph.reach_sums(sources, weights, limit=limit, profile=profile)
+
+    async def node_reach_sums(
+        self,
+        points: List[Tuple[float, float]],
+        weights: List[float],
+        minutes: float,
+        profile: str = DEFAULT_PROFILE,
+    ) -> Dict[str, Any]:
+        """
+        Для каждого узла графа — сумма weights тех points, от которых узел
+        достижим за minutes. Граф симметричный, поэтому это же сумма весов
+        точек, до которых можно дойти из узла.
+
+        Точки привязываются к ближайшим узлам, веса точек одного узла
+        складываются, и из каждого узла идёт один ограниченный поиск;
+        поиски делятся между процессами исполнителя.
+
+        Returns:
+            sums — float64 по узлам графа, snapped — маска привязанных
+            точек, graph_version
+        """
+        if not self._initialized:
+            raise RuntimeError("IsochroneService не инициализирован. Запустите initialize() при старте приложения.")
+        travel = get_profile(profile)
+        if minutes <= 0 or minutes > travel.max_minutes:
+            raise ValueError(f"Время должно быть >0 и <= {travel.max_minutes} минут")
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(weights) != len(points):
+            raise ValueError("Количество весов не совпадает с количеством точек")
+
+        graph = self._graph
+        version = graph.version
+        nodes, _ = self.snap_points(points, graph)
+        snapped = nodes >= 0
+        sources, inverse = np.unique(nodes[snapped], return_inverse=True)
+        source_weights = np.bincount(inverse, weights=weights[snapped], minlength=len(sources))
+        nonzero = source_weights != 0
+        sources, source_weights = sources[nonzero], source_weights[nonzero]
+
+        sums = np.zeros(graph.node_count)
+        if len(sources):
+            parts = np.array_split(np.arange(len(sources)), max(1, min(self._executor.parallelism, len(sources))))
+            local_fn = functools.partial(self._reach_sums_from_graph, graph=graph)
+            results = await asyncio.gather(*(
+                self._executor.run(local_fn, version, sources[part], source_weights[part], minutes, travel.name,
+                                   job="_reach_sums_from_graph")
+                for part in parts
+            ))
+            sums = np.sum(results, axis=0)
+
+        return {"sums": sums, "snapped": snapped, "graph_version": version}
+
+    def snap_points_cached(
+        self,
+        key: Hashable,
+        points: Union[List[Tuple[float, float]], np.ndarray],
+        graph: Optional[RoadGraph] = None,
+    ) -> np.ndarray:
+        """
+        Узлы графа для набора точек, который не меняется между запросами
+        (например, критерии одной версии): привязка делается один раз на
+        key и версию графа и хранится в кэше изохрон.
+        """
+        graph = graph if graph is not None else self._graph
+        cache_key = ("snap", key, graph.version)
+        nodes = self._cache.get(cache_key)
+        if nodes is None:
+            nodes, _ = self.snap_points(points, graph)
+            if graph.version == self._graph_version:
+                self._cache.put(cache_key, nodes, nodes.nbytes)
+        return nodes
+
+    async def travel_time_matrix(
+        self,
+        origins: List[Tuple[float, float]],
+        destinations: Union[List[Tuple[float, float]], np.ndarray],
+        max_minutes: Optional[float] = None,
+        profile: str = DEFAULT_PROFILE,
+        destinations_key: Optional[Hashable] = None,
+    ) -> Dict[str, Any]:
+        """
+        Матрица времени в пути (минуты) от каждой из origins до каждой из destinations.
+
+        Точки привязываются к графу пачкой, одинаковые стартовые узлы
+        считаются один раз. Поиски ограничены max_minutes (по умолчанию —
+        лимит профиля) и делятся между процессами исполнителя.
+        destinations — список (lon, lat) или массив (n, 2).
+        destinations_key — постоянный ключ набора destinations: тогда их
+        привязка берётся из кэша (см. snap_points_cached).
+
+        Returns:
+            durations — float32 (origins x destinations), nan — нет пути за
+            max_minutes или точка не привязана; origins_snapped и
+            destinations_snapped — маски привязанных точек; graph_version
+        """
+        if not self._initialized:
+            raise RuntimeError("IsochroneService не инициализирован. Запустите initialize() при старте приложения.")
+
+        travel = get_profile(profile)
+        limit = travel.max_minutes if max_minutes is None else max_minutes
+        if limit <= 0 or limit > travel.max_minutes:
+            raise ValueError(f"Время должно быть >0 и <= {travel.max_minutes} минут")
+        if len(origins) * len(destinations) > MATRIX_MAX_CELLS:
+            raise ValueError(f"Матрица больше {MATRIX_MAX_CELLS} ячеек")
+
+        graph = self._graph
+        version = graph.version
+        origin_nodes, _ = self.snap_points(origins, graph)
+        if destinations_key is None:
+            destination_nodes, _ = self.snap_points(destinations, graph)
+        else:
+            destination_nodes = self.snap_points_cached(destinations_key, destinations, graph)
+        origins_snapped = origin_nodes >= 0
+        destinations_snapped = destination_nodes >= 0
+
+        sources, source_rows = np.unique(origin_nodes[origins_snapped], return_inverse=True)
+        targets, target_cols = np.unique(destination_nodes[destinations_snapped], return_inverse=True)
+        durations = np.full((len(origins), len(destinations)), np.nan, dtype=np.float32)
+        if len(sources) and len(targets):
+            # По порции источников на процесс (без пула — на поток); порции считаются параллельно
+            parts = np.array_split(sources, max(1, min(self._executor.parallelism, len(sources))))
+            local_fn = functools.partial(self._travel_times_from_graph, graph=graph)
+            results = await asyncio.gather(*(
+                self._executor.run(local_fn, version, part, targets, limit, travel.name,
+                                   job="_travel_times_from_graph")
+                for part in parts
+            ))
+            times = np.concatenate(results)
+            times[np.isinf(times)] = np.nan
+            durations[np.ix_(np.flatnonzero(origins_snapped), np.flatnonzero(destinations_snapped))] = \
+                times[np.ix_(source_rows, target_cols)]
+
+        return {
+            "durations": durations,
+            "origins_snapped": origins_snapped,
+            "destinations_snapped": destinations_snapped,
+            "graph_version": version,
+        }
+
 isochrone_service = IsochroneService()
\ No newline at end of file
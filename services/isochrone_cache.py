@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import shapely
+
+# Примерная стоимость одной координаты GeoJSON в памяти:
+# tuple из двух float (56 + 2 * 24 байта)
+_COORD_NBYTES = 104
+_ENTRY_OVERHEAD = 512
+
+
+def geojson_nbytes(geom: Dict[str, Any]) -> int:
+    """Оценка объёма памяти GeoJSON-геометрии по количеству координат."""
+    def count(coords) -> int:
+        if not coords:
+            return 0
+        if isinstance(coords[0], (int, float)):
+            return 1
+        return sum(count(c) for c in coords)
+
+    if geom.get("type") == "GeometryCollection":
+        return sum(geojson_nbytes(g) for g in geom.get("geometries", []))
+    return count(geom.get("coordinates", ())) * _COORD_NBYTES
+
+
+def geometry_nbytes(geom) -> int:
+    """Оценка объёма памяти shapely-геометрии: координаты хранятся в GEOS как double."""
+    return int(shapely.get_num_coordinates(geom)) * 16
+
+
+class IsochroneCache:
+    """
+    LRU-кэш посчитанных изохрон с ограничением по объёму памяти.
+
+    Размер записи передаётся при добавлении; при превышении max_bytes
+    вытесняются самые давно использованные записи.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int):
+        nbytes += _ENTRY_OVERHEAD
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, size) = self._entries.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,136 @@
+"""
+Способы построения полигона изохроны по достигнутой части графа.
+
+Все функции работают в метрических координатах и получают:
+    segments   — массив (E, 2, 2) отрезков рёбер, отсортированный по edge_time
+    edge_time  — время достижения ребра (минуты), по возрастанию
+    points     — массив (N, 2) координат достигнутых узлов
+    point_time — время достижения узлов
+    bands      — пороги в минутах по возрастанию
+и возвращают список (минуты, геометрия) в тех же метрических координатах.
+
+Точность и скорость:
+
+- buffer — буфер BUFFER_METERS вокруг каждого ребра и unary_union.
+  Точная форма по улицам, но самый дорогой вариант: время растёт
+  с числом рёбер, в результате десятки тысяч вершин. Подходит для
+  выгрузки и отчётов. Используется по умолчанию.
+- hull — вогнутая оболочка достигнутых узлов (shapely.concave_hull)
+  плюс буфер. Самый быстрый вариант, но заливает «дыры» между улицами
+  (кварталы, парки без дорожек) и сглаживает узкие вылеты вдоль дорог.
+  Подходит для интерактивной карты.
+- raster — рёбра растеризуются в сетку RASTER_CELL_METERS, сетка
+  расширяется на ширину буфера и собирается обратно в полигон.
+  Ошибка границы не больше размера ячейки, время зависит в основном
+  от площади изохроны, а не от числа рёбер. Компромисс между двумя другими.
+  Сетка не больше RASTER_MAX_CELLS ячеек: для больших изохрон (машина,
+  60 минут) ячейка укрупняется, и граница становится грубее.
+"""
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+import shapely
+from shapely.ops import unary_union
+from scipy import ndimage
+
+HULL_RATIO = float(os.getenv("ISO_HULL_RATIO", "0.3"))  # 0 — самая вогнутая, 1 — выпуклая
+RASTER_CELL_METERS = float(os.getenv("ISO_RASTER_CELL_METERS", "10"))
+RASTER_MAX_CELLS = int(os.getenv("ISO_RASTER_MAX_CELLS", str(4_000_000)))  # ~16 МБ на сетку времени
+
+
+def build_buffer_bands(segments, edge_time, points, point_time, bands, buffer_m) -> List[Tuple[int, object]]:
+    """Точный буфер вокруг рёбер. Полосы вложены: каждая = предыдущая + новые рёбра."""
+    buffered = shapely.buffer(shapely.linestrings(segments), buffer_m)
+
+    results = []
+    prev, start = None, 0
+    for minutes, end in zip(bands, np.searchsorted(edge_time, bands, side="right")):
+        if end == 0:
+            continue
+        parts = list(buffered[start:end])
+        prev = unary_union(parts if prev is None else [prev] + parts)
+        results.append((minutes, prev))
+        start = end
+    return results
+
+
+def build_hull_bands(segments, edge_time, points, point_time, bands, buffer_m) -> List[Tuple[int, object]]:
+    """Вогнутая оболочка достигнутых узлов, расширенная на buffer_m."""
+    results = []
+    for minutes in bands:
+        band_points = points[point_time <= minutes]
+        if not len(band_points):
+            continue
+        hull = shapely.concave_hull(shapely.multipoints(band_points), ratio=HULL_RATIO)
+        results.append((minutes, hull.buffer(buffer_m)))
+    return results
+
+
+def build_raster_bands(segments, edge_time, points, point_time, bands, buffer_m) -> List[Tuple[int, object]]:
+    """Растеризация рёбер в метрическую сетку, дилатация на buffer_m и векторизация."""
+    cell, origin, shape, radius = raster_grid(segments.reshape(-1, 2), buffer_m)
+
+    # Точки вдоль каждого ребра с шагом в пол-ячейки
+    start, end = segments[:, 0], segments[:, 1]
+    steps = np.ceil(np.linalg.norm(end - start, axis=1) / (cell / 2)).astype(int) + 1
+    seg = np.repeat(np.arange(len(segments)), steps)
+    frac = (np.arange(len(seg)) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(np.maximum(steps - 1, 1), steps)
+    samples = start[seg] + (end[seg] - start[seg]) * frac[:, None]
+    cols, rows = ((samples - origin) // cell).astype(int).T
+
+    # Минимальное время достижения для каждой ячейки
+    cell_time = np.full(shape, np.inf, dtype=np.float32)
+    np.minimum.at(cell_time, (rows, cols), edge_time[seg])
+
+    yy, xx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    disk = xx ** 2 + yy ** 2 <= radius ** 2
+
+    results = []
+    for minutes in bands:
+        mask = cell_time <= minutes
+        if not mask.any():
+            continue
+        mask = ndimage.binary_dilation(mask, structure=disk)
+        geom = _vectorize_mask(mask, origin, cell).simplify(cell / 2)
+        results.append((minutes, geom))
+    return results
+
+
+def raster_grid(coords: np.ndarray, buffer_m: float, max_cells: Optional[int] = None):
+    """
+    Сетка для растеризации точек coords с полями на buffer_m: размер ячейки,
+    начало, форма (строки, столбцы) и радиус дилатации в ячейках. Ячейка —
+    RASTER_CELL_METERS, а если сетка выходит больше max_cells ячеек —
+    крупнее, пока не уложится.
+    """
+    max_cells = RASTER_MAX_CELLS if max_cells is None else max_cells
+    low, high = coords.min(axis=0), coords.max(axis=0)
+    cell = RASTER_CELL_METERS
+    while True:
+        radius = int(np.ceil(buffer_m / cell))
+        origin = low - (radius + 1) * cell
+        shape = (np.ceil((high - origin) / cell).astype(int) + radius + 2)[::-1]
+        cells = int(shape[0]) * int(shape[1])
+        if cells <= max_cells:
+            return cell, origin, shape, radius
+        cell *= max(1.05, np.sqrt(cells / max_cells))
+
+
+def _vectorize_mask(mask: np.ndarray, origin: np.ndarray, cell: float):
+    """Собирает полигон из горизонтальных отрезков заполненных ячеек каждой строки."""
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    diff = np.diff(padded, axis=1)
+    run_rows, run_starts = np.nonzero(diff == 1)
+    _, run_ends = np.nonzero(diff == -1)
+    boxes = shapely.box(origin[0] + run_starts * cell, origin[1] + run_rows * cell,
+                        origin[0] + run_ends * cell, origin[1] + (run_rows + 1) * cell)
+    return unary_union(boxes)
+
+
+POLYGON_METHODS = {
+    "buffer": build_buffer_bands,
+    "hull": build_hull_bands,
+    "raster": build_raster_bands,
+}
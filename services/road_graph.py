@@ -0,0 +1,415 @@
+from typing import Dict, Mapping, Optional, Sequence
+
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from services.travel_profiles import DEFAULT_PROFILE, PROFILES, TravelProfile
+
+_WEIGHT_PREFIX = "time_"
+# До стольких стартовых узлов с начальным временем поиск идёт из каждого
+# по общей матрице графа; больше — из виртуального узла (копия матрицы)
+_SEPARATE_SOURCES_MAX = 8
+# Память под промежуточные строки расстояний при расчёте матрицы времени
+MATRIX_CHUNK_BYTES = 64 * 1024 * 1024
+
+
+class RoadGraph:
+    """
+    Компактный граф дорожной сети в формате CSR.
+
+    Узлы пронумерованы плотно (0..N-1), исходные node_id хранятся в
+    отсортированном массиве node_ids. Рёбра неориентированные и хранятся
+    в обе стороны: соседи узла i — indices[indptr[i]:indptr[i + 1]],
+    веса — в параллельных массивах length (метры) и times[профиль] (минуты).
+
+    Топология одна на все профили передвижения: у каждого профиля только
+    свой массив времени рёбер в том же CSR-порядке. Матрица для поиска
+    (float64, как требует scipy) собирается один раз на профиль при
+    первом поиске и дальше переиспользуется.
+    """
+
+    def __init__(
+        self,
+        node_ids: np.ndarray,
+        lon: np.ndarray,
+        lat: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        length: np.ndarray,
+        **weights: np.ndarray,
+    ):
+        """weights — массивы времени рёбер по профилям: time_walk=..., time_car=..."""
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.length = np.asarray(length, dtype=np.float32)
+        self.times: Dict[str, np.ndarray] = {}
+        for key, arr in weights.items():
+            if not key.startswith(_WEIGHT_PREFIX):
+                raise TypeError(f"Неизвестный массив графа: {key}")
+            self.times[key[len(_WEIGHT_PREFIX):]] = np.asarray(arr, dtype=np.float32)
+        self._matrices: Dict[str, csr_matrix] = {}
+
+    @property
+    def time(self) -> np.ndarray:
+        """Время рёбер профиля по умолчанию (пешком)."""
+        return self.times[DEFAULT_PROFILE]
+
+    @property
+    def profiles(self) -> list:
+        return list(self.times)
+
+    @classmethod
+    def from_edges(
+        cls,
+        node_ids: Sequence[int],
+        lon: Sequence[float],
+        lat: Sequence[float],
+        edge_start_ids: Sequence[int],
+        edge_end_ids: Sequence[int],
+        edge_length: Sequence[float],
+        edge_max_speed: Optional[Sequence[float]] = None,
+        profiles: Mapping[str, TravelProfile] = PROFILES,
+    ) -> "RoadGraph":
+        """
+        Собирает граф из списков узлов и рёбер (в терминах исходных node_id).
+
+        Рёбра с неизвестными узлами и петли отбрасываются. Из параллельных
+        рёбер остаётся самое короткое — так же, как в nx.Graph остаётся
+        одно ребро на пару узлов.
+
+        edge_max_speed — ограничение скорости ребра в км/ч (nan — неизвестно).
+        Время рёбер считается один раз для каждого профиля из profiles.
+        """
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+
+        order = np.argsort(node_ids, kind="stable")
+        node_ids, lon, lat = node_ids[order], lon[order], lat[order]
+        # Дубликаты node_id: оставляем первое вхождение
+        if len(node_ids) > 1:
+            keep = np.concatenate(([True], node_ids[1:] != node_ids[:-1]))
+            node_ids, lon, lat = node_ids[keep], lon[keep], lat[keep]
+
+        n = len(node_ids)
+        graph = cls(node_ids, lon, lat,
+                    np.zeros(n + 1, dtype=np.int32),
+                    np.empty(0, dtype=np.int32),
+                    np.empty(0, dtype=np.float32))
+
+        u = graph.index_of(edge_start_ids)
+        v = graph.index_of(edge_end_ids)
+        length = np.asarray(edge_length, dtype=np.float64)
+        if edge_max_speed is None:
+            max_speed = np.full(len(length), np.nan)
+        else:
+            max_speed = np.asarray(edge_max_speed, dtype=np.float64)
+        valid = (u >= 0) & (v >= 0) & (u != v) & np.isfinite(length)
+        u, v, length, max_speed = u[valid], v[valid], length[valid], max_speed[valid]
+
+        # Нормализуем пары (min, max) и оставляем самое короткое ребро
+        a = np.minimum(u, v)
+        b = np.maximum(u, v)
+        order = np.lexsort((length, b, a))
+        a, b, length, max_speed = a[order], b[order], length[order], max_speed[order]
+        if len(a) > 1:
+            first = np.concatenate(([True], (a[1:] != a[:-1]) | (b[1:] != b[:-1])))
+            a, b, length, max_speed = a[first], b[first], length[first], max_speed[first]
+
+        # Симметричное CSR-представление
+        rows = np.concatenate((a, b))
+        cols = np.concatenate((b, a))
+        order = np.lexsort((cols, rows))
+        rows, cols = rows[order], cols[order]
+        lengths = np.concatenate((length, length))[order]
+        max_speeds = np.concatenate((max_speed, max_speed))[order]
+
+        graph.indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(rows, minlength=n), out=graph.indptr[1:])
+        graph.indices = cols.astype(np.int32)
+        graph.length = lengths.astype(np.float32)
+        graph.times = {name: profile.edge_minutes(lengths, max_speeds) for name, profile in profiles.items()}
+        return graph
+
+    def core_arrays(self) -> dict:
+        """Массивы, из которых граф восстанавливается через cls(**arrays)."""
+        return {
+            "node_ids": self.node_ids,
+            "lon": self.lon,
+            "lat": self.lat,
+            "indptr": self.indptr,
+            "indices": self.indices,
+            "length": self.length,
+            **{_WEIGHT_PREFIX + name: arr for name, arr in self.times.items()},
+        }
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self) -> int:
+        """Количество неориентированных рёбер."""
+        return len(self.indices) // 2
+
+    @property
+    def nbytes(self) -> int:
+        """Объём памяти, занимаемый массивами графа."""
+        return sum(a.nbytes for a in self.core_arrays().values())
+
+    @property
+    def matrix_nbytes(self) -> int:
+        """Память под собранные матрицы поиска (веса float64; индексы общие с графом)."""
+        return sum(m.data.nbytes for m in self._matrices.values())
+
+    def index_of(self, ids: Sequence[int]) -> np.ndarray:
+        """Переводит node_id в плотные индексы; для неизвестных id возвращает -1."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.node_count == 0:
+            return np.full(ids.shape, -1, dtype=np.int64)
+        pos = np.searchsorted(self.node_ids, ids)
+        pos = np.minimum(pos, self.node_count - 1)
+        return np.where(self.node_ids[pos] == ids, pos, -1)
+
+    def edge_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Все неориентированные рёбра графа: индексы концов (u < v)
+        и позиции рёбер в CSR-массивах весов.
+        """
+        rows = np.repeat(np.arange(self.node_count, dtype=np.int32), np.diff(self.indptr))
+        pos = np.flatnonzero(rows < self.indices)
+        return rows[pos], self.indices[pos], pos
+
+    def incident_edges(self, nodes: np.ndarray, settled: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Рёбра, инцидентные узлам nodes, без обхода всего графа.
+
+        Берутся только CSR-строки переданных узлов, поэтому стоимость
+        пропорциональна размеру изохроны, а не всей сети. settled — булева
+        маска узлов (обычно сами nodes): ребро между двумя такими узлами
+        встречается в обеих строках и возвращается один раз.
+
+        Returns:
+            (u, v, pos): концы рёбер (u из nodes) и позиции в CSR-массивах весов
+        """
+        nodes = np.asarray(nodes, dtype=np.int32)
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.empty(0, dtype=np.int32)
+            return empty, empty, np.empty(0, dtype=np.int64)
+
+        # Позиции всех соседей: конкатенация диапазонов [start, start + count)
+        shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        pos = np.arange(total, dtype=np.int64) + shift
+        u = np.repeat(nodes, counts)
+        v = self.indices[pos]
+
+        keep = ~settled[v] | (u < v)
+        return u[keep], v[keep], pos[keep]
+
+    def weights(self, profile: str = DEFAULT_PROFILE) -> np.ndarray:
+        """Время рёбер профиля в CSR-порядке."""
+        try:
+            return self.times[profile]
+        except KeyError:
+            raise ValueError(f"Граф собран без профиля передвижения: {profile}")
+
+    def shortest_times(
+        self,
+        sources: Sequence[int],
+        limit: float = np.inf,
+        profile: str = DEFAULT_PROFILE,
+        initial: Optional[Sequence[float]] = None,
+    ) -> np.ndarray:
+        """
+        Кратчайшее время (в минутах) от ближайшего из sources до каждого узла.
+
+        Поиск останавливается на limit минутах: узлы дальше limit не
+        раскрываются и остаются inf, как и недостижимые. Поэтому и для
+        больших бюджетов (автомобиль, 60 минут) обходится только изохрона.
+
+        initial — начальное время в каждом из sources (например, доля ребра
+        от точки до узла). Из нескольких таких стартов поиск идёт отдельно
+        из каждого; из многих — из виртуального узла N, из которого в
+        sources ведут рёбра с весами initial.
+        """
+        matrix = self._matrix(profile)
+        n = self.node_count
+        if initial is None:
+            return dijkstra(matrix, directed=True, indices=np.asarray(sources, dtype=np.int32),
+                            limit=limit, min_only=True)
+
+        sources, initial = merge_sources(sources, initial)
+        if len(sources) <= _SEPARATE_SOURCES_MAX:
+            # Несколько стартов: отдельный поиск из каждого по общей матрице
+            # с бюджетом за вычетом начального времени
+            times = np.full(n, np.inf)
+            for source, cost in zip(sources.tolist(), initial.tolist()):
+                if cost <= limit:
+                    dist = dijkstra(matrix, directed=True, indices=source, limit=limit - cost, min_only=True)
+                    dist += cost
+                    np.minimum(times, dist, out=times)
+            return times
+
+        # CSR с дополнительной строкой виртуального узла; сами массивы графа не меняются
+        matrix = csr_matrix(
+            (np.concatenate((matrix.data, initial)),
+             np.concatenate((self.indices, sources.astype(np.int32))),
+             np.append(self.indptr, self.indptr[-1] + len(sources))),
+            shape=(n + 1, n + 1),
+        )
+        times = dijkstra(matrix, directed=True, indices=n, limit=limit)
+        return times[:n]
+
+    def travel_times(
+        self,
+        sources: Sequence[int],
+        targets: Sequence[int],
+        limit: float = np.inf,
+        profile: str = DEFAULT_PROFILE,
+        chunk_bytes: int = MATRIX_CHUNK_BYTES,
+    ) -> np.ndarray:
+        """
+        Матрица времени (минуты) от каждого из sources до каждого из targets.
+
+        Отдельный ограниченный поиск из каждого источника; источники идут
+        порциями, чтобы промежуточная матрица (порция x все узлы) занимала
+        не больше chunk_bytes. Недостижимые и дальше limit — inf.
+        """
+        sources = np.asarray(sources, dtype=np.int32)
+        targets = np.asarray(targets, dtype=np.int64)
+        out = np.empty((len(sources), len(targets)), dtype=np.float32)
+        rows = max(1, chunk_bytes // (8 * max(self.node_count, 1)))
+        matrix = self._matrix(profile)
+        for start in range(0, len(sources), rows):
+            dist = dijkstra(matrix, directed=True, indices=sources[start:start + rows], limit=limit)
+            out[start:start + rows] = dist[:, targets]
+        return out
+
+    def reach_sums(
+        self,
+        sources: Sequence[int],
+        weights: Sequence[float],
+        limit: float,
+        profile: str = DEFAULT_PROFILE,
+        chunk_bytes: int = MATRIX_CHUNK_BYTES,
+    ) -> np.ndarray:
+        """
+        Для каждого узла — сумма weights тех sources, из которых узел
+        достижим за limit. Источники идут порциями, как в travel_times.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        out = np.zeros(self.node_count)
+        everything = np.arange(self.node_count)
+        rows = max(1, chunk_bytes // (8 * max(self.node_count, 1)))
+        for start in range(0, len(sources), rows):
+            times = self.travel_times(sources[start:start + rows], everything, limit, profile, chunk_bytes)
+            out += weights[start:start + rows] @ (times <= limit)
+        return out
+
+    def _matrix(self, profile: str) -> csr_matrix:
+        """
+        Матрица графа для scipy: веса профиля в float64, индексы — массивы
+        графа без копии. Собирается один раз на профиль: иначе scipy
+        копировал бы все рёбра на каждый поиск.
+        """
+        matrix = self._matrices.get(profile)
+        if matrix is None:
+            n = self.node_count
+            matrix = csr_matrix(
+                (self.weights(profile).astype(np.float64), self.indices, self.indptr), shape=(n, n), copy=False,
+            )
+            self._matrices[profile] = matrix
+        return matrix
+
+
+def merge_sources(sources: Sequence[int], initial: Sequence[float]) -> tuple[np.ndarray, np.ndarray]:
+    """Уникальные стартовые узлы с наименьшим начальным временем каждого."""
+    sources = np.asarray(sources, dtype=np.int64)
+    initial = np.asarray(initial, dtype=np.float64)
+    nodes, inverse = np.unique(sources, return_inverse=True)
+    costs = np.full(len(nodes), np.inf)
+    np.minimum.at(costs, inverse, initial)
+    return nodes, costs
+
+
+class NetworkxRoadGraph(RoadGraph):
+    """
+    Тот же граф, но поиск кратчайших путей выполняется через networkx.
+    Оставлен как эталонный бэкенд для сравнения результатов и отладки.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._nx: Optional[nx.Graph] = None
+
+    def to_networkx(self) -> nx.Graph:
+        if self._nx is None:
+            G = nx.Graph()
+            G.add_nodes_from(range(self.node_count))
+            u, v, pos = self.edge_arrays()
+            G.add_edges_from(zip(u.tolist(), v.tolist()))
+            # Время каждого профиля — отдельный атрибут ребра
+            for name, arr in self.times.items():
+                nx.set_edge_attributes(G, dict(zip(zip(u.tolist(), v.tolist()), arr[pos].tolist())),
+                                       _WEIGHT_PREFIX + name)
+            self._nx = G
+        return self._nx
+
+    def shortest_times(
+        self,
+        sources: Sequence[int],
+        limit: float = np.inf,
+        profile: str = DEFAULT_PROFILE,
+        initial: Optional[Sequence[float]] = None,
+    ) -> np.ndarray:
+        self.weights(profile)
+        if initial is None:
+            return self._dijkstra([int(s) for s in sources], limit, profile)
+        # Эталонная реализация: отдельный поиск из каждого узла со сдвигом
+        dist = np.full(self.node_count, np.inf)
+        for source, cost in zip(*merge_sources(sources, initial)):
+            if cost <= limit:
+                np.minimum(dist, cost + self._dijkstra([int(source)], limit - cost, profile), out=dist)
+        return dist
+
+    def travel_times(
+        self,
+        sources: Sequence[int],
+        targets: Sequence[int],
+        limit: float = np.inf,
+        profile: str = DEFAULT_PROFILE,
+        chunk_bytes: int = MATRIX_CHUNK_BYTES,
+    ) -> np.ndarray:
+        self.weights(profile)
+        targets = np.asarray(targets, dtype=np.int64)
+        out = np.empty((len(sources), len(targets)), dtype=np.float32)
+        for row, source in enumerate(sources):
+            out[row] = self._dijkstra([int(source)], limit, profile)[targets]
+        return out
+
+    def _dijkstra(self, sources: list, limit: float, profile: str) -> np.ndarray:
+        lengths = nx.multi_source_dijkstra_path_length(
+            self.to_networkx(),
+            sources=sources,
+            cutoff=None if np.isinf(limit) else limit,
+            weight=_WEIGHT_PREFIX + profile,
+        )
+        dist = np.full(self.node_count, np.inf)
+        if lengths:
+            dist[np.fromiter(lengths.keys(), dtype=np.int64)] = np.fromiter(lengths.values(), dtype=np.float64)
+        return dist
+
+
+GRAPH_BACKENDS = {
+    "csr": RoadGraph,
+    "networkx": NetworkxRoadGraph,
+}
@@ -0,0 +1,208 @@
+"""
+Кэш результата /api/isochrones/score.
+
+Результат конвейера (буферы критериев, центры пересечений, оценки
+центров) зависит только от таблицы criteries, дорожного графа и
+параметров оценки, поэтому хранится под ключом
+(версия критериев, версии графов, параметры). Критерии и их версия
+берутся из services/criteria_store.py.
+
+Фоновая задача раз в SCORE_CACHE_REFRESH_SECONDS сверяет критерии
+с таблицей; если они изменились, результаты для уже запрошенных
+параметров пересчитываются заранее, и до конца пересчёта запросы
+получают прежний результат. Запросы и сами сверяют критерии, но не чаще
+раза в SCORE_CACHE_PROBE_SECONDS, — так кэш не устаревает и без фоновой
+задачи (SCORE_CACHE_REFRESH_SECONDS=0).
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from buffer_intersection_service import find_buffer_intersection_centers
+from geometry_isochrone import calculate_attractions_by_category
+from services.attraction_scoring import DECAY_FUNCTIONS, SCORE_MODES, AttractionScorer
+from services.buffer_service import build_buffers_for_points
+from services.criteria_store import CriteriaColumns, criteria_store
+from services.graph_registry import graph_registry
+
+SCORE_CACHE_REFRESH_SECONDS = int(os.getenv("SCORE_CACHE_REFRESH_SECONDS", "60"))  # 0 — без фоновой проверки
+SCORE_CACHE_PROBE_SECONDS = float(os.getenv("SCORE_CACHE_PROBE_SECONDS", "10"))
+SCORE_CACHE_MAX_ENTRIES = int(os.getenv("SCORE_CACHE_MAX_ENTRIES", "32"))
+MIN_INTERSECTION = 2
+MAX_POINTS = 30
+SCORE_THRESHOLD = 5  # в ответ попадают центры с оценкой выше порога
+
+# (id, lon, lat, оценка); id — номер центра среди всех найденных
+ScoredPoint = Tuple[int, float, float, Any]
+
+
+async def run_score_pipeline(columns: CriteriaColumns, mode: str, decay: str) -> List[ScoredPoint]:
+    """Полный расчёт: буферы, центры пересечений буферов и их оценки."""
+    attractive = ~columns.antiattractive
+    # Геометрия буферов и пересечений — чистый CPU, вне event loop
+    buffers = await asyncio.to_thread(build_buffers_for_points, columns.lon[attractive], columns.lat[attractive])
+    centers_data = await asyncio.to_thread(
+        find_buffer_intersection_centers, buffers, min_intersections=MIN_INTERSECTION, max_points=MAX_POINTS,
+    )
+    centers = [tuple(center["coordinates"]) for center in centers_data]
+    scorer = AttractionScorer.from_columns(columns)
+    result = await calculate_attractions_by_category(centers, scorer, mode=mode, decay=decay)
+    return [(i + 1, lon, lat, score) for i, (lon, lat, score) in enumerate(result) if score > SCORE_THRESHOLD]
+
+
+class ScorePipelineCache:
+    def __init__(
+        self,
+        store=criteria_store,
+        probe_seconds: float = SCORE_CACHE_PROBE_SECONDS,
+        max_entries: int = SCORE_CACHE_MAX_ENTRIES,
+    ):
+        self.store = store
+        self.probe_seconds = probe_seconds
+        self.max_entries = max_entries
+        self._probed_at: Optional[float] = None
+        self._rebuilding: Optional[asyncio.Task] = None
+        self.columns: Optional[CriteriaColumns] = None
+        self.version: Optional[int] = None
+        # LRU результатов; ключи устаревших версий удаляются при сохранении нового
+        self._results: "OrderedDict[tuple, List[ScoredPoint]]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self._params: set = set()  # параметры, которые уже запрашивали
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.last_refresh_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @staticmethod
+    def _key(version: int, params: Tuple[str, str]) -> tuple:
+        return (version, graph_registry.graph_versions(), params)
+
+    async def get(self, session: AsyncSession, mode: str, decay: str) -> List[ScoredPoint]:
+        """Результат конвейера для параметров: из кэша или с расчётом (один на ключ)."""
+        if mode not in SCORE_MODES:
+            raise ValueError(f"Неизвестный способ оценки: {mode}")
+        if decay not in DECAY_FUNCTIONS:
+            raise ValueError(f"Неизвестная функция затухания: {decay}")
+        params = (mode, decay)
+        self._params.add(params)
+
+        columns = await self._probe(session)
+        if self.columns is None:
+            self.columns, self.version = columns, columns.version
+        elif columns.version != self.version:
+            # Критерии изменились: пересчёт в фоне, пока — прежние результаты
+            self._start_rebuild(columns)
+
+        columns, version = self.columns, self.version
+        key = self._key(version, params)
+        result = self._results.get(key)
+        if result is not None:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run_score_pipeline(columns, mode, decay))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._store(key, t))
+        # Отмена одного запроса не отменяет общий расчёт
+        return await asyncio.shield(task)
+
+    async def _probe(self, session: AsyncSession) -> CriteriaColumns:
+        """Снимок критериев; таблица сверяется не чаще раза в probe_seconds."""
+        now = time.monotonic()
+        if self.store.columns is None or self._probed_at is None or now - self._probed_at >= self.probe_seconds:
+            self._probed_at = now
+            await self.store.refresh(session)
+        return self.store.columns
+
+    def _start_rebuild(self, columns: CriteriaColumns):
+        if self._rebuilding is not None and not self._rebuilding.done():
+            return
+        self._rebuilding = asyncio.ensure_future(self._rebuild(columns))
+        self._rebuilding.add_done_callback(self._rebuild_done)
+
+    def _rebuild_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.last_error = str(task.exception())
+            print(f"Ошибка при обновлении кэша оценок: {task.exception()}")
+
+    def _store(self, key: tuple, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        # Результаты для устаревших критериев или графов не сохраняются
+        if key[:2] == (self.version, graph_registry.graph_versions()):
+            self._put(key, task.result())
+
+    def _put(self, key: tuple, result: List[ScoredPoint]):
+        """Сохраняет результат; записи других версий критериев и графов вытесняются."""
+        versions = key[:2]
+        for stale in [k for k in self._results if k[:2] != versions]:
+            del self._results[stale]
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    async def refresh(self, session_factory, force: bool = False) -> bool:
+        """
+        Сверяет критерии с таблицей; если они или графы изменились, заранее
+        пересчитывает результаты для запрошенных параметров и подменяет
+        кэш целиком. True — кэш обновлён.
+        """
+        async with session_factory() as session:
+            await self.store.refresh(session)
+        self._probed_at = time.monotonic()
+        return await self._rebuild(self.store.columns, force)
+
+    async def _rebuild(self, columns: CriteriaColumns, force: bool = False) -> bool:
+        """Пересчитывает результаты запрошенных параметров для columns и подменяет кэш."""
+        version = columns.version
+        stale = [p for p in self._params if self._key(version, p) not in self._results]
+        if not force and version == self.version and not stale:
+            return False
+
+        params = list(self._params)
+        results = OrderedDict()
+        for p in params:
+            results[self._key(version, p)] = await run_score_pipeline(columns, *p)
+        self.columns, self.version = columns, version
+        self._results = results
+        self.refreshes += 1
+        return True
+
+    async def run_periodic_refresh(self, session_factory, interval: int = SCORE_CACHE_REFRESH_SECONDS):
+        """Фоновая задача: проверяет изменения критериев и графа раз в interval секунд."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(session_factory)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Ошибка при обновлении кэша оценок: {e}")
+            finally:
+                self.last_refresh_at = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "criteria_version": self.version,
+            "criteria": len(self.columns) if self.columns is not None else 0,
+            "entries": len(self._results),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "last_refresh_at": self.last_refresh_at,
+            "last_error": self.last_error,
+        }
+
+
+score_pipeline = ScorePipelineCache()
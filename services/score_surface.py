@@ -0,0 +1,302 @@
+"""
+Поверхность оценок привлекательности по всем узлам дорожного графа.
+
+Оценка узла — сумма весов категорий тех критериев, до которых от узла
+можно дойти за SCORE_MINUTES (тот же бюджет, что у изохрон в
+/api/isochrones/score). Считается одним ограниченным поиском из узла
+каждого критерия, сохраняется в SCORE_SURFACE_PATH (.npz) и
+пересчитывается, только если изменились критерии, граф или параметры.
+После этого top-k, оценка в точке и тепловая карта — поиск по массиву.
+
+Сборка вне приложения:
+    python -m services.score_surface build [путь]
+Проверка:
+    python -m services.score_surface info [путь]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from services.attraction_scoring import ATTRACTION_WEIGHTS, SCORE_MINUTES
+from services.criteria_store import criteria_store
+from services.travel_profiles import DEFAULT_PROFILE
+
+SCORE_SURFACE_PATH = os.getenv("SCORE_SURFACE_PATH", "score_surface.npz")
+SCORE_SURFACE_REFRESH_SECONDS = int(os.getenv("SCORE_SURFACE_REFRESH_SECONDS", "0"))  # 0 — только при старте
+SCORE_SURFACE_FORMAT_VERSION = 2
+
+
+def _crc32(*arrays: np.ndarray) -> int:
+    crc = 0
+    for arr in arrays:
+        crc = zlib.crc32(memoryview(np.ascontiguousarray(arr)).cast("B"), crc)
+    return crc
+
+
+def graph_fingerprint(graph, profile: str = DEFAULT_PROFILE) -> int:
+    """
+    Контрольная сумма узлов с координатами, смежности и времени рёбер
+    профиля: критерии привязываются к ближайшему узлу, поэтому сдвиг узлов
+    без изменения рёбер тоже меняет поверхность.
+    """
+    return _crc32(graph.node_ids, graph.lon, graph.lat, graph.indptr, graph.indices, graph.weights(profile))
+
+
+class ScoreSurface:
+    """Оценки узлов графа (float32, в порядке узлов графа) и описание сборки."""
+
+    def __init__(self, scores: np.ndarray, meta: Dict[str, Any]):
+        self.scores = scores
+        self.meta = meta
+
+    def save(self, path: str):
+        """Запись через временный файл: читатели не видят наполовину записанный файл."""
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, scores=self.scores, meta=np.array(json.dumps(self.meta)))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ScoreSurface"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                scores = data["scores"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Поверхность оценок не прочитана из {path}: {e}")
+            return None
+        if meta.get("params", {}).get("format_version") != SCORE_SURFACE_FORMAT_VERSION:
+            return None
+        return cls(scores, meta)
+
+
+def surface_params(
+    lon: np.ndarray,
+    lat: np.ndarray,
+    categories: Sequence[str],
+    graph,
+    minutes: float,
+    profile: str,
+    weights: Dict[str, int],
+) -> Dict[str, Any]:
+    """Всё, от чего зависит поверхность; при совпадении пересчёт не нужен."""
+    codes = np.array([list(weights).index(c) if c in weights else -1 for c in categories], dtype=np.int32)
+    return {
+        "format_version": SCORE_SURFACE_FORMAT_VERSION,
+        "criteria": {"count": len(codes), "crc32": _crc32(lon, lat, codes)},
+        "graph": {"nodes": graph.node_count, "crc32": graph_fingerprint(graph, profile)},
+        "minutes": minutes,
+        "profile": profile,
+        "weights": weights,
+    }
+
+
+class ScoreSurfaceStore:
+    """Текущая поверхность оценок для графа сервиса изохрон и её пересчёт."""
+
+    def __init__(self, path: Optional[str] = SCORE_SURFACE_PATH):
+        self.path = path
+        self.surface: Optional[ScoreSurface] = None
+        self.graph_version: Optional[int] = None
+        self._lock = asyncio.Lock()
+        self.info: Dict[str, Any] = {"refreshing": False, "last_refresh_at": None, "last_error": None}
+
+    async def refresh(self, service, session_factory, force: bool = False, **params) -> bool:
+        """Сверяет критерии с таблицей (services/criteria_store.py) и обновляет поверхность (см. update)."""
+        async with session_factory() as session:
+            await criteria_store.refresh(session)
+        columns = criteria_store.columns
+        return await self.update(service, columns.lon, columns.lat, columns.category_names, force=force, **params)
+
+    async def update(
+        self,
+        service,
+        lon: np.ndarray,
+        lat: np.ndarray,
+        categories: Sequence[str],
+        force: bool = False,
+        minutes: float = SCORE_MINUTES,
+        profile: str = DEFAULT_PROFILE,
+        weights: Dict[str, int] = ATTRACTION_WEIGHTS,
+    ) -> bool:
+        """
+        Пересчитывает поверхность, если изменились критерии, граф или
+        параметры; сначала пробует сохранённую. True — поверхность пересчитана.
+        """
+        async with self._lock:
+            self.info["refreshing"] = True
+            try:
+                graph = service.graph
+                version = service.graph_version
+                params = await asyncio.to_thread(
+                    surface_params, lon, lat, categories, graph, minutes, profile, weights,
+                )
+                if not force and self._current_params() == params:
+                    self.graph_version = version
+                    return False
+                if not force and self.path:
+                    stored = await asyncio.to_thread(ScoreSurface.load, self.path)
+                    if stored is not None and stored.meta.get("params") == params:
+                        self._set(stored, version)
+                        return False
+
+                started = time.perf_counter()
+                unknown = sorted({c for c in categories if c not in weights}, key=str)
+                if unknown:
+                    # В режиме изохрон такие критерии — ошибка запроса; поверхность
+                    # строится по всем узлам сразу, поэтому они идут с весом 0
+                    skipped = sum(c not in weights for c in categories)
+                    print(f"Поверхность оценок: {skipped} критериев с неизвестными категориями {unknown} не учитываются")
+                weight_of = np.array([weights.get(c, 0) for c in categories], dtype=np.float64)
+                result = await service.node_reach_sums(list(zip(lon.tolist(), lat.tolist())), weight_of, minutes, profile)
+                surface = ScoreSurface(result["sums"].astype(np.float32), {
+                    "params": params,
+                    "created_at": time.time(),
+                    "build_seconds": round(time.perf_counter() - started, 3),
+                    "criteria_snapped": int(result["snapped"].sum()),
+                    "unknown_categories": unknown,
+                })
+                if result["graph_version"] != service.graph_version:
+                    # Граф подменили во время расчёта — поверхность для него не годится
+                    return False
+                self._set(surface, result["graph_version"])
+                if self.path:
+                    try:
+                        await asyncio.to_thread(surface.save, self.path)
+                    except OSError as e:
+                        print(f"Не удалось записать поверхность оценок: {e}")
+                return True
+            except Exception as e:
+                self.info["last_error"] = str(e)
+                raise
+            finally:
+                self.info["refreshing"] = False
+                self.info["last_refresh_at"] = time.time()
+
+    async def run_periodic_refresh(self, service, session_factory, interval: int = SCORE_SURFACE_REFRESH_SECONDS):
+        """Фоновая задача: проверяет изменения критериев и графа раз в interval секунд."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(service, session_factory)
+            except Exception as e:
+                print(f"Ошибка при пересчёте поверхности оценок: {e}")
+
+    def _set(self, surface: ScoreSurface, graph_version: int):
+        self.surface = surface
+        self.graph_version = graph_version
+        self.info["last_error"] = None
+
+    def _current_params(self) -> Optional[Dict[str, Any]]:
+        return self.surface.meta.get("params") if self.surface is not None else None
+
+    def scores_for(self, service) -> np.ndarray:
+        """Оценки узлов текущего графа сервиса; RuntimeError, если поверхность не готова."""
+        return self._graph_scores(service)[1]
+
+    def _graph_scores(self, service) -> Tuple[Any, np.ndarray]:
+        """Текущий граф сервиса и оценки его узлов, взятые согласованно."""
+        graph, surface = service.graph, self.surface
+        if graph is None or surface is None or self.graph_version != graph.version:
+            raise RuntimeError("Поверхность оценок ещё не посчитана для текущего графа")
+        return graph, surface.scores
+
+    def nodes_for(self, service) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(lon, lat, оценки) узлов текущего графа сервиса — для тепловой карты."""
+        graph, scores = self._graph_scores(service)
+        return graph.lon, graph.lat, scores
+
+    def scores_at(self, service, points: List[Tuple[float, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Оценки в точках по ближайшему узлу графа.
+
+        Returns:
+            (оценки, nan — точка не привязана; расстояния до узла, м)
+        """
+        graph, scores = self._graph_scores(service)
+        nodes, dist = service.snap_points(points, graph)
+        found = nodes >= 0
+        out = np.full(len(nodes), np.nan, dtype=np.float32)
+        out[found] = scores[nodes[found]]
+        return out, dist
+
+    def top(
+        self,
+        service,
+        k: int,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """k узлов с наибольшей оценкой (внутри bbox): (lon, lat, оценки) по убыванию."""
+        graph, scores = self._graph_scores(service)
+        candidates = np.arange(len(scores))
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            inside = (graph.lon >= min_lon) & (graph.lon <= max_lon) & (graph.lat >= min_lat) & (graph.lat <= max_lat)
+            candidates = np.flatnonzero(inside)
+        k = min(k, len(candidates))
+        if k <= 0:
+            empty = np.empty(0)
+            return empty, empty, empty.astype(np.float32)
+        values = scores[candidates]
+        best = np.argpartition(-values, k - 1)[:k]
+        best = best[np.argsort(-values[best], kind="stable")]
+        nodes = candidates[best]
+        return graph.lon[nodes], graph.lat[nodes], scores[nodes]
+
+    def stats(self) -> Dict[str, Any]:
+        meta = self.surface.meta if self.surface is not None else {}
+        return {
+            "ready": self.surface is not None,
+            "graph_version": self.graph_version,
+            "nodes": len(self.surface.scores) if self.surface is not None else 0,
+            **{k: meta.get(k) for k in ("created_at", "build_seconds", "criteria_snapped", "unknown_categories")},
+            "params": {k: v for k, v in meta.get("params", {}).items() if k != "weights"} or None,
+            **self.info,
+        }
+
+
+score_surface = ScoreSurfaceStore()
+
+
+async def _build(path: str):
+    from config import AsyncSessionLocal
+    from services.iso_service import IsochroneService
+
+    service = IsochroneService()
+    async with AsyncSessionLocal() as session:
+        await service.initialize(session)
+    store = ScoreSurfaceStore(path)
+    try:
+        rebuilt = await store.refresh(service, AsyncSessionLocal)
+    finally:
+        service.shutdown()
+    state = "пересчитана" if rebuilt else "актуальна"
+    print(f"Поверхность оценок в {path} {state}: {json.dumps(store.stats(), ensure_ascii=False, default=str)}")
+
+
+def _info(path: str):
+    surface = ScoreSurface.load(path)
+    if surface is None:
+        print(f"Нет поверхности оценок в {path}")
+        sys.exit(1)
+    scores = surface.scores
+    print(json.dumps(surface.meta, indent=2, ensure_ascii=False))
+    print(f"Узлов: {len(scores)}, оценки от {np.nanmin(scores):g} до {np.nanmax(scores):g}")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    target = sys.argv[2] if len(sys.argv) > 2 else SCORE_SURFACE_PATH
+    if command == "build":
+        asyncio.run(_build(target))
+    elif command == "info":
+        _info(target)
+    else:
+        print(__doc__)
+        sys.exit(1)
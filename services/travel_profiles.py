@@ -0,0 +1,98 @@
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+
+WALKING_SPEED_M_PER_MIN = 80.0  # 80 метров/мин
+
+# Значения maxspeed по умолчанию из OSM (км/ч)
+_IMPLICIT_MAX_SPEED = {
+    "urban": 60.0,
+    "rural": 90.0,
+    "motorway": 110.0,
+    "trunk": 90.0,
+    "living_street": 20.0,
+    "walk": 5.0,
+    "school": 20.0,
+}
+_MPH = 1.609344
+_NUMBER = re.compile(r"(\d+(?:\.\d+)?)\s*(mph|km/h|kmh|kph)?")
+
+
+def parse_max_speed(value: Optional[str]) -> float:
+    """
+    Разбирает RoadRib.max_speed в км/ч: "60", "30 mph", "RU:urban",
+    "60;40" (берётся меньшее). Неизвестное значение — nan.
+    """
+    if value is None:
+        return math.nan
+    speeds = []
+    for part in str(value).lower().split(";"):
+        part = part.strip()
+        match = _NUMBER.match(part)
+        if match:
+            speed = float(match.group(1))
+            speeds.append(speed * _MPH if match.group(2) == "mph" else speed)
+            continue
+        key = part.split(":")[-1]
+        if key in _IMPLICIT_MAX_SPEED:
+            speeds.append(_IMPLICIT_MAX_SPEED[key])
+    speeds = [s for s in speeds if s > 0]
+    return min(speeds) if speeds else math.nan
+
+
+def parse_max_speeds(values) -> np.ndarray:
+    """Векторный разбор: каждое уникальное значение разбирается один раз."""
+    values = np.asarray(values, dtype=object)
+    if not len(values):
+        return np.empty(0, dtype=np.float32)
+    keys = np.array(["" if v is None else str(v) for v in values], dtype=object)
+    uniques, inverse = np.unique(keys, return_inverse=True)
+    parsed = np.array([parse_max_speed(u) if u else math.nan for u in uniques], dtype=np.float32)
+    return parsed[inverse]
+
+
+@dataclass(frozen=True)
+class TravelProfile:
+    """
+    Профиль передвижения: скорость по умолчанию и учёт ограничения
+    скорости ребра. Время ребра = длина / скорость.
+    """
+    name: str
+    speed_kmh: float
+    max_minutes: int
+    # Как учитывать ограничение скорости ребра (если оно известно):
+    # ignore — не учитывать, cap — не быстрее ограничения,
+    # follow — ехать с разрешённой скоростью
+    max_speed_mode: str = "ignore"
+
+    def edge_minutes(self, length: np.ndarray, max_speed_kmh: Optional[np.ndarray] = None) -> np.ndarray:
+        length = np.asarray(length, dtype=np.float64)
+        speed = np.full(len(length), self.speed_kmh, dtype=np.float64)
+        if max_speed_kmh is not None and self.max_speed_mode != "ignore":
+            known = np.isfinite(max_speed_kmh)
+            if self.max_speed_mode == "follow":
+                speed[known] = max_speed_kmh[known]
+            else:
+                speed[known] = np.minimum(speed[known], max_speed_kmh[known])
+        return (length / (speed * 1000.0 / 60.0)).astype(np.float32)
+
+    def signature(self) -> list:
+        return [self.speed_kmh, self.max_speed_mode]
+
+
+PROFILES: Dict[str, TravelProfile] = {
+    "walk": TravelProfile("walk", WALKING_SPEED_M_PER_MIN * 60 / 1000, max_minutes=15),
+    "bike": TravelProfile("bike", 15.0, max_minutes=30, max_speed_mode="cap"),
+    "car": TravelProfile("car", 40.0, max_minutes=60, max_speed_mode="follow"),
+}
+DEFAULT_PROFILE = "walk"
+
+
+def get_profile(name: Optional[str]) -> TravelProfile:
+    profile = PROFILES.get(name or DEFAULT_PROFILE)
+    if profile is None:
+        raise ValueError(f"Неизвестный профиль передвижения: {name}")
+    return profile
@@ -0,0 +1,259 @@
+"""
+Mapbox Vector Tiles (MVT 2.1) без внешних зависимостей.
+
+Геометрии переводятся из lon/lat в координаты тайла (0..extent, ось y
+вниз), обрезаются по тайлу с небольшим запасом, упрощаются с допуском
+в долях пикселя тайла — на мелких масштабах это автоматически даёт
+более грубую геометрию — и кодируются в protobuf вручную.
+"""
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+from services.geo_encoding import encode_varints, zigzag
+from services.isochrone_cache import IsochroneCache
+
+TILE_EXTENT = 4096
+TILE_BUFFER = 64  # запас вокруг тайла, чтобы не было швов на границе
+TILE_SIMPLIFY_PX = float(os.getenv("TILE_SIMPLIFY_PX", "0.5"))  # допуск в экранных пикселях (тайл 256 px)
+MAX_ZOOM = 22
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+_POINT, _LINESTRING, _POLYGON = 1, 2, 3
+_MOVE_TO, _LINE_TO, _CLOSE_PATH = 1, 2, 7
+
+
+def check_tile(z: int, x: int, y: int):
+    if not 0 <= z <= MAX_ZOOM or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        raise ValueError(f"Некорректный тайл {z}/{x}/{y}")
+
+
+def tile_bounds(z: int, x: int, y: int, buffer: int = 0) -> Tuple[float, float, float, float]:
+    """Границы тайла в lon/lat (min_lon, min_lat, max_lon, max_lat) с запасом в единицах extent."""
+    n = 2 ** z
+    pad = buffer / TILE_EXTENT
+
+    def lon(tx):
+        return tx / n * 360.0 - 180.0
+
+    def lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return lon(x - pad), lat(y + 1 + pad), lon(x + 1 + pad), lat(y - pad)
+
+
+class TileTransform:
+    """Перевод lon/lat в координаты тайла z/x/y (Web Mercator, y вниз)."""
+
+    def __init__(self, z: int, x: int, y: int, extent: int = TILE_EXTENT):
+        self.z, self.x, self.y, self.extent = z, x, y, extent
+
+    def to_tile(self, lon, lat) -> Tuple[np.ndarray, np.ndarray]:
+        n = 2 ** self.z
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.clip(np.asarray(lat, dtype=np.float64), -85.0511, 85.0511)
+        tx = (lon + 180.0) / 360.0 * n
+        ty = (1.0 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2.0 * n
+        return (tx - self.x) * self.extent, (ty - self.y) * self.extent
+
+    def geometry(self, geom, buffer: int = TILE_BUFFER, simplify_px: float = TILE_SIMPLIFY_PX):
+        """Геометрия в координатах тайла: обрезанная, упрощённая и на целой сетке."""
+        # Меркатор сохраняет прямоугольники, поэтому обрезаем ещё в lon/lat
+        # и переводим в координаты тайла только то, что в него попало
+        geom = shapely.clip_by_rect(geom, *tile_bounds(self.z, self.x, self.y, buffer))
+        geom = shapely.transform(geom, lambda c: np.column_stack(self.to_tile(c[:, 0], c[:, 1])))
+        if simplify_px > 0 and geom.geom_type in ("Polygon", "MultiPolygon", "LineString", "MultiLineString"):
+            geom = shapely.simplify(geom, simplify_px * self.extent / 256, preserve_topology=True)
+        return shapely.set_precision(geom, 1.0)
+
+
+def _rings(geom) -> Iterable[np.ndarray]:
+    """Кольца полигонов в порядке MVT: внешнее с положительной площадью в координатах тайла."""
+    geom = shapely.orient_polygons(geom, exterior_cw=False)
+    polygons = geom.geoms if geom.geom_type == "MultiPolygon" else [geom]
+    for polygon in polygons:
+        for ring in (polygon.exterior, *polygon.interiors):
+            coords = np.asarray(ring.coords)[:-1, :2]
+            if len(coords) >= 3:
+                yield coords
+
+
+def encode_geometry_commands(geom) -> Tuple[int, List[int]]:
+    """
+    Команды геометрии MVT для геометрии в координатах тайла.
+
+    Returns:
+        (тип геометрии, команды) или (0, []) для пустой геометрии
+    """
+    if geom.is_empty:
+        return 0, []
+    commands: List[np.ndarray] = []
+    cursor = np.zeros(2, dtype=np.int64)
+
+    def path(coords: np.ndarray, close: bool):
+        nonlocal cursor
+        coords = np.round(coords).astype(np.int64)
+        deltas = np.diff(coords, axis=0, prepend=cursor[None, :])
+        cursor = coords[-1]
+        commands.append(np.array([_MOVE_TO | (1 << 3)], dtype=np.uint64))
+        commands.append(zigzag(deltas[0]))
+        if len(coords) > 1:
+            commands.append(np.array([_LINE_TO | ((len(coords) - 1) << 3)], dtype=np.uint64))
+            commands.append(zigzag(deltas[1:].ravel()))
+        if close:
+            commands.append(np.array([_CLOSE_PATH | (1 << 3)], dtype=np.uint64))
+
+    kind = geom.geom_type
+    if kind in ("Point", "MultiPoint"):
+        coords = np.round(shapely.get_coordinates(geom)).astype(np.int64)
+        deltas = np.diff(coords, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+        commands = [np.array([_MOVE_TO | (len(coords) << 3)], dtype=np.uint64), zigzag(deltas.ravel())]
+        geom_type = _POINT
+    elif kind in ("LineString", "MultiLineString"):
+        for line in (geom.geoms if kind == "MultiLineString" else [geom]):
+            path(np.asarray(line.coords)[:, :2], close=False)
+        geom_type = _LINESTRING
+    elif kind in ("Polygon", "MultiPolygon"):
+        for ring in _rings(geom):
+            path(ring, close=True)
+        geom_type = _POLYGON
+    elif kind == "GeometryCollection":
+        # Обрезка полигона может дать коллекцию — оставляем полигоны
+        polygons = [g for g in geom.geoms if g.geom_type in ("Polygon", "MultiPolygon")]
+        return encode_geometry_commands(shapely.union_all(polygons)) if polygons else (0, [])
+    else:
+        return 0, []
+    if not commands:
+        return 0, []
+    return geom_type, np.concatenate(commands).tolist()
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return encode_varints([(field << 3) | wire_type])
+
+
+def _bytes_field(field: int, payload: bytes) -> bytes:
+    return _key(field, 2) + encode_varints([len(payload)]) + payload
+
+
+def _varint_field(field: int, value: int) -> bytes:
+    return _key(field, 0) + encode_varints([value])
+
+
+def _packed_field(field: int, values: List[int]) -> bytes:
+    return _bytes_field(field, encode_varints(values))
+
+
+def _value(value: Any) -> bytes:
+    """Tile.Value: строка, целое, вещественное или логическое."""
+    if isinstance(value, bool):
+        return _varint_field(7, int(value))
+    if isinstance(value, (int, np.integer)):
+        value = int(value)
+        return _varint_field(4, value) if value >= 0 else _key(6, 0) + encode_varints(zigzag(np.array([value])))
+    if isinstance(value, (float, np.floating)):
+        return _key(3, 1) + np.float64(value).astype("<f8").tobytes()
+    return _bytes_field(1, str(value).encode())
+
+
+def encode_layer(name: str, features: Iterable[Tuple[Optional[int], Any, Dict[str, Any]]],
+                 extent: int = TILE_EXTENT) -> bytes:
+    """
+    Слой MVT. features — (id, геометрия в координатах тайла, свойства);
+    пустые геометрии пропускаются. Пустой слой не кодируется.
+    """
+    keys: Dict[str, int] = {}
+    values: Dict[Tuple[type, Any], int] = {}
+    encoded = []
+    for feature_id, geom, properties in features:
+        geom_type, commands = encode_geometry_commands(geom)
+        if not commands:
+            continue
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        body = b""
+        if feature_id is not None:
+            body += _varint_field(1, int(feature_id))
+        if tags:
+            body += _packed_field(2, tags)
+        body += _varint_field(3, geom_type) + _packed_field(4, commands)
+        encoded.append(_bytes_field(2, body))
+    if not encoded:
+        return b""
+
+    layer = _varint_field(15, 2) + _bytes_field(1, name.encode())
+    layer += b"".join(encoded)
+    layer += b"".join(_bytes_field(3, key.encode()) for key in keys)
+    layer += b"".join(_bytes_field(4, _value(value)) for _, value in values)
+    layer += _varint_field(5, extent)
+    return _bytes_field(3, layer)
+
+
+def encode_tile(layers: Dict[str, Iterable[Tuple[Optional[int], Any, Dict[str, Any]]]]) -> bytes:
+    """Тайл из нескольких слоёв: {имя: features}."""
+    return b"".join(encode_layer(name, features) for name, features in layers.items())
+
+
+def builds_tile(snapshot, z: int, x: int, y: int, category: Optional[str] = None) -> bytes:
+    """
+    Слой builds: здания из снимка индекса (BuildSnapshot из
+    services/build_index.py) в границах тайла. На один экранный пиксель
+    остаётся одно здание, поэтому тайлы мелких масштабов не растут с
+    числом зданий в городе.
+    """
+    found = snapshot.query(tile_bounds(z, x, y, TILE_BUFFER), category)
+    transform = TileTransform(z, x, y)
+    px, py = transform.to_tile(snapshot.lon[found], snapshot.lat[found])
+    cell = TILE_EXTENT / 256
+    _, first = np.unique(np.column_stack((px // cell, py // cell)).astype(np.int64), axis=0, return_index=True)
+    first = np.sort(first)
+    features = (
+        (int(snapshot.ids[found[k]]), shapely.Point(round(px[k]), round(py[k])),
+         {"name": snapshot.names[found[k]], "category": snapshot.categories[found[k]]})
+        for k in first
+    )
+    return encode_tile({"builds": features})
+
+
+def scores_tile(lon: np.ndarray, lat: np.ndarray, scores: np.ndarray, z: int, x: int, y: int) -> bytes:
+    """
+    Слой scores для тепловой карты: узлы графа с оценкой
+    (services/score_surface.py). На экранный пиксель — один узел
+    с наибольшей по модулю оценкой; узлы с нулевой оценкой пропускаются.
+    """
+    min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y, TILE_BUFFER)
+    found = np.flatnonzero((lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat) & (scores != 0))
+    px, py = TileTransform(z, x, y).to_tile(lon[found], lat[found])
+    cell = TILE_EXTENT / 256
+    # Сначала самые сильные оценки: np.unique оставляет первое вхождение в пикселе
+    order = np.argsort(-np.abs(scores[found]), kind="stable")
+    found, px, py = found[order], px[order], py[order]
+    _, first = np.unique(np.column_stack((px // cell, py // cell)).astype(np.int64), axis=0, return_index=True)
+    features = (
+        (None, shapely.Point(round(px[k]), round(py[k])), {"score": float(scores[found[k]])})
+        for k in np.sort(first)
+    )
+    return encode_tile({"scores": features})
+
+
+def isochrones_tile(isochrones: List[Dict[str, Any]], z: int, x: int, y: int) -> bytes:
+    """Слой isochrones: полосы изохрон (GeoJSON из кэша), обрезанные по тайлу."""
+    transform = TileTransform(z, x, y)
+    bounds = shapely.box(*tile_bounds(z, x, y, TILE_BUFFER))
+    features = []
+    for item in isochrones:
+        geom = shape(item["polygon"])
+        if geom.intersects(bounds):
+            features.append((None, transform.geometry(geom), {"minutes": item["minutes"]}))
+    return encode_tile({"isochrones": features})
+
+
+tile_cache = IsochroneCache(TILE_CACHE_MAX_BYTES)
@@ -0,0 +1,109 @@
+import math
+import threading
+import unittest
+
+from shapely.geometry import LineString, Point, Polygon, mapping
+
+from services.build_index import BuildIndex
+from services.vector_tiles import encode_geometry_commands, tile_bounds, TileTransform, builds_tile, check_tile, isochrones_tile
+
+
+def tile_of(lon, lat, z):
+    n = 2 ** z
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+
+class VectorTilesTest(unittest.TestCase):
+    def test_geometry_commands_match_spec_examples(self):
+        # примеры из спецификации MVT 2.1, раздел 4.3.5
+        self.assertEqual(encode_geometry_commands(Point(25, 17)), (1, [9, 50, 34]))
+        self.assertEqual(encode_geometry_commands(LineString([(2, 2), (2, 10), (10, 10)])),
+                         (2, [9, 4, 4, 18, 0, 16, 16, 0]))
+        self.assertEqual(encode_geometry_commands(Polygon([(3, 6), (8, 12), (20, 34), (3, 6)])),
+                         (3, [9, 6, 12, 18, 10, 12, 24, 44, 15]))
+
+    def test_polygon_exterior_is_reoriented(self):
+        clockwise = Polygon([(3, 6), (20, 34), (8, 12), (3, 6)])
+
+        self.assertEqual(encode_geometry_commands(clockwise)[1],
+                         [9, 6, 12, 18, 10, 12, 24, 44, 15])
+
+    def test_tile_transform(self):
+        z, x, y = 14, *tile_of(30.3, 59.95, 14)
+        min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y)
+        transform = TileTransform(z, x, y)
+
+        px, py = transform.to_tile([min_lon, max_lon], [max_lat, min_lat])
+
+        self.assertAlmostEqual(px[0], 0.0, places=6)
+        self.assertAlmostEqual(py[0], 0.0, places=6)
+        self.assertAlmostEqual(px[1], 4096.0, places=6)
+        self.assertAlmostEqual(py[1], 4096.0, places=6)
+        with self.assertRaises(ValueError):
+            check_tile(3, 8, 0)
+
+    def test_builds_tile(self):
+        index = BuildIndex()
+        index.set_rows([
+            (1, "a", "shop", "30,015", "60,01"),
+            (2, "b", "cafe", "30.0151", "60.0100"),
+            (3, None, "shop", "bad", "1"),
+        ])
+
+        self.assertEqual(len(index), 2)
+        z, x, y = 18, *tile_of(30.015, 60.01, 18)
+        self.assertEqual(index.snapshot.query(tile_bounds(z, x, y), "cafe").tolist(), [1])
+
+        tile = builds_tile(index.snapshot, z, x, y)
+        self.assertIn(b"builds", tile)
+        self.assertIn(b"cafe", tile)
+        self.assertNotIn(b"cafe", builds_tile(index.snapshot, z, x, y, "shop"))
+        self.assertEqual(builds_tile(index.snapshot, 18, 0, 0), b"")
+
+    def test_builds_tile_during_reload(self):
+        index = BuildIndex()
+        # два набора разного размера: позиции одного не подходят к колонкам другого
+        small = [(i, "alpha", "alpha", f"30.{1000 + i}", "60.01") for i in range(50)]
+        large = [(i, "omega", "omega", f"30.{1000 + i}", "60.01") for i in range(500)]
+        index.set_rows(large)
+        z, x, y = 10, *tile_of(30.1, 60.01, 10)
+        stop = threading.Event()
+
+        def reload():
+            while not stop.is_set():
+                index.set_rows(small)
+                index.set_rows(large)
+
+        thread = threading.Thread(target=reload)
+        thread.start()
+        try:
+            for _ in range(50):
+                tile = builds_tile(index.snapshot, z, x, y)
+                # тайл целиком из одного снимка
+                self.assertNotEqual(b"alpha" in tile, b"omega" in tile)
+        finally:
+            stop.set()
+            thread.join()
+        with self.assertRaises(AttributeError):
+            index.snapshot.ids = None
+
+    def test_isochrones_tile(self):
+        isochrones = [
+            {"minutes": 5, "polygon": mapping(Point(30.015, 60.01).buffer(0.001))},
+            {"minutes": 10, "polygon": mapping(Point(31.5, 60.01).buffer(0.001))},
+        ]
+        z, x, y = 14, *tile_of(30.015, 60.01, 14)
+
+        tile = isochrones_tile(isochrones, z, x, y)
+
+        self.assertIn(b"isochrones", tile)
+        self.assertIn(b"minutes", tile)
+        # вторая полоса далеко от тайла и в него не попадает
+        self.assertEqual(tile, isochrones_tile(isochrones[:1], z, x, y))
+        self.assertEqual(isochrones_tile(isochrones, z, x + 100, y), b"")
+
+
+if __name__ == "__main__":
+    unittest.main()